@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import requests
+
+from document_entity import Document
+from elasticsearch_client import ElasticsearchClient
+from metrics import REGISTRY
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# メトリクス
+_BULK_ITEMS = REGISTRY.counter("crawler_bulk_items_total", "Bulk items by operation and final result", ["op", "result"])
+_BULK_RETRIES = REGISTRY.counter("crawler_bulk_retried_items_total", "Bulk items resent after a 429/503 rejection")
+_BULK_BATCH_SIZE = REGISTRY.histogram("crawler_bulk_batch_documents", "Number of items per _bulk request",
+                                      buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000))
+_BULK_PENDING = REGISTRY.gauge("crawler_bulk_pending_items", "Items buffered in the bulk indexer waiting to be sent")
+
+# アイテムごとのインデックス結果を通知するコールバック (doc_id, success, error)
+BulkItemCallback = Callable[[str, bool, Optional[str]], None]
+
+
+@dataclass
+class _BulkItem:
+    """
+    _bulkリクエストに含める1ドキュメント分のアクション。
+    """
+    doc_id: str
+    payload: bytes  # アクション行とソース行を連結したNDJSON
+    callback: Optional[BulkItemCallback] = None
+    op: str = "index"
+
+
+class BulkIndexer:
+    """
+    ドキュメントをバッファし、Elasticsearchの_bulk APIでまとめてインデックスするクラス。
+    ドキュメント数・バイト数・経過時間のいずれかが上限に達した時点で送信します。
+    429/503で拒否されたアイテムのみを指数バックオフで再送し、結果はアイテムごとにコールバックで通知します。
+    アイテムごとに送信先のインデックスを指定できるため、複数のクロールジョブで共有できます。
+    """
+    RETRYABLE_STATUSES = (429, 503)
+
+    def __init__(self, es_client: ElasticsearchClient, max_documents: int = 500, max_bytes: int = 5 * 1024 * 1024,
+                 flush_interval: float = 5.0, max_retries: int = 3, retry_backoff: float = 1.0):
+        self.es_client = es_client
+        self.max_documents = max(1, max_documents)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.indexed_count = 0
+        self.deleted_count = 0
+        self.failed_count = 0
+
+        self._buffer: List[_BulkItem] = []
+        self._buffer_bytes = 0
+        self._last_flush = time.monotonic()
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # 送信処理を直列化する（再送までの待機中は保持しない）
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="bulk-indexer-flusher", daemon=True)
+        self._flusher.start()
+        _BULK_PENDING.set_function(self.pending_count)
+
+    def add(self, document: Document, doc_id: str, callback: Optional[BulkItemCallback] = None, index: Optional[str] = None):
+        """
+        ドキュメントを送信バッファに追加します。
+        index を省略した場合は ElasticsearchClient のインデックスに送信します。
+        バッファが上限に達した場合は、呼び出し元のスレッドでそのまま送信します。
+        """
+        if self._closed.is_set():
+            raise RuntimeError("BulkIndexer is already closed.")
+        if not document.url:
+            raise ValueError("Document must contain a 'url' field for indexing.")
+        if not doc_id:
+            raise ValueError("doc_id must be provided for indexing.")
+
+        self._enqueue(_BulkItem(doc_id=doc_id, payload=self._build_payload(document, doc_id, index or self.es_client.index_name), callback=callback))
+
+    def delete(self, doc_id: str, callback: Optional[BulkItemCallback] = None, index: Optional[str] = None):
+        """
+        ドキュメントの削除を送信バッファに追加します。既に存在しないドキュメントの削除は成功として扱います。
+        """
+        if self._closed.is_set():
+            raise RuntimeError("BulkIndexer is already closed.")
+        action = {"delete": {"_index": index or self.es_client.index_name, "_id": doc_id}}
+        self._enqueue(_BulkItem(doc_id=doc_id, payload=(json.dumps(action) + "\n").encode('utf-8'), callback=callback, op="delete"))
+
+    def _enqueue(self, item: _BulkItem):
+        """
+        アイテムを送信バッファに追加し、上限に達していれば送信します。
+        """
+        with self._buffer_lock:
+            self._buffer.append(item)
+            self._buffer_bytes += len(item.payload)
+            should_flush = len(self._buffer) >= self.max_documents or self._buffer_bytes >= self.max_bytes
+        if should_flush:
+            self.flush()
+
+    def pending_count(self) -> int:
+        """
+        まだ送信されていないドキュメントの数を返します。
+        """
+        with self._buffer_lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """
+        バッファ中のドキュメントを_bulk APIで送信します。
+        拒否されたアイテムの再送は呼び出し元のスレッドで行い、待機中も他のスレッドは追加・送信を続けられます。
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                items = self._buffer
+                self._buffer = []
+                self._buffer_bytes = 0
+                self._last_flush = time.monotonic()
+            if not items:
+                return
+            retry_items = self._send(items, can_retry=self.max_retries > 0)
+        self._retry(retry_items)
+
+    def close(self):
+        """
+        定期送信スレッドを停止し、残りのドキュメントをすべて送信します。
+        シャットダウン時に必ず呼び出してください。
+        """
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        logger.info(f"Bulk indexer closed. Indexed: {self.indexed_count}, Deleted: {self.deleted_count}, Failed: {self.failed_count}")
+
+    def _flush_periodically(self):
+        """
+        flush_interval が経過したバッファを定期的に送信します。
+        """
+        while not self._closed.wait(timeout=min(self.flush_interval, 1.0)):
+            with self._buffer_lock:
+                expired = self._buffer and time.monotonic() - self._last_flush >= self.flush_interval
+            if expired:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Error during periodic bulk flush: {e}")
+
+    def _build_payload(self, document: Document, doc_id: str, index: str) -> bytes:
+        """
+        1ドキュメント分のNDJSON（アクション行とソース行）を生成します。
+        """
+        action = {"index": {"_index": index, "_id": doc_id}}
+        source = document.to_dict()
+        return (json.dumps(action) + "\n" + json.dumps(source, ensure_ascii=False) + "\n").encode('utf-8')
+
+    def _retry(self, items: List[_BulkItem]):
+        """
+        再送可能なエラーで拒否されたアイテムを、指数バックオフで再送します。
+        待機中は送信ロックを保持しないため、他のスレッドの add() や flush() を妨げません。
+        """
+        attempt = 0
+        while items:
+            attempt += 1
+            _BULK_RETRIES.inc(len(items))
+            wait = self.retry_backoff * (2 ** (attempt - 1))
+            logger.warning(f"Retrying {len(items)} rejected bulk item(s) in {wait:.1f}s (attempt {attempt}/{self.max_retries}).")
+            time.sleep(wait)
+            with self._flush_lock:
+                items = self._send(items, can_retry=attempt < self.max_retries)
+
+    def _send(self, items: List[_BulkItem], can_retry: bool) -> List[_BulkItem]:
+        """
+        _bulkリクエストを1回送信し、再送が必要なアイテムのリストを返します。
+        """
+        body = b"".join(item.payload for item in items)
+        _BULK_BATCH_SIZE.observe(len(items))
+        try:
+            response = self.es_client.bulk(body)
+        except requests.exceptions.RequestException as e:
+            status = e.response.status_code if getattr(e, 'response', None) is not None else None
+            if can_retry and (status is None or status in self.RETRYABLE_STATUSES):
+                return items
+            for item in items:
+                self._notify(item, False, str(e))
+            return []
+
+        results = response.get("items")
+        if not isinstance(results, list) or len(results) != len(items):
+            # アイテムと結果を対応付けられないため、すべて失敗として扱う（同じIDへの index/delete は再送しても結果が変わらない）
+            error = f"bulk response has {len(results) if isinstance(results, list) else 'no'} item result(s) for {len(items)} item(s)"
+            if response.get("error") is not None:
+                error += f": {json.dumps(response['error'])}"
+            logger.warning(f"Unexpected bulk response: {error}")
+            if can_retry:
+                return items
+            for item in items:
+                self._notify(item, False, error)
+            return []
+
+        retry_items = []
+        for item, result in zip(items, results):
+            outcome = next(iter(result.values()), {})
+            status = outcome.get("status", 0)
+            if 200 <= status < 300 or (item.op == "delete" and status == 404):
+                self._notify(item, True, None)
+            elif status in self.RETRYABLE_STATUSES and can_retry:
+                retry_items.append(item)
+            else:
+                error = outcome.get("error")
+                self._notify(item, False, json.dumps(error) if error is not None else f"status {status}")
+        return retry_items
+
+    def _notify(self, item: _BulkItem, success: bool, error: Optional[str]):
+        """
+        アイテムの最終結果を集計し、コールバックに通知します。
+        """
+        _BULK_ITEMS.inc(op=item.op, result="success" if success else "failed")
+        if success and item.op == "delete":
+            self.deleted_count += 1
+        elif success:
+            self.indexed_count += 1
+        else:
+            self.failed_count += 1
+            logger.error(f"Failed to {item.op} document {item.doc_id}: {error}")
+        if item.callback:
+            try:
+                item.callback(item.doc_id, success, error)
+            except Exception as e:
+                logger.error(f"Error in bulk item callback for {item.doc_id}: {e}")
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+from document_entity import Document, DocumentChunk
+
+# チャンクインデックス名の既定の接尾辞（<es_index>-chunks）
+CHUNK_INDEX_SUFFIX = "-chunks"
+
+
+def chunk_index_name(index_name: str) -> str:
+    """
+    ドキュメントのインデックスに対応する既定のチャンクインデックス名を返します。
+    """
+    return f"{index_name}{CHUNK_INDEX_SUFFIX}"
+
+
+def chunk_id(doc_id: str, position: int) -> str:
+    """
+    チャンクのIDを返します。同じドキュメントの同じ位置のチャンクは常に同じIDになるため、再クロール時は上書きされます。
+    """
+    return f"{doc_id}-{position}"
+
+
+@dataclass(slots=True)
+class TextChunk:
+    """
+    テキストを分割した1つのパッセージ。オフセットは元のテキストをUTF-8でエンコードしたときのバイト位置です。
+    """
+    position: int
+    heading_path: List[str]
+    content: str
+    start_offset: int
+    end_offset: int
+
+
+@dataclass(slots=True)
+class _Segment:
+    """
+    分割の単位となるテキストの断片（通常は1行。長すぎる行はさらに分割される）。
+    """
+    start: int # 文字位置
+    end: int
+    byte_start: int
+    byte_end: int
+    heading_path: Tuple[str, ...]
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+
+class Chunker:
+    """
+    ドキュメントのテキストを、見出しの区切りと文字数（改行を除く）の上限に従って重なりのあるパッセージに分割するクラス。
+
+    テキストは行単位で詰め込み、見出しが現れた時点で新しいチャンクを開始します（min_chars 未満の短いチャンクは次の見出しの内容と結合します）。
+    同じ見出しの中でチャンクが上限に達した場合は、直前のチャンクの末尾 overlap_chars 文字以内の行を
+    次のチャンクの先頭に含めます。上限を超える長い行は、重なりを持たせて文字数で分割します。
+    """
+    def __init__(self, max_chars: int = 1000, overlap_chars: int = 150, min_chars: int = 100):
+        self.max_chars = max(1, max_chars)
+        self.overlap_chars = min(max(0, overlap_chars), self.max_chars // 2)
+        self.min_chars = min(max(0, min_chars), self.max_chars)
+
+    def split(self, text: str, headings: Sequence[Tuple[int, str]] = ()) -> List[TextChunk]:
+        """
+        テキストをパッセージに分割します。headings はパース時に抽出した文書順の (見出しレベル, 見出しテキスト) です。
+        """
+        if not text:
+            return []
+        chunks: List[TextChunk] = []
+        current: List[_Segment] = []
+        current_length = 0
+        carried = 0 # current の先頭のうち、直前のチャンクから引き継いだ断片の数
+        for segment, starts_section in self._segments(text, headings):
+            starts_section = starts_section and current_length >= self.min_chars
+            if current and (starts_section or current_length + segment.length > self.max_chars):
+                # 引き継いだ断片だけのチャンクは直前のチャンクと重複するため出力しない
+                if len(current) > carried:
+                    chunks.append(self._make_chunk(text, current, len(chunks)))
+                current = [] if starts_section else self._overlap(current)
+                carried = len(current)
+                current_length = sum(s.length for s in current)
+                if current_length + segment.length > self.max_chars:
+                    current, carried, current_length = [], 0, 0
+            current.append(segment)
+            current_length += segment.length
+        if current:
+            chunks.append(self._make_chunk(text, current, len(chunks)))
+        return chunks
+
+    def build_chunks(self, document: Document, doc_id: str, text_chunks: List[TextChunk]) -> List[DocumentChunk]:
+        """
+        分割したパッセージから、チャンクインデックスに保存するエンティティを生成します。
+        """
+        return [
+            DocumentChunk(url=document.url, doc_id=doc_id, title=document.title, heading_path=chunk.heading_path,
+                          content=chunk.content, position=chunk.position, start_offset=chunk.start_offset,
+                          end_offset=chunk.end_offset, mime_type=document.mime_type, timestamp=document.timestamp)
+            for chunk in text_chunks
+        ]
+
+    def _segments(self, text: str, headings: Sequence[Tuple[int, str]]):
+        """
+        テキストを行ごとの断片に分け、(断片, 見出しで始まるか) を順に返します。
+        見出しは文書順に1つずつ照合し、見出しテキストと一致する（または見出しの先頭の一部である）行を見出しとみなします。
+        """
+        path: List[Tuple[int, str]] = []
+        next_heading = 0
+        char_pos = 0
+        byte_pos = 0
+        for line in text.split("\n"):
+            line_bytes = len(line.encode("utf-8"))
+            starts_section = False
+            if next_heading < len(headings) and line:
+                level, heading = headings[next_heading]
+                if heading == line or heading.startswith(line + " "):
+                    while path and path[-1][0] >= level:
+                        path.pop()
+                    path.append((level, heading))
+                    next_heading += 1
+                    starts_section = True
+            heading_path = tuple(heading for _, heading in path)
+            if line:
+                for segment in self._split_line(line, char_pos, byte_pos, heading_path):
+                    yield segment, starts_section
+                    starts_section = False
+            char_pos += len(line) + 1
+            byte_pos += line_bytes + 1
+
+    def _split_line(self, line: str, char_pos: int, byte_pos: int, heading_path: Tuple[str, ...]):
+        """
+        1行を断片にします。max_chars を超える行は overlap_chars 文字ずつ重ねて分割します。
+        """
+        if len(line) <= self.max_chars:
+            yield _Segment(char_pos, char_pos + len(line), byte_pos, byte_pos + len(line.encode("utf-8")), heading_path)
+            return
+        step = self.max_chars - self.overlap_chars
+        start = 0
+        while start < len(line):
+            end = min(start + self.max_chars, len(line))
+            byte_start = byte_pos + len(line[:start].encode("utf-8"))
+            yield _Segment(char_pos + start, char_pos + end, byte_start,
+                           byte_start + len(line[start:end].encode("utf-8")), heading_path)
+            if end == len(line):
+                return
+            start += step
+
+    def _overlap(self, segments: List[_Segment]) -> List[_Segment]:
+        """
+        直前のチャンクの末尾から、合計が overlap_chars 文字以内の行を次のチャンクに引き継ぎます。
+        """
+        carried: List[_Segment] = []
+        length = 0
+        for segment in reversed(segments):
+            if length + segment.length > self.overlap_chars:
+                break
+            carried.insert(0, segment)
+            length += segment.length
+        return carried
+
+    def _make_chunk(self, text: str, segments: List[_Segment], position: int) -> TextChunk:
+        first, last = segments[0], segments[-1]
+        # 長い行を分割した断片は互いに重なるため、連続する範囲として元のテキストから切り出す。
+        # 短い見出しの内容を結合した場合に備え、見出しの階層はチャンク末尾のものを使う
+        return TextChunk(position=position, heading_path=list(last.heading_path), content=text[first.start:last.end],
+                         start_offset=first.byte_start, end_offset=last.byte_end)
@@ -1,18 +1,87 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import yaml
 
+from document_extractor import DEFAULT_EXTRACT_MIME_TYPES
+
 class CrawlerConfig(BaseModel):
     start_urls: List[str] = Field(..., description="クロールを開始するURLのリスト")
-    allowed_domains: List[str] = Field(default_factory=list, description="クロールを許可するドメインのリスト")
+    allowed_domains: List[str] = Field(default_factory=list, description="クロールを許可するドメインのリスト。`*.example.com` の形式でサブドメインも許可")
     target_url_patterns: List[str] = Field(default_factory=list, description="クロール対象とするURLの正規表現リスト")
     exclude_url_patterns: List[str] = Field(default_factory=list, description="クロールから除外するURLの正規表現リスト")
+    url_filter_cache_size: int = Field(default=4096, description="URLフィルタの判定結果をキャッシュする件数")
+    frontier_backend: str = Field(default="memory", description="クロール対象キューの保存先 (memory, disk)")
+    frontier_path: Optional[str] = Field(default=None, description="diskバックエンドのデータベースファイル。未指定の場合は crawl_state/<es_index>.frontier.sqlite3")
+    frontier_checkpoint_interval: int = Field(default=1000, description="diskバックエンドでチェックポイントを作成する更新回数の間隔")
+    frontier_order: str = Field(default="fifo", description="クロール対象URLを取り出す順序 (fifo: 見つかった順, priority: スコアの大きい順)")
+    priority_depth_weight: float = Field(default=1.0, description="priority 順の場合に、深さ1あたりスコアから引く値")
+    priority_url_weights: Dict[str, float] = Field(default_factory=dict, description="priority 順の場合に、URLが正規表現に一致したときスコアに加える値。`\\.pdf$: -2.0` の形式で指定")
+    priority_inlink_weight: float = Field(default=1.0, description="priority 順の場合に、log2(1 + 被リンク数) に掛けてスコアに加える値")
+    priority_sitemap_weight: float = Field(default=2.0, description="priority 順の場合に、(サイトマップの priority - 0.5) に掛けてスコアに加える値")
     max_depth: int = Field(default=5, description="クロールの最大深度")
-    delay: float = Field(default=1.0, description="リクエスト間の遅延時間（秒）")
+    delay: float = Field(default=1.0, description="同一ホストへのリクエスト間の最小遅延時間（秒）")
+    max_concurrency: int = Field(default=16, description="全ホスト合計で同時に実行するリクエストの最大数")
+    per_host_concurrency: int = Field(default=2, description="同一ホストに対して同時に実行するリクエストの最大数")
+    adaptive_delay: bool = Field(default=False, description="ホストごとの応答時間とエラー率に応じてリクエスト間隔を調整するか。delay から始めて、正常な間は adaptive_min_delay まで短縮し、遅延やエラー・429/503で延長します")
+    adaptive_min_delay: float = Field(default=0.1, description="adaptive_delay 有効時のリクエスト間隔の下限（秒）")
+    adaptive_max_delay: float = Field(default=60.0, description="adaptive_delay 有効時のリクエスト間隔の上限（秒）")
+    adaptive_latency_threshold: float = Field(default=2.0, description="adaptive_delay 有効時、応答時間の移動平均がこれを超えたホストはリクエスト間隔を延ばす（秒）")
+    fetch_max_retries: int = Field(default=3, description="429/5xx・タイムアウト・接続エラーで取得に失敗したURLを再試行する最大回数")
+    retry_base_delay: float = Field(default=1.0, description="再試行までの待ち時間の初期値（秒）。再試行のたびに2倍になります")
+    retry_max_delay: float = Field(default=300.0, description="再試行までの待ち時間と、Retry-After に従ってホストへのリクエストを止める時間の上限（秒）")
+    request_timeout: float = Field(default=10.0, description="1リクエストあたりのタイムアウト時間（秒）")
+    max_body_size: int = Field(default=10 * 1024 * 1024, description="レスポンスボディの最大サイズ（バイト）。超えたページはスキップされます")
+    max_body_sizes: Dict[str, int] = Field(default_factory=dict, description="MIMEタイプごとのレスポンスボディの最大サイズ（バイト）。`text/html` や `image/*` の形式で指定し、max_body_size より優先されます")
     user_agent: str = Field(default="Mozilla/5.0 (compatible; MyCrawler/1.0)", description="User-Agent文字列")
+    respect_robots_txt: bool = Field(default=True, description="robots.txt の Allow/Disallow と Crawl-delay に従うか")
+    robots_max_crawl_delay: float = Field(default=60.0, description="robots.txt の Crawl-delay として受け入れる最大値（秒）")
+    robots_retry_interval: float = Field(default=60.0, description="robots.txt を5xx・429・接続エラーで取得できなかったホストの robots.txt を再取得するまでの間隔（秒）。それまでのURLは fetch_max_retries 回まで再試行を待ちます")
+    use_sitemaps: bool = Field(default=False, description="開始URLのホストの robots.txt の Sitemap 行（無い場合は /sitemap.xml）からサイトマップを読み、記載されたURLをクロール対象に追加するか")
+    sitemap_urls: List[str] = Field(default_factory=list, description="読み込むサイトマップ・サイトマップインデックスのURLのリスト（gzip圧縮にも対応）")
+    sitemap_max_files: int = Field(default=1000, description="1回のクロールで読み込むサイトマップファイル数の上限（サイトマップインデックスから辿るものを含む）")
+    sitemap_max_size: int = Field(default=50 * 1024 * 1024, description="サイトマップ1ファイルあたりの展開後の最大サイズ（バイト）")
     es_index: str = Field(..., description="Elasticsearchのインデックス名")
     es_index_description: str = Field(..., description="Elasticsearchインデックスの説明")
+    index_profile: str = Field(default="full", description="本文のフィールド構成を決めるインデックスプロファイル (full, no_ngram, ja, ja_compact, en)。新しく作成するインデックスにのみ適用されます")
+    es_number_of_replicas: int = Field(default=0, description="新しく作成するインデックスのレプリカ数")
+    rebuild: bool = Field(default=False, description="バージョン付きの新しいインデックスにフルクロールしてから、es_index のエイリアスを切り替えてインデックスを再構築するか")
+    rebuild_keep_previous: bool = Field(default=True, description="再構築でエイリアスを切り替えた後、直前のバージョンのインデックスを残すか。それより古いバージョンは削除されます")
+    rebuild_max_num_segments: Optional[int] = Field(default=1, description="再構築したインデックスを切り替え前に forcemerge するセグメント数。未指定の場合は forcemerge しない")
+    html_parser: str = Field(default="lxml", description="HTMLパーサーのバックエンド (lxml, selectolax, html.parser)。利用できない場合は html.parser を使用")
+    transform_workers: Optional[int] = Field(default=None, description="HTMLの変換を行うワーカープロセス数。未指定の場合はCPUコア数、0の場合はクローラースレッド内で変換")
+    chunking: bool = Field(default=False, description="ドキュメントを見出しと文字数で重なりのあるパッセージに分割し、チャンクインデックスにも保存するか。search_passages ツールを使う場合に有効にします")
+    chunk_index: Optional[str] = Field(default=None, description="パッセージを保存するチャンクインデックスの名前。未指定の場合は <es_index>-chunks")
+    chunk_max_chars: int = Field(default=1000, description="1パッセージあたりの最大文字数")
+    chunk_overlap_chars: int = Field(default=150, description="連続するパッセージが重なる最大文字数")
+    extract_mime_types: List[str] = Field(default_factory=lambda: list(DEFAULT_EXTRACT_MIME_TYPES), description="テキストを抽出して本文として保存するMIMEタイプのリスト（PDF・Word・PowerPoint・Excel・テキスト）")
+    extract_workers: int = Field(default=2, description="PDFやOffice文書からテキストを抽出するワーカープロセス数。0の場合は抽出しない")
+    extract_timeout: float = Field(default=60.0, description="1ファイルあたりのテキスト抽出の制限時間（秒）。超えた場合はワーカーを強制終了し、本文なしで保存します")
+    extract_memory_limit: Optional[int] = Field(default=1024 * 1024 * 1024, description="抽出ワーカープロセス1つあたりのメモリ（アドレス空間）の上限（バイト）。未指定の場合は制限しない")
+    extract_max_chars: int = Field(default=1_000_000, description="1ファイルから抽出する最大文字数")
+    extract_spool_size: int = Field(default=1024 * 1024, description="抽出対象のレスポンスボディをメモリに保持する最大サイズ（バイト）。超えた分は一時ファイルに書き出します")
+    near_duplicate_action: str = Field(default="off", description="近似重複（本文のSimHash署名が近いドキュメント）の扱い (off, skip, link)。skip はインデックスせず、link は canonical_url に正規ドキュメントのURLを設定してインデックスします")
+    near_duplicate_threshold: int = Field(default=3, description="近似重複とみなすSimHash署名のハミング距離の上限（0〜7）。大きいほど緩く判定します")
+    transform_max_pending: Optional[int] = Field(default=None, description="変換ステージに同時に投入できるページ数の上限。未指定の場合はワーカー数の2倍")
+    incremental: bool = Field(default=False, description="インクリメンタルクロールを有効にするか。条件付きGETとコンテンツハッシュで未変更のページをスキップ")
+    state_path: Optional[str] = Field(default=None, description="インクリメンタルクロールの状態ファイル。未指定の場合は crawl_state/<es_index>.state.sqlite3")
+    delete_missing_documents: bool = Field(default=False, description="インクリメンタルクロールで到達しなかったページをインデックスから削除するか")
+    es_timeout: float = Field(default=30.0, description="Elasticsearchへのリクエストの読み取りタイムアウト（秒）")
+    es_connect_timeout: float = Field(default=5.0, description="Elasticsearchへの接続タイムアウト（秒）")
+    es_max_retries: int = Field(default=3, description="Elasticsearchへの接続エラー・ゲートウェイエラー時の再試行回数")
+    es_pool_maxsize: int = Field(default=10, description="Elasticsearchへのコネクションプールの最大接続数")
+    es_compress: bool = Field(default=True, description="Elasticsearchへのリクエストボディをgzipで圧縮するか")
+    result_queue_size: int = Field(default=1000, description="クロール結果キューの最大サイズ。満杯の間はクローラーが待機します")
+    indexing_workers: int = Field(default=2, description="クロール結果をインデックスするワーカースレッド数")
+    crawl_processes: int = Field(default=1, description="クロールを行うプロセス数。2以上の場合はURLのホストのハッシュでフロンティアを分割し、プロセスごとに担当ホストをクロール・インデックスします")
+    metrics_port: Optional[int] = Field(default=None, description="メトリクスを公開するHTTPポート。指定した場合は /metrics（Prometheus形式）と /metrics.json を公開します")
+    metrics_host: str = Field(default="0.0.0.0", description="メトリクスのHTTPサーバーがバインドするアドレス")
+    metrics_file: Optional[str] = Field(default=None, description="メトリクスを定期的に書き出すJSONファイルのパス")
+    metrics_interval: float = Field(default=10.0, description="メトリクスをJSONファイルに書き出す間隔（秒）")
     max_documents: Optional[int] = Field(default=None, description="Elasticsearchに追加するドキュメントの最大数")
+    bulk_max_documents: int = Field(default=500, description="_bulkリクエスト1回あたりの最大ドキュメント数")
+    bulk_max_bytes: int = Field(default=5 * 1024 * 1024, description="_bulkリクエスト1回あたりの最大バイト数")
+    bulk_flush_interval: float = Field(default=5.0, description="バッファ中のドキュメントを_bulkで送信する最大間隔（秒）")
+    bulk_max_retries: int = Field(default=3, description="429/503で拒否されたアイテムを再送する最大回数")
 
     @classmethod
     def from_yaml(cls, file_path: str):
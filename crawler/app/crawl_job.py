@@ -0,0 +1,220 @@
+import glob
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from chunker import chunk_index_name
+from crawl_config import CrawlerConfig
+from crawl_state_store import CrawlStateStore
+from crawl_target_queue import CrawlTargetQueue
+from disk_crawl_target_queue import DiskCrawlTargetQueue
+from frontier_priority import PriorityScorer
+from elasticsearch_client import ElasticsearchClient
+from index_rebuild import RebuildTarget, remove_sqlite_files, replace_sqlite_files
+from near_duplicate import SimHashIndex
+from priority_crawl_target_queue import PriorityCrawlTargetQueue
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@dataclass
+class CrawlJob:
+    """
+    1つのクローラー設定に対応するクロールジョブ。
+    インデックス・クロール対象キュー・状態ストア・停止イベント・近似重複の署名インデックスなど、設定ごとに独立したリソースをまとめます。
+    HTTPセッション・変換ステージ・BulkIndexer は複数のジョブで共有します。
+    インデックスの再構築時は rebuild に書き込み先の新しいインデックスを保持します。
+    """
+    name: str
+    config: CrawlerConfig
+    es_client: ElasticsearchClient
+    crawl_target_queue: CrawlTargetQueue
+    stop_event: threading.Event
+    state_store: Optional[CrawlStateStore] = None
+    near_duplicate_index: Optional[SimHashIndex] = None
+    rebuild: Optional[RebuildTarget] = None
+
+    @property
+    def index_name(self) -> str:
+        """
+        ドキュメントの書き込み先のインデックス名を返します。
+        """
+        return self.rebuild.index if self.rebuild else self.config.es_index
+
+    @property
+    def chunk_index_name(self) -> str:
+        """
+        パッセージの書き込み先のチャンクインデックス名を返します。
+        """
+        if self.rebuild and self.rebuild.chunk_index:
+            return self.rebuild.chunk_index
+        return self.config.chunk_index or chunk_index_name(self.config.es_index)
+
+    def close(self):
+        """
+        ジョブが使用するクロール対象キューと状態ストアを閉じます。
+        """
+        self.crawl_target_queue.close()
+        if self.state_store:
+            self.state_store.close()
+
+
+def resolve_config_paths(paths: List[str]) -> List[str]:
+    """
+    設定ファイルのパスのリストを展開します。ディレクトリを指定した場合は、その中の *.yaml / *.yml を名前順に返します。
+    """
+    resolved = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(glob.glob(os.path.join(path, "*.yaml")) + glob.glob(os.path.join(path, "*.yml")))
+            if not found:
+                logger.warning(f"No configuration files found in {path}")
+            resolved.extend(found)
+        else:
+            resolved.append(path)
+    return resolved
+
+
+def job_names(config_paths: List[str]) -> List[str]:
+    """
+    設定ファイル名からジョブ名を生成します。同じ名前が重複する場合は連番を付与します。
+    """
+    names = []
+    for path in config_paths:
+        base = os.path.splitext(os.path.basename(path))[0]
+        name = base
+        suffix = 2
+        while name in names:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        names.append(name)
+    return names
+
+
+def shard_path(path: str, shard: Optional[int]) -> str:
+    """
+    シャード番号を付与したファイルパスを返します。シャード番号が無い場合はそのまま返します。
+    """
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard}{ext}"
+
+
+def frontier_store_path(config: CrawlerConfig) -> str:
+    """
+    ディスクベースのクロール対象キューのファイルパスを返します。
+    """
+    return config.frontier_path or os.path.join("crawl_state", f"{config.es_index}.frontier.sqlite3")
+
+
+def state_store_path(config: CrawlerConfig) -> str:
+    """
+    インクリメンタルクロールの状態ファイルのパスを返します。
+    """
+    return config.state_path or os.path.join("crawl_state", f"{config.es_index}.state.sqlite3")
+
+
+def create_crawl_target_queue(config: CrawlerConfig, shard: Optional[int] = None):
+    """
+    設定に応じたクロール対象キューを生成します。
+    shard を指定した場合、ディスクベースのキューはシャードごとに別のファイルを使用します。
+    frontier_order が priority の場合は、スコアの大きい順にURLを取り出すキューを生成します。
+    """
+    scorer = PriorityScorer.from_config(config)
+    if config.frontier_backend == "disk":
+        path = shard_path(frontier_store_path(config), shard)
+        logger.info(f"Using disk-backed crawl frontier at {path} ({'priority' if scorer else 'fifo'} order).")
+        return DiskCrawlTargetQueue(path, checkpoint_interval=config.frontier_checkpoint_interval, scorer=scorer)
+    if config.frontier_backend != "memory":
+        logger.warning(f"Unknown frontier backend '{config.frontier_backend}'. Using in-memory frontier.")
+    if scorer is not None:
+        return PriorityCrawlTargetQueue(scorer)
+    return CrawlTargetQueue()
+
+
+def create_state_store(config: CrawlerConfig, shard: Optional[int] = None) -> Optional[CrawlStateStore]:
+    """
+    インクリメンタルクロールが有効な場合に状態ストアを生成します。
+    shard を指定した場合、シャードごとに別のファイルを使用します。
+    """
+    if not config.incremental:
+        return None
+    path = shard_path(state_store_path(config), shard)
+    return CrawlStateStore(path)
+
+
+NEAR_DUPLICATE_ACTIONS = ("off", "skip", "link")
+
+
+def create_near_duplicate_index(config: CrawlerConfig, state_store: Optional[CrawlStateStore] = None) -> Optional[SimHashIndex]:
+    """
+    近似重複の検出が有効な場合に署名インデックスを生成します。
+    状態ストアがある場合は、前回までにインデックスした正規ドキュメントの署名を読み込みます。
+    """
+    if config.near_duplicate_action not in NEAR_DUPLICATE_ACTIONS:
+        logger.warning(f"Unknown near-duplicate action '{config.near_duplicate_action}'. Near-duplicate detection is disabled.")
+        return None
+    if config.near_duplicate_action == "off":
+        return None
+    index = SimHashIndex(config.near_duplicate_threshold)
+    if state_store:
+        loaded = index.load(state_store.iter_simhashes())
+        logger.info(f"Loaded {loaded} SimHash signature(s) for near-duplicate detection from {state_store.path}.")
+    return index
+
+
+# 再構築中の状態ファイル・フロンティアのファイル名に付ける接尾辞
+REBUILD_FILE_SUFFIX = ".rebuild"
+
+
+@dataclass
+class RebuildFiles:
+    """
+    インデックスの再構築中に使用する状態ファイルとフロンティアのファイル。
+    """
+    state_files: List[Tuple[str, str]] # (再構築中のファイル, 本来のファイル)
+    frontier_files: List[str]
+
+    def commit(self):
+        """
+        再構築が完了した後、状態ファイルを本来のファイルと置き換え、フロンティアのファイルを削除します。
+        """
+        for rebuild_path, path in self.state_files:
+            if os.path.exists(rebuild_path):
+                replace_sqlite_files(rebuild_path, path)
+        for path in self.frontier_files:
+            remove_sqlite_files(path)
+
+    def discard(self):
+        """
+        中止した再構築のファイルを削除します。本来の状態ファイルは変更しません。
+        """
+        for rebuild_path, _ in self.state_files:
+            remove_sqlite_files(rebuild_path)
+        for path in self.frontier_files:
+            remove_sqlite_files(path)
+
+
+def prepare_rebuild_files(config: CrawlerConfig, shards: int = 1) -> RebuildFiles:
+    """
+    再構築のクロールが別の状態ファイルとフロンティアを使用するよう、設定のパスを書き換えます。
+    再構築では全ページを取得して新しいインデックスに書き込む必要があるため、前回の状態（未変更ページのスキップや
+    中断したクロールの再開）を使用しません。状態ファイルは再構築が完了した時点で本来のファイルと置き換えます。
+    """
+    shard_indexes = list(range(shards)) if shards > 1 else [None]
+    files = RebuildFiles(state_files=[], frontier_files=[])
+    if config.incremental:
+        path = state_store_path(config)
+        config.state_path = path + REBUILD_FILE_SUFFIX
+        files.state_files = [(shard_path(config.state_path, shard), shard_path(path, shard)) for shard in shard_indexes]
+    if config.frontier_backend == "disk":
+        config.frontier_path = frontier_store_path(config) + REBUILD_FILE_SUFFIX
+        files.frontier_files = [shard_path(config.frontier_path, shard) for shard in shard_indexes]
+    # 前回中断した再構築のファイルが残っていれば削除する
+    files.discard()
+    return files
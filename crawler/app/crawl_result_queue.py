@@ -1,29 +1,58 @@
 import queue
-from typing import Optional
+from typing import List, Optional
 from dataclasses import dataclass
 
-@dataclass
+from chunker import TextChunk
+from document_entity import Document
+from document_extractor import SpooledBody
+from page_parser import ParsedPage
+
+@dataclass(slots=True)
 class CrawlResult:
     """
     クロール結果を格納するデータクラス。
+    大量の結果がキューに滞留してもメモリを抑えられるよう __slots__ を使用します。
     """
     url: str
-    content: Optional[str] = None  # HTMLコンテンツなど、文字列としてデコードされた内容
-    content_bytes: Optional[bytes] = None # バイナリコンテンツ
+    job: Optional[str] = None # 結果を生成したクロールジョブの名前（複数の設定を同時に実行する際の振り分けに使用）
+    content_bytes: Optional[bytes] = None # レスポンスボディ（本文を読み込まないバイナリではNone）
+    content_length: Optional[int] = None # レスポンスボディのサイズ（バイト）
+    content_hash: Optional[str] = None # 本文を読み込まないバイナリの変更検知用ハッシュ値
     mime_type: Optional[str] = None # コンテンツのMIMEタイプ
+    encoding: Optional[str] = None # content_bytes をデコードする際の文字コード
+    parsed: Optional[ParsedPage] = None # HTMLをパースした結果（リンク抽出と変換で共有）
+    document: Optional[Document] = None # 変換ステージで生成済みのドキュメント
+    chunks: Optional[List[TextChunk]] = None # 変換ステージで分割済みのパッセージ（チャンク）
+    simhash: Optional[int] = None # 変換ステージで計算済みの本文のSimHash署名
+    body_file: Optional[SpooledBody] = None # テキスト抽出を待つレスポンスボディ（抽出後に破棄し、キューには載せない）
+    extracted_text: Optional[str] = None # PDFやOffice文書から抽出したテキスト
+    extracted_title: Optional[str] = None # PDFやOffice文書のメタデータから取得したタイトル
+    etag: Optional[str] = None # レスポンスのETagヘッダ
+    last_modified: Optional[str] = None # レスポンスのLast-Modifiedヘッダ
+
+    def get_text_content(self) -> Optional[str]:
+        """
+        content_bytes を文字列にデコードして返します。
+        デコードは変換ステージで1回だけ行い、結果は保持しません。
+        """
+        if self.content_bytes is None:
+            return None
+        return self.content_bytes.decode(self.encoding or 'utf-8', errors='replace')
 
 class CrawlResultQueue:
     """
     クロール結果を格納するキュー。
+    maxsize を指定した場合は容量が制限され、満杯の間は追加が待たされます。
     """
-    def __init__(self):
-        self._queue = queue.Queue()
+    def __init__(self, maxsize: int = 0):
+        self._queue = queue.Queue(maxsize=maxsize)
 
-    def put(self, item: CrawlResult):
+    def put(self, item: CrawlResult, timeout: float = None):
         """
         CrawlResultインスタンスをキューに追加します。
+        キューが満杯のまま timeout 秒が経過した場合は queue.Full を送出します。
         """
-        self._queue.put(item)
+        self._queue.put(item, timeout=timeout)
 
     def get(self, timeout: float = None) -> CrawlResult:
         """
@@ -0,0 +1,215 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@dataclass
+class PageState:
+    """
+    前回までのクロールで記録したURLごとの状態。
+    """
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    links: List[str] = field(default_factory=list)
+    chunk_count: Optional[int] = None # 前回インデックスしたチャンク数
+    simhash: Optional[int] = None # 正規ドキュメントとしてインデックスした本文のSimHash署名
+    fetched_at: Optional[float] = None # 最後にページを取得した日時（UNIX時間）
+
+
+class CrawlStateStore:
+    """
+    インクリメンタルクロールのために、URLごとのETag・Last-Modified・コンテンツハッシュ・
+    リンクをSQLiteに保存するクラス。
+    クロールの実行ごとに実行番号を採番し、今回のクロールで到達しなかったURLを判定できるようにします。
+    """
+    _GONE_RUN_ID = -1
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                links TEXT,
+                last_seen_run INTEGER NOT NULL DEFAULT 0,
+                chunk_count INTEGER,
+                simhash INTEGER,
+                fetched_at REAL
+            )
+        """)
+        # チャンク数・SimHash・取得日時の列が無い古い状態ファイルには列を追加する
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        for column, column_type in (("chunk_count", "INTEGER"), ("simhash", "INTEGER"), ("fetched_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE pages ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self.run_id = self._begin_run()
+
+    def _begin_run(self) -> int:
+        """
+        新しい実行番号を採番します。
+        """
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'run_id'").fetchone()
+        run_id = int(row[0]) + 1 if row else 1
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run_id', ?)", (str(run_id),))
+        self._conn.commit()
+        logger.info(f"Incremental crawl state loaded from {self.path} (run {run_id}).")
+        return run_id
+
+    def get(self, url: str) -> Optional[PageState]:
+        """
+        URLの保存済みの状態を返します。未登録の場合はNoneを返します。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, links, chunk_count, simhash, fetched_at FROM pages WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, links, chunk_count, simhash, fetched_at = row
+        return PageState(url=url, etag=etag, last_modified=last_modified, content_hash=content_hash,
+                         links=links.split("\n") if links else [], chunk_count=chunk_count,
+                         simhash=_from_signed(simhash), fetched_at=fetched_at)
+
+    def mark_seen(self, url: str):
+        """
+        今回のクロールでURLに到達したことを記録します。
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pages (url, last_seen_run) VALUES (?, ?) ON CONFLICT(url) DO UPDATE SET last_seen_run = excluded.last_seen_run",
+                (url, self.run_id)
+            )
+            self._conn.commit()
+
+    def mark_gone(self, url: str):
+        """
+        URLが削除された（404/410）ことを記録します。
+        """
+        with self._lock:
+            self._conn.execute("UPDATE pages SET last_seen_run = ? WHERE url = ?", (self._GONE_RUN_ID, url))
+            self._conn.commit()
+
+    def record_fetch(self, url: str, etag: Optional[str], last_modified: Optional[str], links: List[str]):
+        """
+        取得したページの検証用ヘッダとリンク、取得日時を記録します。
+        """
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO pages (url, etag, last_modified, links, last_seen_run, fetched_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,
+                    links = excluded.links, last_seen_run = excluded.last_seen_run, fetched_at = excluded.fetched_at
+                """,
+                (url, etag, last_modified, "\n".join(links), self.run_id, time.time())
+            )
+            self._conn.commit()
+
+    def record_indexed(self, url: str, content_hash: Optional[str], simhash: Optional[int] = None):
+        """
+        インデックスに成功したドキュメントのコンテンツハッシュと、正規ドキュメントの場合はSimHash署名を記録します。
+        """
+        with self._lock:
+            self._conn.execute("UPDATE pages SET content_hash = ?, simhash = ? WHERE url = ?",
+                               (content_hash, _to_signed(simhash), url))
+            self._conn.commit()
+
+    def record_chunk_count(self, url: str, chunk_count: int):
+        """
+        インデックスに送信したチャンク数を記録します。次回、チャンク数が減った場合に古いチャンクを削除するために使用します。
+        """
+        with self._lock:
+            self._conn.execute("UPDATE pages SET chunk_count = ? WHERE url = ?", (chunk_count, url))
+            self._conn.commit()
+
+    def invalidate(self, url: str):
+        """
+        インデックスに失敗したURLの検証用ヘッダとハッシュを破棄し、次回のクロールで必ず再取得させます。
+        """
+        with self._lock:
+            self._conn.execute("UPDATE pages SET etag = NULL, last_modified = NULL, content_hash = NULL WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def is_unchanged(self, url: str, content_hash: Optional[str]) -> bool:
+        """
+        コンテンツハッシュが前回インデックスしたものと一致するかを返します。
+        """
+        if not content_hash:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row is not None and row[0] == content_hash
+
+    def iter_simhashes(self) -> Iterator[Tuple[str, int]]:
+        """
+        インデックス済みの正規ドキュメントの (URL, SimHash署名) を返します。近似重複の判定に使う署名インデックスの復元に使用します。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, simhash FROM pages WHERE simhash IS NOT NULL AND content_hash IS NOT NULL"
+            ).fetchall()
+        for url, simhash in rows:
+            yield url, _from_signed(simhash)
+
+    def find_missing_urls(self) -> List[str]:
+        """
+        インデックス済みで、今回のクロールで到達しなかった（または削除された）URLを返します。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM pages WHERE last_seen_run < ? AND content_hash IS NOT NULL", (self.run_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, url: str):
+        """
+        URLの状態を削除します。
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def close(self):
+        """
+        データベースを閉じます。
+        """
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def _to_signed(value: Optional[int]) -> Optional[int]:
+    """
+    64ビットの符号なし整数を、SQLiteのINTEGER（符号付き64ビット）に格納できる値に変換します。
+    """
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_signed(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
@@ -1,5 +1,6 @@
 import queue
-from typing import Tuple, Set
+import threading
+from typing import Tuple, Set, Optional
 
 class CrawlTargetQueue:
     """
@@ -9,18 +10,28 @@ class CrawlTargetQueue:
     def __init__(self):
         self._queue = queue.Queue()
         self._seen_urls: Set[str] = set() # 既にキューに追加された、または処理中のURL
+        # 複数のスレッドから追加される場合（シャード分割時の受信スレッドなど）に重複判定を正確に保つためのロック
+        self._lock = threading.Lock()
 
-    def put(self, item: Tuple[str, int]) -> bool:
+    def put(self, item: Tuple[str, int], sitemap_priority: Optional[float] = None) -> bool:
         """
         URLと深度のタプルをキューに追加します。
         既にキューに存在するか、処理済みであれば追加しません。
+        sitemap_priority は優先度順のキューとインターフェースを揃えるための引数で、ここでは使用しません。
         """
         url, _ = item
-        if url not in self._seen_urls:
-            self._queue.put(item)
+        with self._lock:
+            if url in self._seen_urls:
+                return False
             self._seen_urls.add(url)
-            return True
-        return False
+        self._queue.put(item)
+        return True
+
+    def requeue(self, item: Tuple[str, int]):
+        """
+        再試行するURLをキューに戻します。取得済みのURLのため、重複の判定は行いません。
+        """
+        self._queue.put(item)
 
     def get(self, timeout: float = None) -> Tuple[str, int]:
         """
@@ -28,9 +39,10 @@ class CrawlTargetQueue:
         """
         return self._queue.get(timeout=timeout)
 
-    def task_done(self):
+    def task_done(self, item: Optional[Tuple[str, int]] = None):
         """
         取得したタスクの処理が完了したことを通知します。
+        itemはディスクベースのキューとインターフェースを揃えるための引数で、ここでは使用しません。
         """
         self._queue.task_done()
 
@@ -51,3 +63,9 @@ class CrawlTargetQueue:
         これまでにキューに追加された、または処理中のユニークなURLの数を返します。
         """
         return len(self._seen_urls)
+
+    def close(self):
+        """
+        キューを閉じます。メモリ上のキューでは何もしません。
+        """
+        pass
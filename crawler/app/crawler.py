@@ -1,142 +1,710 @@
-import requests
-from urllib.parse import urljoin, urlparse
-import re
-import time
+import asyncio
+import aiohttp
+from urllib.parse import urlparse
 import threading
 import queue
-from typing import Set, Deque, Tuple, Optional
+from collections import deque
+from typing import Dict, Set, Deque, Tuple, Optional, List, Callable
 import os
 import json
+import hashlib
 import logging
-from bs4 import BeautifulSoup # BeautifulSoupをファイルのトップレベルでインポート
+import random
+import time
 
 from crawl_config import CrawlerConfig
 from crawl_target_queue import CrawlTargetQueue
 from crawl_result_queue import CrawlResult, CrawlResultQueue
+from host_throttle import HostThrottle, parse_retry_after
+from transform_stage import TransformStage
+from document_extractor import ExtractionError, ExtractionPool, SpooledBody, is_supported
+from url_filter import UrlFilter
+from crawl_state_store import CrawlStateStore, PageState
+from fingerprint_set import FingerprintSet, url_fingerprint
+from robots import MAX_ROBOTS_SIZE, RobotsRules
+from sitemap import SitemapEntry, SitemapError, SitemapParser
+from metrics import REGISTRY
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# メトリクス
+_FETCH_TOTAL = REGISTRY.counter("crawler_fetch_total", "Fetched URLs by result", ["result"])
+_FETCH_SECONDS = REGISTRY.histogram("crawler_fetch_seconds", "Time spent on HTTP requests, including body download")
+_FETCHED_BYTES = REGISTRY.counter("crawler_fetched_bytes_total", "Response body bytes read from the network")
+_POLITENESS_WAIT_SECONDS = REGISTRY.histogram("crawler_politeness_wait_seconds", "Time spent waiting for the per-host throttle")
+_EXTRACT_WAIT_SECONDS = REGISTRY.histogram("crawler_extract_stage_seconds", "Time from submitting a document to the extraction pool until its text is available")
+_TRANSFORM_WAIT_SECONDS = REGISTRY.histogram("crawler_transform_stage_seconds", "Time from submitting a page to the transform stage until its result is available")
+_RESULT_QUEUE_WAIT_SECONDS = REGISTRY.histogram("crawler_result_queue_wait_seconds", "Time spent waiting for space in the crawl result queue (backpressure)")
+_ROBOTS_FETCH_TOTAL = REGISTRY.counter("crawler_robots_fetch_total", "robots.txt fetches by result", ["result"])
+_SITEMAP_URLS_TOTAL = REGISTRY.counter("crawler_sitemap_urls_total", "URLs read from sitemaps by result", ["result"])
+_FETCH_RETRIES_TOTAL = REGISTRY.counter("crawler_fetch_retries_total", "URLs requeued after a transient fetch error", ["reason"])
+_IN_FLIGHT = REGISTRY.gauge("crawler_in_flight_requests", "URLs currently being processed by the fetch engine", ["job"])
+
+class BodyTooLargeError(Exception):
+    """
+    レスポンスボディがMIMEタイプごとの上限サイズを超えた場合に送出される例外。
+    """
+    pass
+
 class WebCrawler:
     """
     Webページをクロールし、コンテンツを抽出し、結果をキューに格納するクラス。
+    asyncioベースのフェッチエンジンで複数のリクエストを並行して実行し、
+    丁寧さ（同時接続数・リクエスト間隔）はホスト単位で制御します。
     """
-    def __init__(self, config: CrawlerConfig, crawl_target_queue: CrawlTargetQueue, output_queue: CrawlResultQueue, stop_event: threading.Event):
+    # キューが一時的に空のときにワーカーが再確認するまでの待ち時間（秒）
+    _IDLE_POLL_INTERVAL = 0.05
+    # レスポンスボディを読み込む際のチャンクサイズ（バイト）
+    _READ_CHUNK_SIZE = 64 * 1024
+    # 再試行するHTTPステータスコード（一時的なエラー）
+    _RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, config: CrawlerConfig, crawl_target_queue: CrawlTargetQueue, output_queue: CrawlResultQueue, stop_event: threading.Event,
+                 transform_stage: Optional[TransformStage] = None, state_store: Optional[CrawlStateStore] = None, name: Optional[str] = None,
+                 should_finish: Optional[Callable[[], bool]] = None, extraction_pool: Optional[ExtractionPool] = None,
+                 owns: Optional[Callable[[str], bool]] = None):
         self.config = config
+        # クロールジョブの名前。出力するクロール結果に付与し、複数の設定を同時に実行する際の振り分けに使用する
+        self.name = name or config.es_index
         self.crawl_target_queue = crawl_target_queue
         self.output_queue = output_queue
         self.stop_event = stop_event
-
-    def _is_domain_allowed(self, parsed_url: urlparse) -> bool:
-        """ドメインが許可リストに含まれているかを確認します。"""
-        if not self.config.allowed_domains:
-            return True
-        return parsed_url.netloc in self.config.allowed_domains
-
-    def _matches_target_pattern(self, url: str) -> bool:
-        """URLが対象パターンに合致するかを確認します。"""
-        if not self.config.target_url_patterns:
-            return True
-        return any(re.match(pattern, url) for pattern in self.config.target_url_patterns)
-
-    def _matches_exclude_pattern(self, url: str) -> bool:
-        """URLが除外パターンに合致するかを確認します。"""
-        if not self.config.exclude_url_patterns:
-            return False
-        return any(re.match(pattern, url) for pattern in self.config.exclude_url_patterns)
+        # adaptive_delay が有効な場合は delay から始めて、ホストの状態に応じて adaptive_min_delay〜adaptive_max_delay の間で調整する
+        self.host_throttle = HostThrottle(
+            config.per_host_concurrency,
+            config.adaptive_min_delay if config.adaptive_delay else config.delay,
+            adaptive=config.adaptive_delay,
+            initial_delay=config.delay,
+            max_delay=config.adaptive_max_delay,
+            latency_threshold=config.adaptive_latency_threshold,
+            max_pause=config.retry_max_delay
+        )
+        self.url_filter = UrlFilter.from_config(config)
+        # インクリメンタルクロール時の状態ストア（条件付きGETと到達記録に使用）
+        self.state_store = state_store
+        # 変換ステージが渡されない場合は、クローラースレッド内で変換する
+        self.transform_stage = transform_stage or TransformStage(config.html_parser, workers=0)
+        # キューが空で処理中のURLも無いときに、終了してよいかを判定する関数。
+        # 他のプロセスからURLが届く可能性がある場合（シャード分割時）に、終了を遅らせるために使用する
+        self.should_finish = should_finish
+        # PDFやOffice文書からテキストを抽出するワーカープロセスのプール（Noneの場合は抽出しない）
+        self.extraction_pool = extraction_pool
+        # URLのホストをこのクローラーが担当しているかを判定する関数（シャード分割時）。サイトマップは担当ホストのものだけを読む
+        self.owns = owns
+        self._in_flight = 0
+        self._request_timeout = aiohttp.ClientTimeout(total=config.request_timeout)
+        # サイトマップは大きいため全体の時間では制限せず、接続と読み取りの間隔で制限する
+        self._sitemap_timeout = aiohttp.ClientTimeout(sock_connect=config.request_timeout, sock_read=config.request_timeout)
+        # scheme://host ごとの robots.txt の取得結果（同じホストの robots.txt は1回だけ取得する）
+        self._robots: Dict[str, asyncio.Future] = {}
+        # robots.txt を取得できなかったホストの、robots.txt を再取得してよい時刻（time.monotonic() の値）
+        self._robots_retry_at: Dict[str, float] = {}
+        # サイトマップの lastmod から、前回の取得以降に更新されていないと判断したURL
+        self._unchanged_urls = FingerprintSet()
+        # 再試行中のURLの試行回数と、再試行を待つタスク
+        self._retry_counts: Dict[str, int] = {}
+        self._retry_tasks: Set[asyncio.Task] = set()
+        _IN_FLIGHT.set_function(lambda: self._in_flight, job=self.name)
 
     def _is_valid_url(self, url: str) -> bool:
         """
         URLがクロール対象のドメインとパターンに合致し、除外パターンに合致しないかを確認します。
         """
-        parsed_url = urlparse(url)
-        
-        if not self._is_domain_allowed(parsed_url):
-            return False
-        
-        if not self._matches_target_pattern(url):
-            return False
-        
-        if self._matches_exclude_pattern(url):
-            return False
-        
-        return True
+        return self.url_filter.is_allowed(url)
 
     def crawl(self):
         """
         クロールを開始します。
+        非同期のフェッチエンジンを起動し、クロール対象キューが空になるまで実行します。
         """
         logger.info("Starting crawl...")
+        asyncio.run(self._crawl_async())
+        logger.info("Crawl finished.")
+
+    async def _crawl_async(self):
+        """
+        このクローラー専用のセッションを作成してクロールします。
+        """
+        async with create_session([self.config]) as session:
+            await self.crawl_with_session(session)
+
+    async def crawl_with_session(self, session: aiohttp.ClientSession):
+        """
+        max_concurrency 個のワーカーを起動し、複数のリクエストを並行して処理します。
+        サイトマップを使用する場合は、ワーカーと並行してサイトマップを読み、記載されたURLをキューに追加します。
+        セッション（コネクションプール）は複数のクローラーで共有できます。
+        """
+        self._in_flight = 0
+        tasks = []
+        if self.config.use_sitemaps or self.config.sitemap_urls:
+            # サイトマップを読み終えるまでワーカーが終了しないよう、処理中として数える
+            self._in_flight += 1
+            tasks.append(asyncio.create_task(self._discover_from_sitemaps(session)))
+        tasks.extend(asyncio.create_task(self._worker(session)) for _ in range(max(1, self.config.max_concurrency)))
+        await asyncio.gather(*tasks)
+        if self.stop_event.is_set():
+            logger.info(f"[{self.name}] Stop event received. Finishing crawl.")
+        else:
+            logger.info(f"[{self.name}] Crawl target queue is empty. Finishing crawl.")
+        logger.info(f"[{self.name}] Crawled {self.host_throttle.host_count()} host(s).")
+        logger.info(f"[{self.name}] URL filter stats: {self.url_filter.get_stats()}")
+
+    async def _worker(self, session: aiohttp.ClientSession):
+        """
+        クロール対象キューからURLを取り出して処理するワーカー。
+        キューが空で、かつ処理中のURLが無くなった時点で終了します（should_finish が指定された場合はその判定にも従います）。
+        """
         while not self.stop_event.is_set():
             try:
-                current_url, current_depth = self.crawl_target_queue.get(timeout=1) 
+                current_url, current_depth = self.crawl_target_queue.get(timeout=0)
             except queue.Empty:
-                logger.info("Crawl target queue is empty. Finishing crawl.")
-                break
-            
-            if self.stop_event.is_set():
-                logger.info("Stop event received. Finishing crawl.")
-                break
-
-            if current_depth > self.config.max_depth:
-                logger.info(f"Skipping {current_url} due to max depth ({current_depth}).")
-                self.crawl_target_queue.task_done()
+                if self._in_flight == 0 and (self.should_finish is None or self.should_finish()):
+                    break
+                await asyncio.sleep(self._IDLE_POLL_INTERVAL)
                 continue
 
-            logger.info(f"Crawling: {current_url} (Depth: {current_depth})")
-
+            self._in_flight += 1
             try:
-                crawl_result = self._fetch_and_process_url(current_url)
-                if crawl_result:
-                    self.output_queue.put(crawl_result)
-                    logger.info(f"Pushed CrawlResult for: {current_url} to output queue.")
+                await self._crawl_target(session, current_url, current_depth)
+            finally:
+                self._in_flight -= 1
+                self.crawl_target_queue.task_done((current_url, current_depth))
 
-                    if crawl_result.content:
-                        self._extract_and_queue_links(current_url, crawl_result.content, current_depth + 1)
-                    else:
-                        logger.info(f"Skipping link extraction for non-HTML content: {current_url}")
+    async def _crawl_target(self, session: aiohttp.ClientSession, current_url: str, current_depth: int):
+        """
+        単一のURLを取得し、結果を出力キューに格納してリンクをクロール対象キューに追加します。
+        """
+        if current_depth > self.config.max_depth:
+            logger.info(f"Skipping {current_url} due to max depth ({current_depth}).")
+            return
 
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Error crawling {current_url}: {e}")
-            except Exception as e:
-                logger.error(f"An unexpected error occurred while processing {current_url}: {e}")
-            finally:
-                self.crawl_target_queue.task_done()
-            
-            time.sleep(self.config.delay)
+        if self.config.respect_robots_txt and (await self._get_robots(session, current_url)).unreachable:
+            # robots.txt が取得できるようになるまでURLを破棄せず、robots_retry_interval 以上待って再試行する
+            _FETCH_TOTAL.inc(result="robots_unreachable")
+            if not self._schedule_retry(current_url, current_depth, "robots_unreachable", self.config.robots_retry_interval):
+                logger.error(f"Giving up {current_url}: robots.txt of {urlparse(current_url).netloc} is unreachable.")
+            return
 
-        logger.info("Crawl finished.")
+        if not await self._is_allowed_by_robots(session, current_url):
+            _FETCH_TOTAL.inc(result="robots_disallowed")
+            logger.info(f"Skipping {current_url}: disallowed by robots.txt.")
+            return
+
+        logger.info(f"Crawling: {current_url} (Depth: {current_depth})")
+
+        page_state = None
+        if self.state_store:
+            page_state = self.state_store.get(current_url)
+            self.state_store.mark_seen(current_url)
+
+        if page_state is not None and url_fingerprint(current_url) in self._unchanged_urls:
+            # サイトマップの lastmod が前回の取得より前: 取得せずに前回記録したリンクを使ってクロールを続ける
+            _FETCH_TOTAL.inc(result="sitemap_unchanged")
+            logger.info(f"Not modified according to the sitemap: {current_url}")
+            self._queue_links(page_state.links, current_depth + 1)
+            return
+
+        try:
+            crawl_result = await self._fetch_and_process_url(session, current_url, page_state)
+            self._retry_counts.pop(current_url, None)
+            if crawl_result is None and page_state is not None:
+                # 304 Not Modified: 前回記録したリンクを使ってクロールを続ける
+                _FETCH_TOTAL.inc(result="not_modified")
+                logger.info(f"Not modified: {current_url}")
+                self._queue_links(page_state.links, current_depth + 1)
+            elif crawl_result:
+                _FETCH_TOTAL.inc(result="ok")
+                if crawl_result.mime_type and 'text/html' in crawl_result.mime_type:
+                    # HTMLは変換ステージで1回だけパースし、ドキュメントとリンクを同時に得る
+                    with _TRANSFORM_WAIT_SECONDS.time():
+                        transform_output = await self.transform_stage.transform(crawl_result)
+                    crawl_result.document = transform_output.document
+                    crawl_result.chunks = transform_output.chunks
+                    crawl_result.simhash = transform_output.simhash
+                    crawl_result.content_bytes = None # 変換後は生のバイト列を保持しない
+                    self._queue_links(transform_output.links, current_depth + 1)
+                    self._record_fetch(crawl_result, transform_output.links)
+                else:
+                    logger.info(f"Skipping link extraction for non-HTML content: {current_url}")
+                    if crawl_result.body_file is not None:
+                        await self._extract_text(crawl_result)
+                    self._record_fetch(crawl_result, [])
 
-    def _fetch_and_process_url(self, url: str) -> Optional[CrawlResult]:
+                if await self._put_result(crawl_result):
+                    logger.info(f"Pushed CrawlResult for: {current_url} to output queue.")
+
+        except BodyTooLargeError as e:
+            _FETCH_TOTAL.inc(result="too_large")
+            logger.warning(f"Skipping {current_url}: {e}")
+        except aiohttp.ClientResponseError as e:
+            _FETCH_TOTAL.inc(result=f"http_{e.status}")
+            retry_after = parse_retry_after(e.headers.get('Retry-After')) if e.headers else None
+            if e.status in self._RETRY_STATUSES and self._schedule_retry(current_url, current_depth, f"http_{e.status}", retry_after):
+                return
+            logger.error(f"Error crawling {current_url}: {e!r}")
+            if self.state_store and e.status in (404, 410):
+                self.state_store.mark_gone(current_url)
+        except asyncio.TimeoutError as e:
+            _FETCH_TOTAL.inc(result="timeout")
+            if self._schedule_retry(current_url, current_depth, "timeout"):
+                return
+            logger.error(f"Error crawling {current_url}: {e!r}")
+        except aiohttp.ClientError as e:
+            _FETCH_TOTAL.inc(result="network_error")
+            if self._schedule_retry(current_url, current_depth, "network_error"):
+                return
+            logger.error(f"Error crawling {current_url}: {e!r}")
+        except Exception as e:
+            _FETCH_TOTAL.inc(result="error")
+            logger.error(f"An unexpected error occurred while processing {current_url}: {e}")
+
+    async def _fetch_and_process_url(self, session: aiohttp.ClientSession, url: str, page_state: Optional[PageState] = None) -> Optional[CrawlResult]:
         """
         指定されたURLからコンテンツを取得し、CrawlResultオブジェクトを生成します。
+        同一ホストへのリクエストは HostThrottle によって同時実行数と間隔が制限されます。
+        前回の状態がある場合は条件付きGETを行い、304 Not Modified であればNoneを返します。
+        レスポンスはストリーミングで読み込み、HTML以外のコンテンツは本文を保持せずにサイズとハッシュ値のみを取得します
+        （テキストを抽出するコンテンツは、メモリまたは一時ファイルに書き出します）。
+        """
+        headers = {}
+        if page_state is not None:
+            if page_state.etag:
+                headers['If-None-Match'] = page_state.etag
+            if page_state.last_modified:
+                headers['If-Modified-Since'] = page_state.last_modified
+
+        host = urlparse(url).netloc
+        wait_started = time.perf_counter()
+        async with self.host_throttle.acquire(host):
+            _POLITENESS_WAIT_SECONDS.observe(time.perf_counter() - wait_started)
+            with _FETCH_SECONDS.time():
+                started = time.monotonic()
+                try:
+                    crawl_result = await self._fetch(session, url, headers)
+                except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+                    self.host_throttle.record_error(host, started)
+                    raise
+        return crawl_result
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, headers: dict) -> Optional[CrawlResult]:
+        """
+        HTTPリクエストを送信し、レスポンスからCrawlResultを生成します。304 Not Modified の場合はNoneを返します。
+        セッションを共有する他のクローラーと設定が異なるため、User-Agentとタイムアウトはリクエストごとに指定します。
         """
-        headers = {'User-Agent': self.config.user_agent}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        headers['User-Agent'] = self.config.user_agent
+        started = time.monotonic()
+        async with session.get(url, headers=headers, timeout=self._request_timeout) as response:
+            # レスポンスヘッダを受信するまでの時間と、ステータスコードをホストのリクエスト間隔の調整に使う
+            self.host_throttle.record_response(urlparse(url).netloc, response.status, started,
+                                               parse_retry_after(response.headers.get('Retry-After')))
+            if response.status == 304:
+                return None
+            response.raise_for_status()
 
-        mime_type = response.headers.get('Content-Type', '').split(';')[0].strip()
-        html_content = response.text if 'text/html' in mime_type else None
+            mime_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+            max_size = self._get_max_body_size(mime_type)
+            if response.content_length is not None and response.content_length > max_size:
+                raise BodyTooLargeError(f"Content-Length {response.content_length} exceeds the limit of {max_size} bytes for {mime_type or 'unknown'}.")
 
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            content_bytes = None
+            content_hash = None
+            body_file = None
+            if self._needs_body(mime_type):
+                content_bytes = await self._read_body(response, max_size, mime_type)
+                content_length = len(content_bytes)
+            elif self._needs_extraction(mime_type):
+                body_file = await self._spool_body(response, max_size, mime_type)
+                content_length, content_hash = body_file.size, body_file.hexdigest()
+            else:
+                content_length, content_hash = await self._measure_body(response, max_size, mime_type, etag, last_modified)
+
+        # デコードは変換ステージで行う
         return CrawlResult(
             url=url,
-            content=html_content,
-            content_bytes=response.content,
-            mime_type=mime_type
+            job=self.name,
+            content_bytes=content_bytes,
+            content_length=content_length,
+            content_hash=content_hash,
+            mime_type=mime_type,
+            encoding=response.charset,
+            etag=etag,
+            last_modified=last_modified,
+            body_file=body_file
         )
 
-    def _extract_and_queue_links(self, base_url: str, html_content: str, next_depth: int):
+    def _get_max_body_size(self, mime_type: str) -> int:
+        """
+        MIMEタイプに対応するレスポンスボディの最大サイズを返します。
+        `text/html` のような完全一致、`text/*` のようなワイルドカードの順に探し、無ければ max_body_size を返します。
+        """
+        sizes = self.config.max_body_sizes
+        if mime_type in sizes:
+            return sizes[mime_type]
+        wildcard = mime_type.split('/')[0] + '/*'
+        return sizes.get(wildcard, self.config.max_body_size)
+
+    def _needs_body(self, mime_type: str) -> bool:
+        """
+        本文を読み込む必要があるコンテンツかどうかを返します。
+        現在はテキストを抽出するHTMLのみが対象です。
+        """
+        return 'text/html' in mime_type
+
+    async def _read_body(self, response: aiohttp.ClientResponse, max_size: int, mime_type: str) -> bytes:
+        """
+        レスポンスボディをチャンク単位で読み込みます。上限サイズを超えた時点で読み込みを中止します。
+        """
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(self._READ_CHUNK_SIZE):
+            size += len(chunk)
+            _FETCHED_BYTES.inc(len(chunk))
+            if size > max_size:
+                raise BodyTooLargeError(f"Body exceeds the limit of {max_size} bytes for {mime_type}.")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _needs_extraction(self, mime_type: str) -> bool:
+        """
+        ワーカープロセスでテキストを抽出するコンテンツかどうかを返します。
+        """
+        return (self.extraction_pool is not None and mime_type in self.config.extract_mime_types
+                and is_supported(mime_type))
+
+    async def _spool_body(self, response: aiohttp.ClientResponse, max_size: int, mime_type: str) -> SpooledBody:
+        """
+        レスポンスボディをチャンク単位で SpooledBody に書き込みます。
+        extract_spool_size を超えるボディは一時ファイルに書き出すため、大きなファイルでも全体をメモリに保持しません。
+        """
+        body = SpooledBody(self.config.extract_spool_size)
+        try:
+            async for chunk in response.content.iter_chunked(self._READ_CHUNK_SIZE):
+                _FETCHED_BYTES.inc(len(chunk))
+                if body.size + len(chunk) > max_size:
+                    raise BodyTooLargeError(f"Body exceeds the limit of {max_size} bytes for {mime_type}.")
+                body.write(chunk)
+        except BaseException:
+            body.close()
+            raise
+        return body
+
+    async def _extract_text(self, crawl_result: CrawlResult):
+        """
+        抽出ワーカープロセスでボディからテキストを抽出し、クロール結果に設定します。
+        抽出に失敗した場合（時間切れ・メモリ超過・ファイルの破損など）は、本文なしのドキュメントとして扱います。
+        ボディ（一時ファイル）は抽出の成否にかかわらず破棄します。
+        """
+        try:
+            with _EXTRACT_WAIT_SECONDS.time():
+                extracted = await self.extraction_pool.extract(crawl_result.body_file, crawl_result.mime_type)
+            crawl_result.extracted_text = extracted.text
+            crawl_result.extracted_title = extracted.title
+            if extracted.truncated:
+                logger.info(f"Extracted text was truncated to {self.extraction_pool.max_chars} characters: {crawl_result.url}")
+        except ExtractionError as e:
+            logger.warning(f"Could not extract text from {crawl_result.url}: {e}")
+        finally:
+            crawl_result.body_file.close()
+            crawl_result.body_file = None
+
+    async def _measure_body(self, response: aiohttp.ClientResponse, max_size: int, mime_type: str,
+                            etag: Optional[str], last_modified: Optional[str]) -> Tuple[int, Optional[str]]:
+        """
+        本文を保持せずに、レスポンスボディのサイズと変更検知用のハッシュ値を返します。
+        Content-Length と検証用ヘッダ（ETag/Last-Modified）があればボディを読まずにヘッダから求め、
+        無い場合はボディを読み捨てながらバイト数を数え、ハッシュ値を計算します。
+        """
+        if response.content_length is not None and (etag or last_modified):
+            fingerprint = f"{response.content_length}\n{etag or ''}\n{last_modified or ''}"
+            return response.content_length, hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in response.content.iter_chunked(self._READ_CHUNK_SIZE):
+            size += len(chunk)
+            _FETCHED_BYTES.inc(len(chunk))
+            if size > max_size:
+                raise BodyTooLargeError(f"Body exceeds the limit of {max_size} bytes for {mime_type or 'unknown'}.")
+            digest.update(chunk)
+        return size, digest.hexdigest()
+
+    def _schedule_retry(self, url: str, depth: int, reason: str, retry_after: Optional[float] = None) -> bool:
+        """
+        一時的なエラーで取得に失敗したURLを、待ち時間の後にクロール対象キューへ戻します。
+        待ち時間は retry_base_delay から試行のたびに2倍にし（retry_max_delay まで）、Retry-After が指定された場合はそれ以上待ちます。
+        試行回数が fetch_max_retries に達した場合や停止要求を受けている場合は再試行せず、Falseを返します。
+        """
+        attempt = self._retry_counts.get(url, 0) + 1
+        if attempt > self.config.fetch_max_retries or self.stop_event.is_set():
+            self._retry_counts.pop(url, None)
+            return False
+        self._retry_counts[url] = attempt
+        delay = self.config.retry_base_delay * 2 ** (attempt - 1)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        # 同時に失敗したURLの再試行が重ならないよう、待ち時間を少しずらす
+        delay = min(delay * random.uniform(1.0, 1.2), self.config.retry_max_delay)
+        _FETCH_RETRIES_TOTAL.inc(reason=reason)
+        logger.warning(f"Retrying {url} in {delay:.1f}s (attempt {attempt}/{self.config.fetch_max_retries}, {reason}).")
+        # 再試行を待つ間もワーカーが終了しないよう、処理中として数える
+        self._in_flight += 1
+        task = asyncio.ensure_future(self._requeue_later((url, depth), delay))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+        return True
+
+    async def _requeue_later(self, item: Tuple[str, int], delay: float):
+        """
+        待ち時間の後にURLをクロール対象キューへ戻します。
+        """
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            # 待機中にクロールが終了した場合も、ディスクベースのキューでは次回の再開時に取得されるようキューに戻す
+            self.crawl_target_queue.requeue(item)
+            self._in_flight -= 1
+
+    async def _put_result(self, crawl_result: CrawlResult) -> bool:
         """
-        HTMLコンテンツからリンクを抽出し、クロール対象キューに追加します。
+        クロール結果を出力キューに追加します。
+        キューが満杯の間はイベントループを止めずに待機するため、インデックスが追いつくまでこのワーカーのクロールが止まります。
+        待機中に停止要求を受けた場合は結果を破棄し、Falseを返します。
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            absolute_url = urljoin(base_url, href)
-            
-            # フラグメント識別子を除去
-            absolute_url = absolute_url.split('#')[0]
+        with _RESULT_QUEUE_WAIT_SECONDS.time():
+            while True:
+                try:
+                    self.output_queue.put(crawl_result, timeout=0)
+                    return True
+                except queue.Full:
+                    if self.stop_event.is_set():
+                        # 記録済みの検証用ヘッダで次回304にならないよう、状態を破棄する
+                        if self.state_store:
+                            self.state_store.invalidate(crawl_result.url)
+                        return False
+                    await asyncio.sleep(self._IDLE_POLL_INTERVAL)
 
+    def _record_fetch(self, crawl_result: CrawlResult, links: List[str]):
+        """
+        インクリメンタルクロール用に、検証用ヘッダとリンクを状態ストアに記録します。
+        """
+        if self.state_store:
+            self.state_store.record_fetch(crawl_result.url, crawl_result.etag, crawl_result.last_modified, links)
+
+    async def _is_allowed_by_robots(self, session: aiohttp.ClientSession, url: str) -> bool:
+        """
+        URLへのアクセスが robots.txt で許可されているかを返します。respect_robots_txt が無効の場合は常にTrueです。
+        """
+        if not self.config.respect_robots_txt:
+            return True
+        rules = await self._get_robots(session, url)
+        parsed = urlparse(url)
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        return rules.is_allowed(path)
+
+    async def _get_robots(self, session: aiohttp.ClientSession, url: str) -> RobotsRules:
+        """
+        URLのホストの robots.txt のルールを返します。初回の呼び出し時に取得し、以降は同じ結果を返します。
+        robots.txt を取得できなかった場合は、robots_retry_interval が経過した後の呼び出しで再取得します。
+        """
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        future = self._robots.get(origin)
+        retry_at = self._robots_retry_at.get(origin)
+        if future is None or (retry_at is not None and future.done() and time.monotonic() >= retry_at):
+            self._robots_retry_at.pop(origin, None)
+            future = asyncio.ensure_future(self._fetch_robots(session, origin))
+            self._robots[origin] = future
+        # 待機中のワーカーが中断されても、他のワーカーが待つ取得処理は取り消さない
+        return await asyncio.shield(future)
+
+    async def _fetch_robots(self, session: aiohttp.ClientSession, origin: str) -> RobotsRules:
+        """
+        robots.txt を取得して解析します。RFC 9309 に従い、4xx（429を除く）の場合はすべて許可し、
+        5xx・429・接続エラーの場合は到達不能とみなして、robots_retry_interval の間すべて禁止します。
+        Crawl-delay が指定されている場合は、robots_max_crawl_delay を上限としてホストのリクエスト間隔に反映します。
+        """
+        host = urlparse(origin).netloc
+        robots_url = f"{origin}/robots.txt"
+        try:
+            async with self.host_throttle.acquire(host):
+                async with session.get(robots_url, headers={'User-Agent': self.config.user_agent},
+                                       timeout=self._request_timeout) as response:
+                    if response.status >= 500 or response.status == 429:
+                        return self._robots_unreachable(origin, f"{robots_url} returned {response.status}")
+                    if response.status >= 400:
+                        _ROBOTS_FETCH_TOTAL.inc(result="unavailable")
+                        logger.info(f"{robots_url} returned {response.status}. All paths of {host} are allowed.")
+                        return RobotsRules.allow_all()
+                    # 上限を超える部分は読まずに、先頭だけを解析する
+                    chunks = []
+                    size = 0
+                    async for chunk in response.content.iter_chunked(self._READ_CHUNK_SIZE):
+                        _FETCHED_BYTES.inc(len(chunk))
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= MAX_ROBOTS_SIZE:
+                            break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return self._robots_unreachable(origin, f"Could not fetch {robots_url}: {e!r}")
+
+        _ROBOTS_FETCH_TOTAL.inc(result="ok")
+        text = b"".join(chunks)[:MAX_ROBOTS_SIZE].decode('utf-8', errors='replace')
+        rules = RobotsRules.parse(text, self.config.user_agent)
+        if self.config.respect_robots_txt and rules.crawl_delay:
+            crawl_delay = min(rules.crawl_delay, self.config.robots_max_crawl_delay)
+            self.host_throttle.set_min_delay(host, crawl_delay)
+            logger.info(f"Using Crawl-delay {crawl_delay}s for {host}.")
+        return rules
+
+    def _robots_unreachable(self, origin: str, reason: str) -> RobotsRules:
+        """
+        robots.txt を取得できなかったホストを、robots_retry_interval の間すべて禁止するルールを返します。
+        """
+        _ROBOTS_FETCH_TOTAL.inc(result="unreachable")
+        self._robots_retry_at[origin] = time.monotonic() + self.config.robots_retry_interval
+        logger.error(f"{reason}. Not crawling {urlparse(origin).netloc} until robots.txt is fetched again "
+                     f"in {self.config.robots_retry_interval:.0f}s; its URLs are retried up to {self.config.fetch_max_retries} times.")
+        return RobotsRules.unreachable_host()
+
+    async def _discover_from_sitemaps(self, session: aiohttp.ClientSession):
+        """
+        サイトマップに記載されたURLをクロール対象キューに追加します。
+        サイトマップインデックスに含まれる子サイトマップも読み、読み込むファイル数は sitemap_max_files 個までとします。
+        """
+        try:
+            pending: Deque[str] = deque(await self._initial_sitemap_urls(session))
+            visited: Set[str] = set()
+            while pending and not self.stop_event.is_set():
+                sitemap_url = pending.popleft()
+                if sitemap_url in visited:
+                    continue
+                if len(visited) >= self.config.sitemap_max_files:
+                    logger.warning(f"[{self.name}] Reached the limit of {self.config.sitemap_max_files} sitemap files. "
+                                   f"{len(pending) + 1} sitemap(s) are not read.")
+                    break
+                visited.add(sitemap_url)
+                pending.extend(await self._read_sitemap(session, sitemap_url))
+        except Exception as e:
+            logger.error(f"[{self.name}] An unexpected error occurred while reading sitemaps: {e}")
+        finally:
+            self._in_flight -= 1
+
+    async def _initial_sitemap_urls(self, session: aiohttp.ClientSession) -> List[str]:
+        """
+        最初に読むサイトマップのURLを返します。sitemap_urls に加え、use_sitemaps が有効な場合は開始URLのホストの
+        robots.txt の Sitemap 行（無い場合は /sitemap.xml）を使用します。シャード分割時は担当ホストのものだけを返します。
+        """
+        urls = [url for url in self.config.sitemap_urls if self._owns(url)]
+        if self.config.use_sitemaps:
+            origins = dict.fromkeys(f"{parsed.scheme}://{parsed.netloc}"
+                                    for parsed in map(urlparse, self.config.start_urls))
+            for origin in origins:
+                if self._owns(origin):
+                    rules = await self._get_robots(session, origin)
+                    urls.extend(rules.sitemaps or [f"{origin}/sitemap.xml"])
+        return urls
+
+    async def _read_sitemap(self, session: aiohttp.ClientSession, sitemap_url: str) -> List[str]:
+        """
+        サイトマップをストリーミングで読み込み、記載されたURLをキューに追加します。
+        サイトマップインデックスの場合は、子サイトマップのURLのリストを返します。
+        """
+        if not await self._is_allowed_by_robots(session, sitemap_url):
+            if (await self._get_robots(session, sitemap_url)).unreachable:
+                logger.warning(f"Skipping sitemap {sitemap_url}: robots.txt is unreachable.")
+            else:
+                logger.info(f"Skipping sitemap {sitemap_url}: disallowed by robots.txt.")
+            return []
+        parser = SitemapParser(self.config.sitemap_max_size)
+        children: List[str] = []
+        try:
+            async with self.host_throttle.acquire(urlparse(sitemap_url).netloc):
+                async with session.get(sitemap_url, headers={'User-Agent': self.config.user_agent},
+                                       timeout=self._sitemap_timeout) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(self._READ_CHUNK_SIZE):
+                        _FETCHED_BYTES.inc(len(chunk))
+                        children.extend(self._queue_sitemap_entries(parser.feed(chunk)))
+                    children.extend(self._queue_sitemap_entries(parser.close()))
+        except SitemapError as e:
+            logger.warning(f"Could not parse sitemap {sitemap_url}: {e}")
+        except aiohttp.ClientResponseError as e:
+            logger.warning(f"Could not fetch sitemap {sitemap_url}: HTTP {e.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Could not fetch sitemap {sitemap_url}: {e!r}")
+        logger.info(f"Read sitemap {sitemap_url} ({parser.size} bytes, {len(children)} child sitemap(s)).")
+        return children
+
+    def _queue_sitemap_entries(self, entries: List[SitemapEntry]) -> List[str]:
+        """
+        サイトマップのエントリのうちクロール対象のURLを深度0でキューに追加し、子サイトマップのURLのリストを返します。
+        """
+        children = []
+        for entry in entries:
+            if entry.is_sitemap:
+                children.append(entry.loc)
+            elif not self._is_valid_url(entry.loc):
+                _SITEMAP_URLS_TOTAL.inc(result="filtered")
+            else:
+                # リンクから先にキューに追加されたURLも、取得前であればスキップできるよう先に記録する
+                unchanged = self._is_unchanged_since_last_fetch(entry)
+                if unchanged:
+                    self._unchanged_urls.add(url_fingerprint(entry.loc))
+                if not self.crawl_target_queue.put((entry.loc, 0), sitemap_priority=entry.priority):
+                    _SITEMAP_URLS_TOTAL.inc(result="duplicate")
+                else:
+                    _SITEMAP_URLS_TOTAL.inc(result="unchanged" if unchanged else "queued")
+        return children
+
+    def _is_unchanged_since_last_fetch(self, entry: SitemapEntry) -> bool:
+        """
+        サイトマップの lastmod が、前回ページを取得してインデックスした日時より前かを返します。
+        """
+        if self.state_store is None or entry.lastmod is None or not self._owns(entry.loc):
+            return False
+        page_state = self.state_store.get(entry.loc)
+        return (page_state is not None and page_state.content_hash is not None and page_state.fetched_at is not None
+                and entry.lastmod.timestamp() <= page_state.fetched_at)
+
+    def _owns(self, url: str) -> bool:
+        return self.owns is None or self.owns(url)
+
+    def _queue_links(self, links: List[str], next_depth: int):
+        """
+        パース済みのリンクのうちクロール対象のものを、クロール対象キューに追加します。
+        同じページ内の同じリンクは1回だけ追加し、優先度順の場合の被リンク数を1ページにつき1と数えます。
+        """
+        for absolute_url in dict.fromkeys(links):
             if self._is_valid_url(absolute_url):
                 self.crawl_target_queue.put((absolute_url, next_depth))
+
+
+def create_session(configs: List[CrawlerConfig]) -> aiohttp.ClientSession:
+    """
+    クローラーが使用するHTTPセッション（コネクションプール）を生成します。
+    複数の設定で共有する場合、全体の接続数は各設定の max_concurrency の合計、
+    ホストごとの接続数は per_host_concurrency の最大値を上限とします。
+    """
+    connector = aiohttp.TCPConnector(
+        limit=sum(max(1, config.max_concurrency) for config in configs),
+        limit_per_host=max(config.per_host_concurrency for config in configs)
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def crawl_concurrently(crawlers: List[WebCrawler]):
+    """
+    複数のクローラーを1つのイベントループで同時に実行します。
+    HTTPセッション（コネクションプール）は全クローラーで共有します。
+    """
+    async def _run():
+        async with create_session([crawler.config for crawler in crawlers]) as session:
+            await asyncio.gather(*(crawler.crawl_with_session(session) for crawler in crawlers))
+
+    logger.info(f"Starting {len(crawlers)} crawl(s)...")
+    asyncio.run(_run())
+    logger.info("All crawls finished.")
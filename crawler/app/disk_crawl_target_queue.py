@@ -0,0 +1,262 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Tuple
+
+from fingerprint_set import FingerprintSet, url_fingerprint
+from frontier_priority import PriorityScorer
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _to_signed(fingerprint: int) -> int:
+    """
+    SQLiteのINTEGER（符号付き64ビット）に格納できるよう変換します。
+    """
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class DiskCrawlTargetQueue:
+    """
+    未処理のクロール対象URLをSQLiteに保存するディスクベースのキュー。
+    CrawlTargetQueue と同じ put/get/task_done インターフェースを持ちます。
+    既出URLの重複排除は64ビットのフィンガープリント（FingerprintSet）で行うため、
+    メモリ上にはURL文字列を保持しません。
+    一定回数の更新ごとにチェックポイント（コミット）し、強制終了されたクロールは
+    次回起動時に最後のチェックポイントから再開できます。
+    scorer を指定した場合は、追加順ではなくスコアの大きい順にURLを取り出します。スコアはインデックスを付けた列に保存し、
+    取得前のURLが再び見つかった場合は被リンク数を増やしてスコアを更新します。
+    """
+    _READ_BATCH_SIZE = 256
+    # 優先度順の場合は、先読み後に見つかったURLのスコアが早く反映されるよう先読みを少なくする
+    _PRIORITY_READ_BATCH_SIZE = 32
+
+    def __init__(self, path: str, checkpoint_interval: int = 1000, scorer: Optional[PriorityScorer] = None):
+        self.path = path
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self.scorer = scorer
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._not_empty = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                score REAL NOT NULL DEFAULT 0,
+                inlinks INTEGER NOT NULL DEFAULT 0,
+                sitemap_priority REAL,
+                leased INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # 優先度の列が無い古いファイルには列を追加する
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(frontier)")}
+        for column, definition in (("score", "REAL NOT NULL DEFAULT 0"), ("inlinks", "INTEGER NOT NULL DEFAULT 0"),
+                                   ("sitemap_priority", "REAL"), ("leased", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE frontier ADD COLUMN {column} {definition}")
+        if scorer is not None:
+            # 取り出し（スコア順）と、再発見時のスコアの更新（URLで検索）を O(log n) で行うためのインデックス
+            self._conn.execute("CREATE INDEX IF NOT EXISTS frontier_priority ON frontier (leased, score DESC, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS frontier_url ON frontier (url)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (fp INTEGER PRIMARY KEY) WITHOUT ROWID")
+
+        self._seen = FingerprintSet()
+        self._buffer: Deque[Tuple[int, str, int]] = deque()  # ディスクから先読みした未処理URL
+        self._leased: "OrderedDict[str, int]" = OrderedDict()  # 取り出し済みで処理中のURLと行ID
+        self._last_read_id = 0
+        self._pending_count = 0
+        self._uncommitted_writes = 0
+        self._resume()
+
+    def _resume(self):
+        """
+        前回のチェックポイントを読み込みます。
+        未処理のURLが残っていない場合は前回のクロールが完了しているとみなし、新しいクロールとして開始します。
+        """
+        pending = self._conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        if pending == 0:
+            self._conn.execute("DELETE FROM seen")
+            self._conn.commit()
+            return
+
+        for (fp,) in self._conn.execute("SELECT fp FROM seen"):
+            self._seen.add(_to_unsigned(fp))
+        # 前回先読みしたまま処理されなかったURLも取り出せるようにする
+        self._conn.execute("UPDATE frontier SET leased = 0 WHERE leased = 1")
+        self._conn.commit()
+        self._pending_count = pending
+        logger.info(f"Resumed crawl frontier from {self.path}: {pending} pending URL(s), {len(self._seen)} seen URL(s).")
+
+    def put(self, item: Tuple[str, int], sitemap_priority: Optional[float] = None) -> bool:
+        """
+        URLと深度のタプルをキューに追加します。
+        既にキューに存在するか、処理済みであれば追加しません。優先度順の場合、取得前のURLはスコアを更新します。
+        """
+        url, depth = item
+        fingerprint = url_fingerprint(url)
+        with self._lock:
+            if not self._seen.add(fingerprint):
+                if self.scorer is not None:
+                    self._rescore(url, depth, sitemap_priority)
+                return False
+            self._conn.execute("INSERT OR IGNORE INTO seen (fp) VALUES (?)", (_to_signed(fingerprint),))
+            self._insert(url, depth, sitemap_priority)
+            return True
+
+    def requeue(self, item: Tuple[str, int]):
+        """
+        再試行するURLをキューに戻します。取得済みのURLのため、重複の判定は行いません。
+        """
+        url, depth = item
+        with self._lock:
+            self._insert(url, depth, None)
+
+    def _insert(self, url: str, depth: int, sitemap_priority: Optional[float]):
+        score = self.scorer.score(url, depth, 0, sitemap_priority) if self.scorer is not None else 0.0
+        self._conn.execute("INSERT INTO frontier (url, depth, score, sitemap_priority) VALUES (?, ?, ?, ?)",
+                           (url, depth, score, sitemap_priority))
+        self._pending_count += 1
+        self._after_write()
+        self._not_empty.notify()
+
+    def _rescore(self, url: str, depth: int, sitemap_priority: Optional[float]):
+        """
+        取得前（先読み前）のURLが再び見つかった場合に、被リンク数と深さ、スコアを更新します。
+        """
+        row = self._conn.execute(
+            "SELECT id, depth, inlinks, sitemap_priority FROM frontier WHERE url = ? AND leased = 0", (url,)
+        ).fetchone()
+        if row is None:
+            return
+        row_id, current_depth, inlinks, current_sitemap_priority = row
+        depth = min(depth, current_depth)
+        inlinks += 1
+        if sitemap_priority is None:
+            sitemap_priority = current_sitemap_priority
+        score = self.scorer.score(url, depth, inlinks, sitemap_priority)
+        self._conn.execute("UPDATE frontier SET depth = ?, inlinks = ?, sitemap_priority = ?, score = ? WHERE id = ?",
+                           (depth, inlinks, sitemap_priority, score, row_id))
+        self._after_write()
+
+    def get(self, timeout: float = None) -> Tuple[str, int]:
+        """
+        キューからURLと深度のタプルを取得します。
+        timeout秒以内に取得できない場合は queue.Empty を送出します。
+        """
+        with self._not_empty:
+            if timeout is None:
+                while self._pending_count == 0:
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while self._pending_count == 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+
+            if not self._buffer:
+                self._fill_buffer()
+            row_id, url, depth = self._buffer.popleft()
+            self._pending_count -= 1
+            self._leased[url] = row_id
+            return url, depth
+
+    def task_done(self, item: Optional[Tuple[str, int]] = None):
+        """
+        取得したタスクの処理が完了したことを通知します。
+        itemを指定した場合はそのURLを、省略した場合は最も古く取り出されたURLを完了として扱い、ディスクから削除します。
+        """
+        with self._lock:
+            if item is not None and item[0] in self._leased:
+                row_id = self._leased.pop(item[0])
+            elif self._leased:
+                _, row_id = self._leased.popitem(last=False)
+            else:
+                raise ValueError("task_done() called too many times")
+            self._conn.execute("DELETE FROM frontier WHERE id = ?", (row_id,))
+            self._after_write()
+
+    def empty(self) -> bool:
+        """
+        キューが空かどうかを返します。
+        """
+        with self._lock:
+            return self._pending_count == 0
+
+    def qsize(self) -> int:
+        """
+        キューの現在のサイズを返します。
+        """
+        with self._lock:
+            return self._pending_count
+
+    def get_seen_urls_count(self) -> int:
+        """
+        これまでにキューに追加された、または処理中のユニークなURLの数を返します。
+        """
+        with self._lock:
+            return len(self._seen)
+
+    def checkpoint(self):
+        """
+        未コミットの変更をディスクに書き込みます。
+        """
+        with self._lock:
+            self._conn.commit()
+            self._uncommitted_writes = 0
+
+    def close(self):
+        """
+        チェックポイントを作成し、データベースを閉じます。
+        """
+        with self._lock:
+            self.checkpoint()
+            self._conn.close()
+        logger.info(f"Crawl frontier saved to {self.path} (seen-set: {self._seen.nbytes()} bytes for {len(self._seen)} URL(s)).")
+
+    def _fill_buffer(self):
+        """
+        未処理のURLをディスクからまとめて先読みします。
+        """
+        if self.scorer is not None:
+            # スコア順に先読みし、再び読まないよう先読み済みの印を付ける（再開時に外す）
+            rows = self._conn.execute(
+                "SELECT id, url, depth FROM frontier WHERE leased = 0 ORDER BY score DESC, id LIMIT ?",
+                (self._PRIORITY_READ_BATCH_SIZE,)
+            ).fetchall()
+            self._conn.executemany("UPDATE frontier SET leased = 1 WHERE id = ?", [(row[0],) for row in rows])
+            self._buffer.extend(rows)
+            return
+        rows = self._conn.execute(
+            "SELECT id, url, depth FROM frontier WHERE id > ? ORDER BY id LIMIT ?",
+            (self._last_read_id, self._READ_BATCH_SIZE)
+        ).fetchall()
+        self._buffer.extend(rows)
+        if rows:
+            self._last_read_id = rows[-1][0]
+
+    def _after_write(self):
+        """
+        更新回数が checkpoint_interval に達したらコミットします。
+        """
+        self._uncommitted_writes += 1
+        if self._uncommitted_writes >= self.checkpoint_interval:
+            self.checkpoint()
@@ -1,7 +1,7 @@
 from dataclasses import dataclass, asdict
-from typing import Optional
+from typing import List, Optional
 
-@dataclass
+@dataclass(slots=True)
 class Document:
     """
     Elasticsearchに保存されるドキュメントのエンティティ。
@@ -12,9 +12,35 @@ class Document:
     content_length: int
     mime_type: str
     timestamp: str
+    content_hash: Optional[str] = None # 変更検知のためのコンテンツのハッシュ値
+    canonical_url: Optional[str] = None # 近似重複と判定された場合の、正規ドキュメントのURL
 
     def to_dict(self):
         """
         ドキュメントエンティティを辞書形式に変換します。
         """
         return asdict(self)
+
+
+@dataclass(slots=True)
+class DocumentChunk:
+    """
+    ドキュメントを分割したパッセージ（チャンク）のエンティティ。ドキュメントのインデックスとは別のチャンクインデックスに保存されます。
+    start_offset / end_offset は、ドキュメントの content をUTF-8でエンコードしたときのバイト位置です。
+    """
+    url: str
+    doc_id: str # 元のドキュメントのID
+    title: str
+    heading_path: List[str] # チャンクが属する見出しの階層（上位から順）
+    content: str
+    position: int # ドキュメント内でのチャンクの順番（0始まり）
+    start_offset: int
+    end_offset: int
+    mime_type: str
+    timestamp: str
+
+    def to_dict(self):
+        """
+        チャンクエンティティを辞書形式に変換します。
+        """
+        return asdict(self)
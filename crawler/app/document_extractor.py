@@ -0,0 +1,403 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from metrics import REGISTRY
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    import resource
+except ImportError:  # resource はUnix系のみ
+    resource = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pypdf は任意の依存関係
+    PdfReader = None
+
+# メトリクス
+_EXTRACT_SECONDS = REGISTRY.histogram("crawler_extract_seconds", "Time spent extracting text from documents, by type", ["type"])
+_EXTRACT_TOTAL = REGISTRY.counter("crawler_extract_total", "Document text extractions by type and result", ["type", "result"])
+
+PDF_MIME_TYPE = "application/pdf"
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PPTX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DEFAULT_EXTRACT_MIME_TYPES = [PDF_MIME_TYPE, DOCX_MIME_TYPE, PPTX_MIME_TYPE, XLSX_MIME_TYPE, "text/plain", "text/markdown"]
+
+# Office Open XML の名前空間
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_S_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DC_TITLE = "{http://purl.org/dc/elements/1.1/}title"
+
+
+@dataclass
+class ExtractedText:
+    """
+    ドキュメントから抽出したテキストとタイトル。
+    """
+    text: str
+    title: Optional[str] = None
+    truncated: bool = False # max_chars で打ち切った場合はTrue
+
+
+class ExtractionError(Exception):
+    """
+    テキストを抽出できなかった場合（時間切れ・メモリ超過・ファイルの破損など）に送出される例外。
+    """
+    pass
+
+
+class SpooledBody:
+    """
+    レスポンスボディを書き込むための一時領域。
+    spool_size バイトまではメモリ上に保持し、超えた時点で一時ファイルに書き出します。
+    書き込みと同時にサイズとSHA-256ハッシュ値を計算します。
+    """
+    def __init__(self, spool_size: int = 1024 * 1024, directory: Optional[str] = None):
+        self.spool_size = spool_size
+        self.directory = directory
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+
+    @property
+    def path(self) -> Optional[str]:
+        return self._file.name if self._file else None
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._digest.update(chunk)
+        if self._file is None and self.size > self.spool_size:
+            self._file = tempfile.NamedTemporaryFile(prefix="crawler-body-", dir=self.directory, delete=False)
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+    def payload(self) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        ワーカープロセスに渡す (メモリ上のボディ, 一時ファイルのパス) を返します。どちらか一方だけが値を持ちます。
+        """
+        if self._file is not None:
+            self._file.flush()
+            return None, self._file.name
+        return self._buffer.getvalue(), None
+
+    def close(self):
+        """
+        一時ファイルを削除し、メモリ上のボディを解放します。
+        """
+        self._buffer = None
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._file.name)
+            except OSError:
+                pass
+            self._file = None
+
+
+def _open_payload(data: Optional[bytes], path: Optional[str]):
+    return io.BytesIO(data) if data is not None else open(path, "rb")
+
+
+class _TextCollector:
+    """
+    抽出したテキストを max_chars 文字まで集めるクラス。上限に達した後の追加は無視します。
+    """
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.length = 0
+        self.truncated = False
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.max_chars
+
+    def add(self, text: Optional[str]):
+        if not text or self.full:
+            if text and self.full:
+                self.truncated = True
+            return
+        remaining = self.max_chars - self.length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.length += len(text)
+
+    def result(self, title: Optional[str]) -> ExtractedText:
+        return ExtractedText(text="\n".join(self.parts).strip(), title=title, truncated=self.truncated)
+
+
+def _extract_pdf(stream, max_chars: int) -> ExtractedText:
+    if PdfReader is None:
+        raise ExtractionError("pypdf is not installed.")
+    reader = PdfReader(stream)
+    title = None
+    if reader.metadata is not None and reader.metadata.title:
+        title = str(reader.metadata.title).strip() or None
+    collector = _TextCollector(max_chars)
+    # ページを1枚ずつ読み込み、上限に達した時点で残りのページは読まない
+    for page in reader.pages:
+        collector.add(page.extract_text())
+        if collector.full:
+            break
+    return collector.result(title)
+
+
+def _iter_xml_text(archive: zipfile.ZipFile, name: str, text_tag: str, block_tag: str, collector: _TextCollector):
+    """
+    Office Open XML の部品をストリーミングでパースし、ブロック（段落など）ごとにテキストを集めます。
+    """
+    with archive.open(name) as part:
+        block: List[str] = []
+        for event, element in ElementTree.iterparse(part, events=("end",)):
+            if element.tag == text_tag and element.text:
+                block.append(element.text)
+            elif element.tag == block_tag:
+                collector.add("".join(block))
+                block = []
+                element.clear()
+                if collector.full:
+                    return
+        collector.add("".join(block))
+
+
+def _office_title(archive: zipfile.ZipFile) -> Optional[str]:
+    try:
+        with archive.open("docProps/core.xml") as part:
+            root = ElementTree.parse(part).getroot()
+    except (KeyError, ElementTree.ParseError):
+        return None
+    title = root.find(_DC_TITLE)
+    return title.text.strip() if title is not None and title.text and title.text.strip() else None
+
+
+def _numbered_parts(archive: zipfile.ZipFile, prefix: str) -> List[str]:
+    """
+    slide1.xml, slide2.xml ... のような連番の部品を番号順に返します。
+    """
+    names = [name for name in archive.namelist() if name.startswith(prefix) and name.endswith(".xml")]
+    return sorted(names, key=lambda name: int("".join(c for c in name[len(prefix):] if c.isdigit()) or 0))
+
+
+def _extract_docx(stream, max_chars: int) -> ExtractedText:
+    with zipfile.ZipFile(stream) as archive:
+        collector = _TextCollector(max_chars)
+        _iter_xml_text(archive, "word/document.xml", f"{_W_NS}t", f"{_W_NS}p", collector)
+        return collector.result(_office_title(archive))
+
+
+def _extract_pptx(stream, max_chars: int) -> ExtractedText:
+    with zipfile.ZipFile(stream) as archive:
+        collector = _TextCollector(max_chars)
+        for name in _numbered_parts(archive, "ppt/slides/slide"):
+            _iter_xml_text(archive, name, f"{_A_NS}t", f"{_A_NS}p", collector)
+            if collector.full:
+                break
+        return collector.result(_office_title(archive))
+
+
+def _extract_xlsx(stream, max_chars: int) -> ExtractedText:
+    with zipfile.ZipFile(stream) as archive:
+        collector = _TextCollector(max_chars)
+        # セルの文字列は共有文字列テーブルにまとめて保存されている
+        if "xl/sharedStrings.xml" in archive.namelist():
+            _iter_xml_text(archive, "xl/sharedStrings.xml", f"{_S_NS}t", f"{_S_NS}si", collector)
+        return collector.result(_office_title(archive))
+
+
+def _extract_plain_text(stream, max_chars: int) -> ExtractedText:
+    reader = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+    text = reader.read(max_chars + 1)
+    return ExtractedText(text=text[:max_chars].strip(), truncated=len(text) > max_chars)
+
+
+_EXTRACTORS: Dict[str, Callable] = {
+    PDF_MIME_TYPE: _extract_pdf,
+    DOCX_MIME_TYPE: _extract_docx,
+    PPTX_MIME_TYPE: _extract_pptx,
+    XLSX_MIME_TYPE: _extract_xlsx,
+    "text/plain": _extract_plain_text,
+    "text/markdown": _extract_plain_text,
+}
+
+
+def is_supported(mime_type: str) -> bool:
+    """
+    テキストを抽出できるMIMEタイプかどうかを返します。
+    """
+    if mime_type == PDF_MIME_TYPE and PdfReader is None:
+        return False
+    return mime_type in _EXTRACTORS
+
+
+def extract_text(mime_type: str, data: Optional[bytes], path: Optional[str], max_chars: int) -> ExtractedText:
+    """
+    メモリ上のボディまたはファイルからテキストを抽出します。ワーカープロセス内で実行されます。
+    """
+    extractor = _EXTRACTORS.get(mime_type)
+    if extractor is None:
+        raise ExtractionError(f"Unsupported MIME type: {mime_type}")
+    with _open_payload(data, path) as stream:
+        return extractor(stream, max_chars)
+
+
+def _worker_main(connection, memory_limit: Optional[int]):
+    """
+    抽出ワーカープロセスの本体。親プロセスから (MIMEタイプ, ボディ, パス, 最大文字数) を受け取り、結果を返します。
+    アドレス空間の上限を設定し、巨大なファイルや壊れたファイルでメモリを使い果たしてもこのプロセスだけが失敗するようにします。
+    """
+    if memory_limit and resource is not None:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not set the memory limit of the extraction worker: {e}")
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        mime_type, data, path, max_chars = task
+        try:
+            connection.send(("ok", extract_text(mime_type, data, path, max_chars)))
+        except MemoryError:
+            connection.send(("memory", "Memory limit exceeded."))
+        except Exception as e:
+            connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """
+    抽出ワーカープロセスと、そのプロセスとの通信路。
+    """
+    def __init__(self, context, memory_limit: Optional[int]):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, memory_limit), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class ExtractionPool:
+    """
+    PDFやOffice文書からテキストを抽出するワーカープロセスのプール。
+    ファイルごとに時間の上限（timeout）を、ワーカープロセスごとにメモリの上限（memory_limit）を設け、
+    上限を超えたワーカーや異常終了したワーカーは強制終了して新しいプロセスに置き換えます。
+    大きなボディは一時ファイルのパスで受け渡すため、ワーカーとの間で全体をコピーしません。
+    """
+    def __init__(self, workers: int = 2, timeout: float = 60.0, memory_limit: Optional[int] = None,
+                 max_chars: int = 1_000_000):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_chars = max_chars
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        # ワーカーとの通信（結果の待機）はスレッドで行い、イベントループを止めない
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="extract")
+        for _ in range(self.workers):
+            self._idle.put(self._spawn())
+        logger.info(f"Extraction pool started with {self.workers} worker process(es).")
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.memory_limit)
+        with self._lock:
+            self._all.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        with self._lock:
+            self._all.remove(worker)
+        return self._spawn()
+
+    async def extract(self, body: SpooledBody, mime_type: str) -> ExtractedText:
+        """
+        ボディからテキストを抽出します。失敗した場合は ExtractionError を送出します。
+        """
+        loop = asyncio.get_running_loop()
+        data, path = body.payload()
+        return await loop.run_in_executor(self._executor, self._extract_blocking, mime_type, data, path)
+
+    def _extract_blocking(self, mime_type: str, data: Optional[bytes], path: Optional[str]) -> ExtractedText:
+        kind = mime_type.rsplit("/", 1)[-1].rsplit(".", 1)[-1]
+        worker = self._idle.get()
+        started = time.perf_counter()
+        try:
+            worker.connection.send((mime_type, data, path, self.max_chars))
+            if not worker.connection.poll(self.timeout):
+                worker = self._replace(worker)
+                status, payload = "timeout", f"Extraction timed out after {self.timeout:.0f}s."
+            else:
+                status, payload = worker.connection.recv()
+                if status == "memory":
+                    # メモリを使い果たしたワーカーはヒープが断片化している可能性があるため置き換える
+                    worker = self._replace(worker)
+        except (EOFError, OSError):
+            # ワーカーが異常終了した（メモリ不足による強制終了など）
+            worker = self._replace(worker)
+            status, payload = "crashed", "Extraction worker exited unexpectedly."
+        finally:
+            _EXTRACT_SECONDS.observe(time.perf_counter() - started, type=kind)
+            self._idle.put(worker)
+
+        _EXTRACT_TOTAL.inc(type=kind, result=status)
+        if status != "ok":
+            raise ExtractionError(payload)
+        return payload
+
+    def close(self):
+        """
+        ワーカープロセスを終了します。
+        """
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.stop()
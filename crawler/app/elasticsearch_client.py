@@ -1,31 +1,63 @@
 import requests
-import json
+import time
 from typing import Dict, Any, Optional, List
 from document_entity import Document
+from es_transport import EsTransport
+from index_profiles import IndexProfile, get_index_profile
+from metrics import REGISTRY
 import logging
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# メトリクス
+_ES_REQUEST_SECONDS = REGISTRY.histogram("crawler_es_request_seconds", "Elasticsearch request latency by operation", ["operation"])
+_ES_ERRORS = REGISTRY.counter("crawler_es_errors_total", "Elasticsearch request errors by operation and kind", ["operation", "kind"])
+
 class ElasticsearchClient:
     """
     Elasticsearchとの接続およびデータ操作を行うクラス。
-    requestsライブラリを使用してElasticsearchのREST APIと通信します。
+    EsTransport（requestsのコネクションプール）を使用してElasticsearchのREST APIと通信します。
+    本文のフィールドの構成はインデックスプロファイル（index_profiles.py）で決まり、新しく作成するインデックスにのみ適用されます。
+    create_index が False の場合はインデックスを作成しません（再構築時にエイリアス名で生成する場合など）。
     """
-    def __init__(self, host: str, port: int = 9200, index_name: str = "documents", index_description: Optional[str] = None):
+    def __init__(self, host: str, port: int = 9200, index_name: str = "documents", index_description: Optional[str] = None,
+                 transport: Optional[EsTransport] = None, index_profile: Optional[str] = None, number_of_replicas: int = 0,
+                 create_index: bool = True):
         self.base_url = f"http://{host}:{port}"
+        self.transport = transport or EsTransport(self.base_url)
         self.index_name = index_name
         self.index_description = index_description
+        self.index_profile: IndexProfile = get_index_profile(index_profile)
+        self.number_of_replicas = number_of_replicas
         self._check_connection()
-        self._create_index_if_not_exists()
+        if create_index:
+            self._create_index_if_not_exists()
+
+    def _request(self, operation: str, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        トランスポート経由でリクエストを送信し、操作ごとのレイテンシとエラーを記録します。
+        """
+        started = time.perf_counter()
+        try:
+            response = self.transport.request(method, path, **kwargs)
+        except requests.exceptions.RequestException as e:
+            _ES_ERRORS.inc(operation=operation, kind=type(e).__name__)
+            raise
+        finally:
+            _ES_REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        # 404 はインデックスやドキュメントの存在確認で正常に返るため、エラーとして数えない
+        if response.status_code >= 400 and response.status_code != 404:
+            _ES_ERRORS.inc(operation=operation, kind=f"http_{response.status_code}")
+        return response
 
     def _check_connection(self):
         """
         Elasticsearchへの接続を確認します。
         """
         try:
-            response = requests.get(self.base_url, timeout=5)
+            response = self._request("connect", "GET", "", timeout=5)
             response.raise_for_status()
             logger.info(f"Successfully connected to Elasticsearch at {self.base_url}")
         except requests.exceptions.ConnectionError as e:
@@ -40,71 +72,207 @@ class ElasticsearchClient:
         Elasticsearchインデックスの設定を返します。
         """
         return {
-            "settings": {
-                "number_of_shards": 1,
-                "number_of_replicas": 0,
-                "analysis": {
-                    "analyzer": {
-                        "english_analyzer": {
-                            "type": "standard",
-                            "stopwords": "_english_"
-                        },
-                        "ngram_analyzer": {
-                            "type": "custom",
-                            "tokenizer": "ngram_tokenizer"
-                        }
-                    },
-                    "tokenizer": {
-                        "ngram_tokenizer": {
-                            "type": "ngram",
-                            "min_gram": 2,
-                            "max_gram": 3
-                        }
-                    }
-                }
-            },
+            "settings": self._get_analysis_settings(),
             "mappings": {
                 "_meta": {
-                    "description": self.index_description if self.index_description else f"Documents for {self.index_name}"
+                    "description": self.index_description if self.index_description else f"Documents for {self.index_name}",
+                    **self.index_profile.meta()
                 },
                 "properties": {
                     "url": {"type": "keyword"},
-                    "title": {"type": "text", "analyzer": "kuromoji"},
-                    "content": {
-                        "type": "text",
-                        "analyzer": "english_analyzer",
-                        "copy_to": ["content_ngram", "content_ja", "content_en"]
-                    },
-                    "content_ngram": {"type": "text", "analyzer": "ngram_analyzer"},
-                    "content_ja": {"type": "text", "analyzer": "kuromoji"},
-                    "content_en": {"type": "text", "analyzer": "english_analyzer"},
+                    "title": {"type": "text", "analyzer": self.index_profile.title_analyzer},
+                    **self._get_content_properties(),
                     "content_length": {"type": "long"},
                     "mime_type": {"type": "keyword"},
+                    "content_hash": {"type": "keyword"},
+                    "canonical_url": {"type": "keyword"},
+                    "timestamp": {"type": "date"}
+                }
+            }
+        }
+
+    def _get_chunk_index_settings(self) -> Dict[str, Any]:
+        """
+        チャンクインデックスの設定を返します。本文はドキュメントのインデックスと同じアナライザーで解析します。
+        """
+        return {
+            "settings": self._get_analysis_settings(),
+            "mappings": {
+                "_meta": {
+                    "description": f"Passages of {self.index_description or self.index_name}",
+                    "document_index": self.index_name,
+                    **self.index_profile.meta("heading_path^2")
+                },
+                "properties": {
+                    "url": {"type": "keyword"},
+                    "doc_id": {"type": "keyword"},
+                    "title": {"type": "text", "analyzer": self.index_profile.title_analyzer},
+                    "heading_path": {"type": "text", "analyzer": self.index_profile.title_analyzer},
+                    **self._get_content_properties(),
+                    "position": {"type": "integer"},
+                    "start_offset": {"type": "long", "index": False},
+                    "end_offset": {"type": "long", "index": False},
+                    "mime_type": {"type": "keyword"},
                     "timestamp": {"type": "date"}
                 }
             }
         }
 
-    def _create_index_if_not_exists(self):
+    def _get_content_properties(self) -> Dict[str, Any]:
         """
-        指定されたインデックスが存在しない場合に作成します。
+        本文（content）とそのコピー先のフィールドのマッピングを、インデックスプロファイルに従って返します。
         """
-        index_url = f"{self.base_url}/{self.index_name}"
+        return self.index_profile.content_properties()
+
+    def _get_analysis_settings(self) -> Dict[str, Any]:
+        """
+        インデックスのシャード数とアナライザーの設定を返します。
+        """
+        return {
+            "number_of_shards": 1,
+            "number_of_replicas": self.number_of_replicas,
+            "analysis": {
+                "analyzer": {
+                    "english_analyzer": {
+                        "type": "standard",
+                        "stopwords": "_english_"
+                    },
+                    "ngram_analyzer": {
+                        "type": "custom",
+                        "tokenizer": "ngram_tokenizer"
+                    }
+                },
+                "tokenizer": {
+                    "ngram_tokenizer": {
+                        "type": "ngram",
+                        "min_gram": 2,
+                        "max_gram": 3
+                    }
+                }
+            }
+        }
+
+    def _create_index_if_not_exists(self, index_name: Optional[str] = None, settings: Optional[Dict[str, Any]] = None):
+        """
+        指定されたインデックスが存在しない場合に作成します。省略時はこのクライアントのインデックスを対象とします。
+        """
+        index_name = index_name or self.index_name
         try:
-            response = requests.head(index_url, timeout=5)
+            response = self._request("index_exists", "HEAD", index_name, timeout=5)
             if response.status_code == 404:
-                settings = self._get_index_settings()
-                create_response = requests.put(index_url, json=settings, timeout=10)
+                settings = settings or self._get_index_settings()
+                create_response = self._request("create_index", "PUT", index_name, json_body=settings, timeout=10)
                 create_response.raise_for_status()
-                logger.info(f"Index '{self.index_name}' created successfully.")
+                logger.info(f"Index '{index_name}' created successfully.")
             elif response.status_code == 200:
-                logger.info(f"Index '{self.index_name}' already exists.")
+                logger.info(f"Index '{index_name}' already exists.")
             else:
                 response.raise_for_status()
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error checking or creating index '{self.index_name}': {e}")
+            logger.error(f"Error checking or creating index '{index_name}': {e}")
             raise
 
+    def create_chunk_index_if_not_exists(self, chunk_index: str):
+        """
+        このクライアントのインデックスに対応するチャンクインデックスが存在しない場合に作成します。
+        """
+        self._create_index_if_not_exists(chunk_index, self._get_chunk_index_settings())
+
+    def create_index(self, index_name: str, chunk: bool = False, alias: Optional[str] = None,
+                     settings: Optional[Dict[str, Any]] = None):
+        """
+        このクライアントの設定でインデックス（chunk が True の場合はチャンクインデックス）を作成します。
+        alias はインデックスを参照するエイリアス名として _meta に保存し、settings はインデックスの設定に追加します。
+        """
+        body = self._get_chunk_index_settings() if chunk else self._get_index_settings()
+        if alias:
+            body["mappings"]["_meta"]["alias"] = alias
+        if settings:
+            body["settings"].update(settings)
+        response = self._request("create_index", "PUT", index_name, json_body=body, timeout=30)
+        response.raise_for_status()
+        logger.info(f"Index '{index_name}' created successfully.")
+
+    def index_exists(self, index_name: str) -> bool:
+        """
+        インデックスまたはエイリアスが存在するかを返します。
+        """
+        response = self._request("index_exists", "HEAD", index_name, timeout=5)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def get_alias_indices(self, alias: str) -> List[str]:
+        """
+        エイリアスが指すインデックスの名前のリストを返します。エイリアスが存在しない場合は空のリストを返します。
+        """
+        response = self._request("get_alias", "GET", f"_alias/{alias}", timeout=10)
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return sorted(response.json())
+
+    def list_indices(self, pattern: str) -> List[str]:
+        """
+        パターン（ワイルドカード可）に一致するインデックスの名前のリストを返します。
+        """
+        response = self._request("list_indices", "GET", f"_cat/indices/{pattern}?format=json&h=index", timeout=10)
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return sorted(row["index"] for row in response.json())
+
+    def update_index_settings(self, index_name: str, settings: Dict[str, Any]):
+        """
+        インデックスの動的な設定（refresh_interval や number_of_replicas など）を変更します。
+        """
+        response = self._request("update_settings", "PUT", f"{index_name}/_settings", json_body={"index": settings}, timeout=30)
+        response.raise_for_status()
+
+    def refresh(self, index_name: str):
+        """
+        インデックスをリフレッシュし、書き込んだドキュメントを検索できるようにします。
+        """
+        response = self._request("refresh", "POST", f"{index_name}/_refresh", timeout=300)
+        response.raise_for_status()
+
+    def force_merge(self, index_name: str, max_num_segments: int = 1, timeout: float = 3600):
+        """
+        インデックスのセグメントを max_num_segments 個までマージします。完了するまで待機します。
+        """
+        response = self._request("force_merge", "POST", f"{index_name}/_forcemerge?max_num_segments={max_num_segments}",
+                                 timeout=timeout)
+        response.raise_for_status()
+
+    def wait_for_green(self, index_name: str, timeout: float = 60) -> bool:
+        """
+        インデックスのすべてのシャード（レプリカを含む）が割り当てられるまで待機します。タイムアウトした場合はFalseを返します。
+        """
+        response = self._request("cluster_health", "GET", f"_cluster/health/{index_name}?wait_for_status=green&timeout={int(timeout)}s",
+                                 timeout=timeout + 10)
+        if response.status_code == 408:
+            return False
+        response.raise_for_status()
+        return not response.json().get("timed_out", False)
+
+    def update_aliases(self, actions: List[Dict[str, Any]]):
+        """
+        エイリアスの追加・削除をまとめて実行します。すべての操作はアトミックに適用されます。
+        """
+        response = self._request("update_aliases", "POST", "_aliases", json_body={"actions": actions}, timeout=30)
+        response.raise_for_status()
+
+    def delete_indices(self, index_names: List[str]):
+        """
+        インデックスを削除します。
+        """
+        if not index_names:
+            return
+        response = self._request("delete_index", "DELETE", ",".join(index_names), timeout=60)
+        response.raise_for_status()
+        logger.info(f"Deleted index(es): {', '.join(index_names)}")
+
     def index_document(self, document: Document, doc_id: str) -> Dict[str, Any]:
         """
         ドキュメントをElasticsearchにインデックスします。
@@ -115,9 +283,8 @@ class ElasticsearchClient:
         if not doc_id:
             raise ValueError("doc_id must be provided for indexing.")
 
-        doc_url = f"{self.base_url}/{self.index_name}/_doc/{doc_id}"
         try:
-            response = requests.put(doc_url, json=document.to_dict(), timeout=10)
+            response = self._request("index", "PUT", f"{self.index_name}/_doc/{doc_id}", json_body=document.to_dict(), timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -126,13 +293,28 @@ class ElasticsearchClient:
                 logger.error(f"Response content: {e.response.text}")
             raise
 
+    def bulk(self, body: bytes) -> Dict[str, Any]:
+        """
+        NDJSON形式のリクエストボディを _bulk API に送信し、レスポンスを返します。
+        個々のアイテムの成否はレスポンスの items に含まれるため、呼び出し元で確認する必要があります。
+        """
+        headers = {'Content-Type': 'application/x-ndjson'}
+        try:
+            response = self._request("bulk", "POST", "_bulk", data=body, headers=headers, timeout=30)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error sending bulk request: {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                logger.error(f"Response content: {e.response.text}")
+            raise
+
     def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         指定されたIDのドキュメントを取得します。
         """
-        doc_url = f"{self.base_url}/{self.index_name}/_doc/{doc_id}"
         try:
-            response = requests.get(doc_url, timeout=5)
+            response = self._request("get", "GET", f"{self.index_name}/_doc/{doc_id}", timeout=5)
             response.raise_for_status()
             return response.json().get('_source')
         except requests.exceptions.HTTPError as e:
@@ -147,7 +329,6 @@ class ElasticsearchClient:
         """
         指定されたクエリでドキュメントを検索します。
         """
-        search_url = f"{self.base_url}/{self.index_name}/_search"
         search_body = {
             "query": {
                 "multi_match": {
@@ -158,7 +339,7 @@ class ElasticsearchClient:
             "size": size
         }
         try:
-            response = requests.post(search_url, json=search_body, timeout=10)
+            response = self._request("search", "POST", f"{self.index_name}/_search", json_body=search_body, timeout=10)
             response.raise_for_status()
             hits = response.json().get('hits', {}).get('hits', [])
             return [hit.get('_source') for hit in hits]
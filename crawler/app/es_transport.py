@@ -0,0 +1,99 @@
+import gzip
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class EsTransport:
+    """
+    Elasticsearchとの通信を行うHTTPトランスポート。
+    Keep-Aliveのコネクションプールを再利用し、一定サイズ以上のリクエストボディはgzipで圧縮して送信します。
+    接続エラーやゲートウェイエラーは指数バックオフで再試行します。
+    接続の再利用数や送信バイト数を集計し、get_stats() で参照できます。
+    """
+    def __init__(self, base_url: str, timeout: float = 10.0, connect_timeout: float = 5.0, max_retries: int = 3,
+                 backoff_factor: float = 0.5, pool_maxsize: int = 10, compress: bool = True, compress_min_bytes: int = 1024):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            # 429/503 は BulkIndexer がアイテム単位で再送するため、ここではゲートウェイエラーのみ再試行する
+            status_forcelist=(502, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "PUT", "POST", "DELETE"}),
+            raise_on_status=False
+        )
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip"})
+
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        self._bytes_raw = 0
+        self._bytes_sent = 0
+
+    def request(self, method: str, path: str, json_body: Optional[Any] = None, data: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> requests.Response:
+        """
+        Elasticsearchにリクエストを送信し、レスポンスを返します。
+        json_body を指定した場合はJSONにシリアライズして送信します。
+        """
+        request_headers = dict(headers or {})
+        body = data
+        if json_body is not None:
+            body = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
+            request_headers.setdefault("Content-Type", "application/json")
+
+        raw_size = len(body) if body else 0
+        if body and self.compress and raw_size >= self.compress_min_bytes:
+            body = gzip.compress(body, compresslevel=3)
+            request_headers["Content-Encoding"] = "gzip"
+
+        with self._stats_lock:
+            self._request_count += 1
+            self._bytes_raw += raw_size
+            self._bytes_sent += len(body) if body else 0
+
+        url = f"{self.base_url}/{path.lstrip('/')}" if path else self.base_url
+        return self.session.request(method, url, data=body, headers=request_headers,
+                                    timeout=(self.connect_timeout, timeout or self.timeout))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        リクエスト数、新規接続数、接続の再利用数、送信バイト数（圧縮前/圧縮後）を返します。
+        """
+        pools = self._adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        with self._stats_lock:
+            return {
+                "requests": self._request_count,
+                "connections_opened": connections,
+                "connections_reused": max(0, self._request_count - connections),
+                "bytes_raw": self._bytes_raw,
+                "bytes_sent": self._bytes_sent,
+                "compression_ratio": round(self._bytes_sent / self._bytes_raw, 3) if self._bytes_raw else None,
+            }
+
+    def close(self):
+        """
+        コネクションプールを閉じます。
+        """
+        self.session.close()
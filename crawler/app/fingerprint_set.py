@@ -0,0 +1,89 @@
+import hashlib
+from array import array
+from typing import Iterable
+
+
+def url_fingerprint(url: str) -> int:
+    """
+    URLの64ビットフィンガープリントを返します。
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class FingerprintSet:
+    """
+    64ビットのフィンガープリントを保持する省メモリな集合。
+    Pythonのsetに文字列を保持する代わりに、オープンアドレス法のハッシュテーブルを
+    array('Q') 上に構築するため、1要素あたりのメモリは約10〜20バイトになります。
+    """
+    _EMPTY = 0
+    _MAX_LOAD = 0.8
+
+    def __init__(self, capacity: int = 1024):
+        size = 1
+        while size * self._MAX_LOAD < max(capacity, 1):
+            size <<= 1
+        self._table = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, fingerprint: int) -> bool:
+        fingerprint = fingerprint or 1  # 0 は空きスロットを表すため 1 として扱う
+        table = self._table
+        mask = self._mask
+        i = fingerprint & mask
+        while True:
+            slot = table[i]
+            if slot == self._EMPTY:
+                return False
+            if slot == fingerprint:
+                return True
+            i = (i + 1) & mask
+
+    def add(self, fingerprint: int) -> bool:
+        """
+        フィンガープリントを追加します。新たに追加された場合はTrueを返します。
+        """
+        fingerprint = fingerprint or 1
+        if (self._count + 1) > len(self._table) * self._MAX_LOAD:
+            self._grow()
+        table = self._table
+        mask = self._mask
+        i = fingerprint & mask
+        while True:
+            slot = table[i]
+            if slot == self._EMPTY:
+                table[i] = fingerprint
+                self._count += 1
+                return True
+            if slot == fingerprint:
+                return False
+            i = (i + 1) & mask
+
+    def update(self, fingerprints: Iterable[int]):
+        """
+        複数のフィンガープリントをまとめて追加します。
+        """
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+
+    def nbytes(self) -> int:
+        """
+        ハッシュテーブルが使用しているバイト数を返します。
+        """
+        return len(self._table) * self._table.itemsize
+
+    def _grow(self):
+        """
+        ハッシュテーブルを2倍に拡張し、全要素を再配置します。
+        """
+        old_table = self._table
+        self._table = array('Q', bytes(8 * len(old_table) * 2))
+        self._mask = len(self._table) - 1
+        self._count = 0
+        for fingerprint in old_table:
+            if fingerprint != self._EMPTY:
+                self.add(fingerprint)
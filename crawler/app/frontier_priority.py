@@ -0,0 +1,62 @@
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+FRONTIER_ORDERS = ("fifo", "priority")
+# サイトマップの <priority> の既定値（sitemaps.org の仕様）。これとの差をスコアに加える
+DEFAULT_SITEMAP_PRIORITY = 0.5
+
+
+class PriorityScorer:
+    """
+    クロール対象URLの優先度（スコア）を計算するクラス。スコアが大きいURLほど先に取得します。
+
+    スコア = URLパターンの重みの合計
+             - depth_weight × 深さ
+             + inlink_weight × log2(1 + これまでに見つかった被リンク数)
+             + sitemap_weight × (サイトマップの priority - 0.5)
+
+    別の基準で並べる場合は、このクラスを継承して score() を上書きしたものをキューに渡します。
+    """
+    def __init__(self, depth_weight: float = 1.0, url_weights: Optional[Dict[str, float]] = None,
+                 inlink_weight: float = 1.0, sitemap_weight: float = 2.0):
+        self.depth_weight = depth_weight
+        self.inlink_weight = inlink_weight
+        self.sitemap_weight = sitemap_weight
+        self.url_weights: List[Tuple[Pattern, float]] = []
+        for pattern, weight in (url_weights or {}).items():
+            try:
+                self.url_weights.append((re.compile(pattern), weight))
+            except re.error as e:
+                logger.warning(f"Ignoring invalid priority URL pattern '{pattern}': {e}")
+
+    @classmethod
+    def from_config(cls, config) -> Optional["PriorityScorer"]:
+        """
+        設定の frontier_order が priority の場合にスコア計算器を生成します。fifo の場合はNoneを返します。
+        """
+        order = config.frontier_order
+        if order not in FRONTIER_ORDERS:
+            logger.warning(f"Unknown frontier order '{order}'. Using 'fifo'.")
+            return None
+        if order == "fifo":
+            return None
+        return cls(depth_weight=config.priority_depth_weight, url_weights=config.priority_url_weights,
+                   inlink_weight=config.priority_inlink_weight, sitemap_weight=config.priority_sitemap_weight)
+
+    def score(self, url: str, depth: int, inlinks: int = 0, sitemap_priority: Optional[float] = None) -> float:
+        """
+        URLのスコアを返します。
+        """
+        score = self.inlink_weight * math.log2(1 + inlinks) - self.depth_weight * depth
+        if sitemap_priority is not None:
+            score += self.sitemap_weight * (sitemap_priority - DEFAULT_SITEMAP_PRIORITY)
+        for pattern, weight in self.url_weights:
+            if pattern.search(url):
+                score += weight
+        return score
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from metrics import REGISTRY
+
+# メトリクス
+_HOST_BACKOFF_TOTAL = REGISTRY.counter("crawler_host_backoff_total", "Times a host's request interval was increased or paused", ["reason"])
+_HOST_DELAY_SECONDS = REGISTRY.histogram("crawler_host_delay_seconds", "Per-host request interval applied by the throttle",
+                                         buckets=(0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0))
+
+# サーバーが過負荷を示すステータスコード（Retry-After に従い、リクエスト間隔を大きく延ばす）
+THROTTLE_STATUSES = frozenset({429, 503})
+# 応答時間とエラー率の指数移動平均の平滑化係数
+_EWMA_ALPHA = 0.2
+# 正常な応答が続いたときにリクエスト間隔に掛ける係数（徐々に短縮する）
+_SPEED_UP_FACTOR = 0.9
+# 応答が遅い・エラーが発生したとき、429/503を受けたときにリクエスト間隔に掛ける係数
+_SLOW_DOWN_FACTOR = 1.5
+_BACK_OFF_FACTOR = 2.0
+# 応答が遅い・エラーが発生したとき、429/503を受けたときのリクエスト間隔の下限（秒）
+_MIN_SLOW_DOWN_DELAY = 0.1
+_MIN_BACK_OFF_DELAY = 1.0
+# リクエスト間隔を短縮するエラー率の上限
+_HEALTHY_ERROR_RATE = 0.1
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After ヘッダの値（秒数またはHTTP日付）を、待機する秒数に変換します。解析できない場合はNoneを返します。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class _HostSlot:
+    """
+    単一ホストに対する同時接続数・リクエスト間隔・最終リクエスト時刻と、応答時間・エラー率の移動平均を保持するクラス。
+    """
+    def __init__(self, concurrency: int, min_delay: float, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.next_request_at = 0.0
+        self.paused_until = 0.0 # Retry-After によりリクエストを止める時刻
+        self.min_delay = min_delay # リクエスト間隔の下限（robots.txt の Crawl-delay を含む）
+        self.delay = delay # 現在のリクエスト間隔
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.increased_at = 0.0 # 最後にリクエスト間隔を延長した時刻
+
+
+class HostThrottle:
+    """
+    ホストごとの丁寧さ（politeness）を制御するクラス。
+    ホスト単位で同時リクエスト数を制限し、同一ホストへのリクエスト間隔を最小遅延時間以上に保ちます。
+    最小遅延時間はホストごとに延ばすことができます（robots.txt の Crawl-delay など）。
+    異なるホストへのリクエストは互いに待ち合わせません。
+
+    429/503 の応答を受けた場合は、Retry-After（max_pause 秒まで）の間そのホストへのリクエストを止めます。
+    adaptive が有効な場合は、ホストごとの応答時間とエラー率の移動平均からリクエスト間隔を調整します。
+    応答が速くエラーが無い間は間隔を min_delay まで徐々に短縮し、応答時間が latency_threshold を超えた場合や
+    エラー・429/503の場合は max_delay を上限に延長します。
+    同時に送信したリクエストが同じ過負荷で失敗しても間隔を何度も延長しないよう、
+    延長は最後に延長した時刻より後に開始したリクエストの結果に対してだけ行います。
+    """
+    def __init__(self, per_host_concurrency: int, min_delay: float, adaptive: bool = False,
+                 initial_delay: Optional[float] = None, max_delay: float = 60.0, latency_threshold: float = 2.0,
+                 max_pause: float = 300.0):
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.min_delay = max(0.0, min_delay)
+        self.adaptive = adaptive
+        self.initial_delay = max(self.min_delay, initial_delay if initial_delay is not None else self.min_delay)
+        self.max_delay = max(self.initial_delay, max_delay)
+        self.latency_threshold = latency_threshold
+        self.max_pause = max_pause
+        self._slots: Dict[str, _HostSlot] = {}
+
+    def _get_slot(self, host: str) -> _HostSlot:
+        slot = self._slots.get(host)
+        if slot is None:
+            slot = _HostSlot(self.per_host_concurrency, self.min_delay, self.initial_delay)
+            self._slots[host] = slot
+        return slot
+
+    def acquire(self, host: str) -> "_HostPermit":
+        """
+        指定ホストへのリクエスト許可を取得するコンテキストマネージャを返します。
+        `async with throttle.acquire(host):` の形式で使用します。
+        """
+        return _HostPermit(self._get_slot(host))
+
+    def set_min_delay(self, host: str, min_delay: float):
+        """
+        指定ホストへのリクエスト間の最小遅延時間を設定します。全体の最小遅延時間より短くはなりません。
+        """
+        slot = self._get_slot(host)
+        slot.min_delay = max(self.min_delay, min_delay)
+        slot.delay = max(slot.delay, slot.min_delay)
+
+    def get_delay(self, host: str) -> float:
+        """
+        指定ホストへの現在のリクエスト間隔を返します。
+        """
+        return self._get_slot(host).delay
+
+    def record_response(self, host: str, status: int, started: float, retry_after: Optional[float] = None):
+        """
+        応答のステータスコードと応答時間（started からレスポンスヘッダを受信するまで）を記録し、リクエスト間隔を調整します。
+        started はリクエストを開始した time.monotonic() の値です。
+        """
+        slot = self._get_slot(host)
+        latency = time.monotonic() - started
+        slot.latency = latency if slot.latency is None else slot.latency + _EWMA_ALPHA * (latency - slot.latency)
+        if status in THROTTLE_STATUSES:
+            self._back_off(slot, started, retry_after)
+        elif status >= 500:
+            self.record_error(host, started)
+        else:
+            slot.error_rate *= 1 - _EWMA_ALPHA
+            if not self.adaptive:
+                return
+            if slot.latency > self.latency_threshold:
+                self._increase_delay(slot, started, max(slot.delay * _SLOW_DOWN_FACTOR, _MIN_SLOW_DOWN_DELAY), "slow")
+            elif slot.error_rate < _HEALTHY_ERROR_RATE:
+                self._set_delay(slot, slot.delay * _SPEED_UP_FACTOR)
+
+    def record_error(self, host: str, started: float):
+        """
+        5xx・タイムアウト・接続エラーを記録し、adaptive が有効な場合はリクエスト間隔を延長します。
+        """
+        slot = self._get_slot(host)
+        slot.error_rate += _EWMA_ALPHA * (1.0 - slot.error_rate)
+        if self.adaptive:
+            self._increase_delay(slot, started, max(slot.delay * _SLOW_DOWN_FACTOR, _MIN_SLOW_DOWN_DELAY), "error")
+
+    def _back_off(self, slot: _HostSlot, started: float, retry_after: Optional[float]):
+        """
+        429/503 を受けたホストへのリクエストを Retry-After の間止め、adaptive が有効な場合はリクエスト間隔を延長します。
+        """
+        slot.error_rate += _EWMA_ALPHA * (1.0 - slot.error_rate)
+        if self.adaptive:
+            self._increase_delay(slot, started, max(slot.delay * _BACK_OFF_FACTOR, _MIN_BACK_OFF_DELAY), "throttled")
+        else:
+            _HOST_BACKOFF_TOTAL.inc(reason="throttled")
+        pause = min(retry_after if retry_after is not None else slot.delay, self.max_pause)
+        slot.paused_until = max(slot.paused_until, time.monotonic() + pause)
+        slot.next_request_at = max(slot.next_request_at, slot.paused_until)
+
+    def _increase_delay(self, slot: _HostSlot, started: float, delay: float, reason: str):
+        if started < slot.increased_at:
+            # 前回の延長より前に開始したリクエストの結果。同じ過負荷による失敗のため延長しない
+            return
+        _HOST_BACKOFF_TOTAL.inc(reason=reason)
+        slot.increased_at = time.monotonic()
+        self._set_delay(slot, delay)
+
+    def _set_delay(self, slot: _HostSlot, delay: float):
+        slot.delay = min(self.max_delay, max(slot.min_delay, delay))
+
+    def host_count(self) -> int:
+        """
+        これまでにリクエストしたホストの数を返します。
+        """
+        return len(self._slots)
+
+
+class _HostPermit:
+    """
+    HostThrottle.acquire が返す非同期コンテキストマネージャ。
+    """
+    def __init__(self, slot: _HostSlot):
+        self._slot = slot
+
+    async def __aenter__(self):
+        await self._slot.semaphore.acquire()
+        try:
+            while True:
+                # 同一ホストへのリクエスト開始時刻をホストのリクエスト間隔で予約する
+                async with self._slot.lock:
+                    now = time.monotonic()
+                    start_at = max(now, self._slot.next_request_at)
+                    self._slot.next_request_at = start_at + self._slot.delay
+                wait = start_at - now
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                # 待機中に 429/503 を受けた場合は、Retry-After の後の時刻で予約し直す（一斉に再開しないようにする）
+                if self._slot.paused_until <= time.monotonic():
+                    break
+            _HOST_DELAY_SECONDS.observe(self._slot.delay)
+        except BaseException:
+            self._slot.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._slot.semaphore.release()
+        return False
@@ -0,0 +1,135 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ハイライトに使うフィールドのアナライザーの優先順位（形態素解析 > N-gram > その他）
+_HIGHLIGHT_PRIORITY = {"kuromoji": 0, "ngram_analyzer": 1}
+
+
+@dataclass(frozen=True)
+class ContentField:
+    """
+    本文を解析して保存するフィールド。最初のフィールドは content 自体で、残りは content からコピーされます。
+    index_options と norms を省略した場合はElasticsearchの既定値（positions / norms あり）を使用します。
+    """
+    name: str
+    analyzer: str
+    boost: float = 1.0 # 検索時の重み
+    index_options: Optional[str] = None # docs / freqs / positions / offsets
+    norms: bool = True # フィールド長による正規化。無効にするとドキュメントごとに1バイト節約できる
+
+    def mapping(self) -> Dict[str, Any]:
+        mapping: Dict[str, Any] = {"type": "text", "analyzer": self.analyzer}
+        if self.index_options:
+            mapping["index_options"] = self.index_options
+        if not self.norms:
+            mapping["norms"] = False
+        return mapping
+
+    def search_field(self) -> str:
+        return self.name if self.boost == 1.0 else f"{self.name}^{self.boost:g}"
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """
+    インデックスに作成する本文のフィールドの組み合わせ。
+    本文を複数のアナライザーで解析するほど検索の取りこぼしは減りますが、インデックスのサイズと書き込み負荷が増えます。
+    """
+    name: str
+    description: str
+    content_fields: Tuple[ContentField, ...]
+    title_analyzer: str = "kuromoji"
+
+    def content_properties(self) -> Dict[str, Any]:
+        """
+        本文（content）とそのコピー先のフィールドのマッピングを返します。
+        """
+        content, *copies = self.content_fields
+        properties = {content.name: content.mapping()}
+        if copies:
+            properties[content.name]["copy_to"] = [copy.name for copy in copies]
+        for copy in copies:
+            properties[copy.name] = copy.mapping()
+        return properties
+
+    def search_fields(self, *extra_fields: str) -> List[str]:
+        """
+        検索対象のフィールド（重み付き）を返します。インデックスの _meta.search_fields に保存し、検索側が参照します。
+        """
+        return ["title", *extra_fields, *(content.search_field() for content in self.content_fields)]
+
+    def highlight_fields(self) -> List[str]:
+        """
+        ハイライトするフィールドを、優先度の高い順に返します。同じアナライザーのフィールドは最初の1つだけを使います。
+        """
+        fields: Dict[str, str] = {}
+        for content in sorted(self.content_fields, key=lambda content: _HIGHLIGHT_PRIORITY.get(content.analyzer, 2)):
+            fields.setdefault(content.analyzer, content.name)
+        return [*fields.values(), "title"]
+
+    def meta(self, *extra_search_fields: str) -> Dict[str, Any]:
+        """
+        インデックスの _meta に保存するプロファイルの情報を返します。
+        """
+        return {
+            "index_profile": self.name,
+            "search_fields": self.search_fields(*extra_search_fields),
+            "highlight_fields": self.highlight_fields(),
+        }
+
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    profile.name: profile
+    for profile in (
+        IndexProfile(
+            name="full",
+            description="英語・日本語（形態素解析）・2〜3文字のN-gramで本文を解析します（従来のマッピング）",
+            content_fields=(
+                ContentField("content", "english_analyzer"),
+                ContentField("content_ngram", "ngram_analyzer"),
+                ContentField("content_ja", "kuromoji"),
+                ContentField("content_en", "english_analyzer"),
+            ),
+        ),
+        IndexProfile(
+            name="no_ngram",
+            description="英語と日本語（形態素解析）で本文を解析します。N-gramのフィールドを作成しません",
+            content_fields=(
+                ContentField("content", "english_analyzer"),
+                ContentField("content_ja", "kuromoji"),
+            ),
+        ),
+        IndexProfile(
+            name="ja",
+            description="日本語（形態素解析）だけで本文を解析します",
+            content_fields=(ContentField("content", "kuromoji"),),
+        ),
+        IndexProfile(
+            name="ja_compact",
+            description="日本語（形態素解析）だけで本文を解析し、位置情報とnormsを保存しません（フレーズ検索と長さによる正規化が無効になります）",
+            content_fields=(ContentField("content", "kuromoji", index_options="freqs", norms=False),),
+        ),
+        IndexProfile(
+            name="en",
+            description="英語だけで本文を解析します",
+            content_fields=(ContentField("content", "english_analyzer"),),
+            title_analyzer="english_analyzer",
+        ),
+    )
+}
+DEFAULT_INDEX_PROFILE = "full"
+
+
+def get_index_profile(name: Optional[str]) -> IndexProfile:
+    """
+    名前に対応するインデックスプロファイルを返します。未知の名前の場合は警告を出して既定のプロファイルを返します。
+    """
+    profile = INDEX_PROFILES.get(name or DEFAULT_INDEX_PROFILE)
+    if profile is None:
+        logger.warning(f"Unknown index profile '{name}'. Using '{DEFAULT_INDEX_PROFILE}'. "
+                       f"Available profiles: {', '.join(INDEX_PROFILES)}")
+        profile = INDEX_PROFILES[DEFAULT_INDEX_PROFILE]
+    return profile
@@ -0,0 +1,155 @@
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from elasticsearch_client import ElasticsearchClient
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# バルクロード中のインデックスの設定（リフレッシュとレプリカへの複製を止めて書き込みを速くする）
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+# SQLiteのデータベースファイルと、WALモードで作成される付随ファイルの接尾辞
+_SQLITE_FILE_SUFFIXES = ("", "-wal", "-shm")
+
+
+def versioned_index_name(alias: str, version: str) -> str:
+    """
+    エイリアス名とバージョンから、再構築で作成するインデックスの名前を返します。
+    """
+    return f"{alias}-v{version}"
+
+
+@dataclass
+class RebuildTarget:
+    """
+    再構築で書き込む先のインデックス。シャードプロセスにも渡せるよう、名前だけを保持します。
+    """
+    alias: str
+    index: str
+    chunk_alias: Optional[str] = None
+    chunk_index: Optional[str] = None
+
+
+class IndexRebuild:
+    """
+    フルクロールによるインデックスの再構築。
+
+    エイリアス（es_index）が指す稼働中のインデックスには書き込まず、バージョン付きの新しいインデックス
+    （<es_index>-v<UTC日時>）を refresh_interval: -1、レプリカ0で作成してバルクロードします。
+    ロードが終わったら設定を戻してリフレッシュ・forcemergeし、エイリアスを新しいインデックスへアトミックに切り替えます。
+    切り替えまで検索は従来のインデックスに対して行われるため、再構築中も検索の性能と結果は変わりません。
+    切り替え後は、直前のバージョン（keep_previous が True の場合）を除く古いバージョンと中断した再構築のインデックスを削除します。
+    チャンクインデックスも同じ手順で再構築し、ドキュメントのインデックスと同時に切り替えます。
+    """
+    def __init__(self, es_client: ElasticsearchClient, chunk_alias: Optional[str] = None, version: Optional[str] = None,
+                 max_num_segments: Optional[int] = 1, keep_previous: bool = True):
+        self.es_client = es_client
+        self.version = version or time.strftime("%Y%m%d%H%M%S", time.gmtime())
+        self.max_num_segments = max_num_segments
+        self.keep_previous = keep_previous
+        alias = es_client.index_name
+        self.target = RebuildTarget(
+            alias=alias,
+            index=versioned_index_name(alias, self.version),
+            chunk_alias=chunk_alias,
+            chunk_index=versioned_index_name(chunk_alias, self.version) if chunk_alias else None,
+        )
+
+    def _pairs(self) -> List[Tuple[str, str]]:
+        """
+        (エイリアス, 新しいインデックス) の組を返します。
+        """
+        pairs = [(self.target.alias, self.target.index)]
+        if self.target.chunk_alias:
+            pairs.append((self.target.chunk_alias, self.target.chunk_index))
+        return pairs
+
+    def start(self) -> RebuildTarget:
+        """
+        バルクロード用の設定で新しいインデックスを作成し、書き込み先を返します。
+        """
+        self.es_client.create_index(self.target.index, alias=self.target.alias, settings=BULK_LOAD_SETTINGS)
+        if self.target.chunk_index:
+            self.es_client.create_index(self.target.chunk_index, chunk=True, alias=self.target.chunk_alias,
+                                        settings=BULK_LOAD_SETTINGS)
+        logger.info(f"Rebuilding '{self.target.alias}' into new index '{self.target.index}'.")
+        return self.target
+
+    def finish(self):
+        """
+        新しいインデックスの設定を戻して最適化し、エイリアスを切り替えて古いバージョンを削除します。
+        """
+        for _, index in self._pairs():
+            # レプリカへの複製はマージ後のセグメントで行われるよう、forcemerge の後にレプリカ数を戻す
+            self.es_client.update_index_settings(index, {"refresh_interval": None})
+            self.es_client.refresh(index)
+            if self.max_num_segments:
+                started = time.monotonic()
+                self.es_client.force_merge(index, self.max_num_segments)
+                logger.info(f"Force-merged '{index}' to {self.max_num_segments} segment(s) in {time.monotonic() - started:.1f}s.")
+            if self.es_client.number_of_replicas:
+                self.es_client.update_index_settings(index, {"number_of_replicas": self.es_client.number_of_replicas})
+                if not self.es_client.wait_for_green(index):
+                    logger.warning(f"Replicas of '{index}' are not allocated yet. Switching the alias anyway.")
+
+        actions: List[Dict[str, Any]] = []
+        previous: Dict[str, List[str]] = {}
+        for alias, index in self._pairs():
+            previous[alias] = [name for name in self.es_client.get_alias_indices(alias) if name != index]
+            if not previous[alias] and self.es_client.index_exists(alias):
+                # エイリアス導入前に作成された同名のインデックスは、エイリアスの追加と同時に削除する
+                logger.warning(f"Replacing index '{alias}' with an alias to '{index}'. The old index is deleted.")
+                actions.append({"remove_index": {"index": alias}})
+            actions.extend({"remove": {"index": name, "alias": alias}} for name in previous[alias])
+            actions.append({"add": {"index": index, "alias": alias}})
+        self.es_client.update_aliases(actions)
+        for alias, index in self._pairs():
+            logger.info(f"Alias '{alias}' now points to '{index}' (previously: {', '.join(previous[alias]) or 'none'}).")
+
+        for alias, index in self._pairs():
+            keep = set(previous[alias]) if self.keep_previous else set()
+            self._delete_old_versions(alias, keep | {index})
+
+    def abort(self):
+        """
+        再構築を中止し、作成した新しいインデックスを削除します。エイリアスは変更しません。
+        """
+        logger.warning(f"Rebuild of '{self.target.alias}' aborted. Keeping the current index.")
+        try:
+            self.es_client.delete_indices([index for _, index in self._pairs()])
+        except Exception as e:
+            logger.error(f"Error deleting the aborted rebuild index of '{self.target.alias}': {e}")
+
+    def _delete_old_versions(self, alias: str, keep: Set[str]):
+        """
+        エイリアスのバージョン付きインデックスのうち、keep 以外を削除します。
+        """
+        pattern = re.compile(rf"{re.escape(alias)}-v\d{{14}}")
+        stale = [name for name in self.es_client.list_indices(f"{alias}-v*")
+                 if pattern.fullmatch(name) and name not in keep]
+        self.es_client.delete_indices(stale)
+
+
+def remove_sqlite_files(path: str):
+    """
+    SQLiteのデータベースファイルとWALの付随ファイルを削除します。
+    """
+    for suffix in _SQLITE_FILE_SUFFIXES:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def replace_sqlite_files(source: str, destination: str):
+    """
+    SQLiteのデータベースファイルを付随ファイルごと置き換えます。
+    置き換え先に古いWALファイルが残っていると新しいファイルに適用されてしまうため、先に削除します。
+    """
+    remove_sqlite_files(destination)
+    for suffix in _SQLITE_FILE_SUFFIXES:
+        if os.path.exists(source + suffix):
+            os.replace(source + suffix, destination + suffix)
@@ -1,53 +1,280 @@
 import argparse
+import multiprocessing
 import os
 import sys
 import threading
 import queue
 import logging
 import base64
-from typing import Optional
+import functools
+from typing import Dict, Optional, List, Tuple
 
 from crawl_config import CrawlerConfig
 from elasticsearch_client import ElasticsearchClient
+from es_transport import EsTransport
+from bulk_indexer import BulkIndexer
+from chunker import Chunker, chunk_id, chunk_index_name
 from transformer import ContentTransformer
-from crawler import WebCrawler
-from crawl_target_queue import CrawlTargetQueue
+from page_parser import PageParser
+from transform_stage import TransformStage
+from document_extractor import ExtractionPool
+from crawler import WebCrawler, crawl_concurrently
+from crawl_job import (CrawlJob, RebuildFiles, resolve_config_paths, job_names, create_crawl_target_queue, create_state_store,
+                       create_near_duplicate_index, prepare_rebuild_files)
+from index_rebuild import IndexRebuild, RebuildTarget
+from crawl_state_store import CrawlStateStore, PageState
+from sharded_crawl import ShardContext, ShardCoordinator, ShardedCrawlTargetQueue, ShardRuntime
+from document_entity import Document
+from near_duplicate import NearDuplicate, SimHashIndex, simhash
 from crawl_result_queue import CrawlResult, CrawlResultQueue
+from metrics import REGISTRY, MetricsServer, MetricsFileWriter
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# メトリクス
+_DOCUMENTS_TOTAL = REGISTRY.counter("crawler_documents_total", "Crawl results by processing outcome", ["result"])
+_PROCESS_SECONDS = REGISTRY.histogram("crawler_process_seconds", "Time spent by an indexing worker on a single crawl result")
+_CHUNKS_TOTAL = REGISTRY.counter("crawler_chunks_total", "Passages queued for the chunk index")
+_NEAR_DUPLICATES_TOTAL = REGISTRY.counter("crawler_near_duplicates_total", "Documents detected as near-duplicates of an indexed document", ["action"])
+
+# クロール結果キューが空のときにインデックスワーカーが再確認するまでの待ち時間（秒）
+_WORKER_POLL_INTERVAL = 0.5
+
 class DocumentProcessor:
     """
     クロール結果を処理し、Elasticsearchにドキュメントとしてインデックスするクラス。
+    ドキュメントは BulkIndexer 経由でまとめて送信されます。
+    複数のワーカースレッドから同時に利用できます。クロールジョブごとに1つ生成し、BulkIndexer は共有できます。
+    chunker と chunk_index を指定した場合は、ドキュメントを分割したパッセージをチャンクインデックスにも送信します。
+    near_duplicate_index を指定した場合は、本文のSimHash署名が既存の正規ドキュメントに近いドキュメントを
+    near_duplicate_action に従ってスキップする（skip）か、canonical_url に正規ドキュメントのURLを設定してインデックスします（link）。
     """
-    def __init__(self, es_client: ElasticsearchClient, transformer: ContentTransformer, max_documents: Optional[int] = None):
-        self.es_client = es_client
+    def __init__(self, bulk_indexer: BulkIndexer, transformer: ContentTransformer, max_documents: Optional[int] = None,
+                 state_store: Optional[CrawlStateStore] = None, index_name: Optional[str] = None,
+                 stop_event: Optional[threading.Event] = None, document_counter=None,
+                 chunker: Optional[Chunker] = None, chunk_index: Optional[str] = None,
+                 near_duplicate_index: Optional[SimHashIndex] = None, near_duplicate_action: str = "skip"):
+        self.bulk_indexer = bulk_indexer
         self.transformer = transformer
         self.max_documents = max_documents
-        self.indexed_documents_count = 0
+        # インクリメンタルクロール時の状態ストア（未変更ドキュメントのスキップに使用）
+        self.state_store = state_store
+        # 送信先のインデックス（省略時は BulkIndexer の ElasticsearchClient のインデックス）
+        self.index_name = index_name
+        # 最大ドキュメント数に達したときにクローラーへ停止を通知するイベント
+        self.stop_event = stop_event
+        # パッセージの分割器と送信先のチャンクインデックス（チャンク分割が無効な場合はNone）
+        self.chunker = chunker
+        self.chunk_index = chunk_index
+        # 近似重複の判定に使う正規ドキュメントの署名インデックスと、近似重複の扱い（skip / link）
+        self.near_duplicate_index = near_duplicate_index
+        self.near_duplicate_action = near_duplicate_action
+        self.unchanged_documents_count = 0
+        self.duplicate_documents_count = 0
+        # 送信待ちを含むインデックス済みドキュメント数。送信に失敗したドキュメントは差し引かれる。
+        # シャード分割時は全プロセスで共有するカウンターを受け取り、max_documents を全体の合計に適用する
+        self._document_counter = document_counter if document_counter is not None else multiprocessing.Value("q", 0)
+        self._count_lock = threading.Lock()
+
+    @property
+    def indexed_documents_count(self) -> int:
+        return self._document_counter.value
 
     def process_crawl_result(self, crawl_result: CrawlResult) -> bool:
         """
-        単一のクロール結果を処理し、Elasticsearchにインデックスします。
-        最大ドキュメント数に達した場合はFalseを返します。
+        単一のクロール結果を処理し、インデックス対象として BulkIndexer に追加します。
+        最大ドキュメント数に達した場合や、前回から内容が変わっていない場合はFalseを返します。
+        """
+        logger.info(f"Processing {crawl_result.url}")
+        with _PROCESS_SECONDS.time():
+            result = self._process(crawl_result)
+        _DOCUMENTS_TOTAL.inc(result=result)
+        if self.stop_event and self.is_limit_reached() and not self.stop_event.is_set():
+            logger.info(f"Reached maximum document limit ({self.max_documents}) for index '{self.index_name}'. Signalling crawler to stop.")
+            self.stop_event.set()
+        return result == "queued"
+
+    def _process(self, crawl_result: CrawlResult) -> str:
         """
-        if self.max_documents is not None and self.indexed_documents_count >= self.max_documents:
+        クロール結果を処理し、処理結果の種別（queued / unchanged / duplicate / limit / error）を返します。
+        """
+        try:
+            # 変換ステージで生成済みのドキュメントがあればそれを使う
+            document = crawl_result.document or self.transformer.transform_crawl_result_to_document(crawl_result)
+        except Exception as e:
+            logger.error(f"An error occurred during document processing for {crawl_result.url}: {e}")
+            return "error"
+
+        if self.state_store and self.state_store.is_unchanged(document.url, document.content_hash):
+            with self._count_lock:
+                self.unchanged_documents_count += 1
+            logger.info(f"Skipping unchanged document: {document.url}")
+            return "unchanged"
+
+        signature, duplicate_of = self._check_near_duplicate(crawl_result, document)
+        if duplicate_of is not None:
+            _NEAR_DUPLICATES_TOTAL.inc(action=self.near_duplicate_action)
+            if self.near_duplicate_action == "skip":
+                logger.info(f"Skipping near-duplicate of {duplicate_of.url} (distance {duplicate_of.distance}): {document.url}")
+                with self._count_lock:
+                    self.duplicate_documents_count += 1
+                self._drop_duplicate(document.url)
+                return "duplicate"
+            document.canonical_url = duplicate_of.url
+
+        if not self._reserve_document_slot():
             logger.info(f"Reached maximum document limit ({self.max_documents}). Skipping indexing for {crawl_result.url}.")
-            return False
+            self._forget_signature(document.url, signature)
+            # 次回のクロールで304にならないよう、記録済みの検証用ヘッダを破棄する
+            if self.state_store:
+                self.state_store.invalidate(crawl_result.url)
+            return "limit"
 
-        logger.info(f"Processing {crawl_result.url}")
         try:
-            document = self.transformer.transform_crawl_result_to_document(crawl_result)
             doc_id = self._generate_doc_id(document.url)
-            self.es_client.index_document(document, doc_id=doc_id)
-            self.indexed_documents_count += 1
-            logger.info(f"Indexed document for: {crawl_result.url} (Total: {self.indexed_documents_count})")
-            return True
+            self.bulk_indexer.add(document, doc_id=doc_id, callback=functools.partial(self._on_indexed, document, signature),
+                                  index=self.index_name)
         except Exception as e:
+            self._release_document_slot()
+            self._forget_signature(document.url, signature)
             logger.error(f"An error occurred during document processing for {crawl_result.url}: {e}")
-            return False
+            return "error"
+
+        try:
+            self._add_chunks(crawl_result, document, doc_id)
+        except Exception as e:
+            logger.error(f"An error occurred during chunk processing for {crawl_result.url}: {e}")
+        return "queued"
+
+    def _add_chunks(self, crawl_result: CrawlResult, document: Document, doc_id: str):
+        """
+        ドキュメントのパッセージをチャンクインデックスへの送信バッファに追加します。
+        変換ステージで分割済みであればその結果を使い、前回よりチャンク数が減った場合は余ったチャンクを削除します。
+        """
+        if not self.chunker or not self.chunk_index:
+            return
+        text_chunks = crawl_result.chunks
+        if document.canonical_url:
+            # 近似重複のパッセージは正規ドキュメントのパッセージと重複するため、チャンクインデックスには保存しない
+            text_chunks = []
+        elif text_chunks is None:
+            headings = crawl_result.parsed.headings if crawl_result.parsed else ()
+            text_chunks = self.chunker.split(document.content, headings) if document.content else []
+        for chunk in self.chunker.build_chunks(document, doc_id, text_chunks):
+            self.bulk_indexer.add(chunk, doc_id=chunk_id(doc_id, chunk.position), index=self.chunk_index)
+        _CHUNKS_TOTAL.inc(len(text_chunks))
+
+        if self.state_store:
+            previous = self.state_store.get(document.url)
+            for position in range(len(text_chunks), (previous.chunk_count if previous else None) or 0):
+                self.bulk_indexer.delete(chunk_id(doc_id, position), index=self.chunk_index)
+            self.state_store.record_chunk_count(document.url, len(text_chunks))
+
+    def _check_near_duplicate(self, crawl_result: CrawlResult, document: Document) -> Tuple[Optional[int], Optional[NearDuplicate]]:
+        """
+        本文のSimHash署名を求めて近似重複を検索します。(正規ドキュメントとして登録した署名, 近似重複の正規ドキュメント) を返します。
+        署名は変換ステージで計算済みであればそれを使い、無ければこのスレッドで計算します。
+        """
+        if self.near_duplicate_index is None or not document.content:
+            return None, None
+        signature = crawl_result.simhash if crawl_result.simhash is not None else simhash(document.content)
+        if signature is None:
+            return None, None
+        duplicate_of = self.near_duplicate_index.check_and_add(document.url, signature)
+        return (None, duplicate_of) if duplicate_of else (signature, None)
+
+    def _forget_signature(self, url: str, signature: Optional[int]):
+        """
+        インデックスできなかったドキュメントの署名を、正規ドキュメントの署名インデックスから削除します。
+        """
+        if signature is not None:
+            self.near_duplicate_index.remove(url)
+
+    def _drop_duplicate(self, url: str):
+        """
+        スキップした近似重複のページを次回のクロールでも再判定できるよう、状態を更新します。
+        以前は正規ドキュメントとしてインデックスしていたページは、インデックスから削除します。
+        """
+        if not self.state_store:
+            return
+        previous = self.state_store.get(url)
+        if previous is not None and previous.content_hash:
+            self._delete_document(url, previous)
+        else:
+            self.state_store.invalidate(url)
+
+    def is_limit_reached(self) -> bool:
+        """
+        送信待ちを含むインデックス済みドキュメント数が最大ドキュメント数に達したかを返します。
+        """
+        with self._count_lock:
+            return self.max_documents is not None and self.indexed_documents_count >= self.max_documents
+
+    def delete_missing_documents(self) -> int:
+        """
+        今回のクロールで到達しなかったページのドキュメントをインデックスから削除します。
+        削除を要求したドキュメント数を返します。
+        """
+        if not self.state_store:
+            return 0
+        missing_urls = self.state_store.find_missing_urls()
+        for url in missing_urls:
+            self._delete_document(url, self.state_store.get(url))
+        logger.info(f"Requested deletion of {len(missing_urls)} document(s) no longer found on the site.")
+        return len(missing_urls)
+
+    def _delete_document(self, url: str, state: Optional[PageState]):
+        """
+        ドキュメントとそのパッセージの削除を BulkIndexer に要求します。
+        """
+        doc_id = self._generate_doc_id(url)
+        if self.chunk_index:
+            for position in range((state.chunk_count if state else None) or 0):
+                self.bulk_indexer.delete(chunk_id(doc_id, position), index=self.chunk_index)
+        self.bulk_indexer.delete(doc_id, callback=functools.partial(self._on_deleted, url), index=self.index_name)
+
+    def _reserve_document_slot(self) -> bool:
+        """
+        最大ドキュメント数を超えない範囲で、ドキュメント1件分の枠を確保します。
+        """
+        with self._document_counter.get_lock():
+            if self.max_documents is not None and self._document_counter.value >= self.max_documents:
+                return False
+            self._document_counter.value += 1
+            return True
+
+    def _release_document_slot(self):
+        """
+        インデックスできなかったドキュメントの枠を解放します。
+        """
+        with self._document_counter.get_lock():
+            self._document_counter.value -= 1
+
+    def _on_indexed(self, document: Document, signature: Optional[int], doc_id: str, success: bool, error: Optional[str]):
+        """
+        BulkIndexer からのアイテムごとの結果通知を受け取ります。
+        """
+        _DOCUMENTS_TOTAL.inc(result="indexed" if success else "index_failed")
+        if success:
+            logger.info(f"Indexed document: {doc_id} (Total: {self.indexed_documents_count})")
+            if self.state_store:
+                self.state_store.record_indexed(document.url, document.content_hash, signature)
+        else:
+            self._release_document_slot()
+            self._forget_signature(document.url, signature)
+            if self.state_store:
+                self.state_store.invalidate(document.url)
+
+    def _on_deleted(self, url: str, doc_id: str, success: bool, error: Optional[str]):
+        """
+        BulkIndexer からの削除結果の通知を受け取ります。
+        """
+        if success and self.near_duplicate_index is not None:
+            self.near_duplicate_index.remove(url)
+        if success and self.state_store:
+            self.state_store.remove(url)
 
     def _generate_doc_id(self, url: str) -> str:
         """
@@ -55,81 +282,383 @@ class DocumentProcessor:
         """
         return base64.urlsafe_b64encode(url.encode('utf-8')).decode('ascii')
 
+def start_metrics_exporters(config: CrawlerConfig):
+    """
+    設定に応じて、メトリクスのHTTPエンドポイントとJSONファイルへの定期書き出しを開始します。
+    """
+    metrics_server = None
+    metrics_writer = None
+    if config.metrics_port is not None:
+        metrics_server = MetricsServer(REGISTRY, config.metrics_port, config.metrics_host)
+        metrics_server.start()
+    if config.metrics_file:
+        metrics_writer = MetricsFileWriter(REGISTRY, config.metrics_file, config.metrics_interval)
+        metrics_writer.start()
+    return metrics_server, metrics_writer
+
+def log_stage_summary():
+    """
+    ステージごとの処理時間の合計と件数をログに出力します。ボトルネックの特定に使用します。
+    """
+    snapshot = REGISTRY.snapshot()
+    uptime = snapshot["uptime_seconds"]
+    fetched = sum(series["value"] for series in snapshot["metrics"]["crawler_fetch_total"]["series"]
+                  if series["labels"].get("result") in ("ok", "not_modified"))
+    logger.info(f"Crawled {int(fetched)} page(s) in {uptime:.1f}s ({fetched / uptime:.2f} pages/sec).")
+    for name, metric in snapshot["metrics"].items():
+        if metric["type"] != "histogram" or not name.endswith("_seconds"):
+            continue
+        for series in metric["series"]:
+            labels = ",".join(f"{key}={value}" for key, value in series["labels"].items())
+            logger.info(f"Stage {name}{'{' + labels + '}' if labels else ''}: total {series['sum']:.3f}s, "
+                        f"count {series['count']}, mean {series['mean'] * 1000:.1f}ms")
+
+def run_indexing_worker(crawl_output_queue: CrawlResultQueue, processors: Dict[str, DocumentProcessor], crawler_finished: threading.Event):
+    """
+    クロール結果キューから結果を取り出し、結果を生成したジョブの DocumentProcessor で処理するワーカースレッドの本体。
+    クローラーが終了し、キューが空になった時点で終了します。
+    """
+    while True:
+        try:
+            crawl_result: CrawlResult = crawl_output_queue.get(timeout=_WORKER_POLL_INTERVAL)
+        except queue.Empty:
+            if crawler_finished.is_set():
+                return
+            continue
+
+        try:
+            processors[crawl_result.job].process_crawl_result(crawl_result)
+        except Exception as e:
+            logger.error(f"An error occurred during processing of {crawl_result.url}: {e}")
+        finally:
+            crawl_output_queue.task_done()
+
+def load_configs(config_paths: List[str]) -> List[CrawlerConfig]:
+    """
+    設定ファイルを読み込みます。
+    """
+    configs = []
+    for config_path in config_paths:
+        logger.info(f"Loading crawler configuration from {config_path}...")
+        configs.append(CrawlerConfig.from_yaml(config_path))
+    logger.info(f"{len(configs)} configuration(s) loaded successfully.")
+    return configs
+
+def create_es_transport(config: CrawlerConfig, es_host: str, es_port: int) -> EsTransport:
+    """
+    設定に応じたElasticsearchへのトランスポート（コネクションプール）を生成します。
+    """
+    logger.info(f"Initializing Elasticsearch transport for {es_host}:{es_port}...")
+    return EsTransport(
+        f"http://{es_host}:{es_port}",
+        timeout=config.es_timeout,
+        connect_timeout=config.es_connect_timeout,
+        max_retries=config.es_max_retries,
+        pool_maxsize=config.es_pool_maxsize,
+        compress=config.es_compress
+    )
+
+def run_crawl(configs: List[CrawlerConfig], names: List[str], es_host: str, es_port: int,
+              shard: Optional[ShardContext] = None,
+              rebuild_targets: Optional[Dict[str, RebuildTarget]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    クロールからインデックスまでのパイプラインを実行し、ジョブごとのインデックス済み・未変更・近似重複ドキュメント数を返します。
+    shard を指定した場合は、シャードプロセスとして担当ホストのURLだけをクロールし、担当外のURLは担当シャードへ転送します。
+    rebuild_targets に含まれるジョブは、エイリアスの代わりに再構築中の新しいインデックスへ書き込みます。
+    """
+    rebuild_targets = rebuild_targets or {}
+    # HTTPセッション・変換ステージ・BulkIndexer などの共有コンポーネントには最初の設定の値を使う
+    shared_config = configs[0]
+    es_transport = create_es_transport(shared_config, es_host, es_port)
+
+    logger.info("Initializing Content Transformer...")
+    transformer = ContentTransformer(PageParser(shared_config.html_parser))
+    logger.info("Content Transformer initialized.")
+
+    crawl_output_queue = CrawlResultQueue(maxsize=shared_config.result_queue_size)
+    REGISTRY.gauge("crawler_result_queue_depth", "Crawl results waiting to be indexed").set_function(crawl_output_queue.qsize)
+    transform_workers = shared_config.transform_workers
+    if shard is None:
+        metrics_server, metrics_writer = start_metrics_exporters(shared_config)
+    else:
+        # メトリクスの公開はコーディネーターが行う。変換ワーカーはシャード間で分け合う
+        metrics_server, metrics_writer = None, None
+        transform_workers = (os.cpu_count() or 1) if transform_workers is None else transform_workers
+        transform_workers = transform_workers // shard.count
+    extract_workers = shared_config.extract_workers
+    if shard is not None and extract_workers > 0:
+        extract_workers = max(1, extract_workers // shard.count)
+    chunker = Chunker(shared_config.chunk_max_chars, shared_config.chunk_overlap_chars) if shared_config.chunking else None
+    transform_stage = TransformStage(shared_config.html_parser, workers=transform_workers,
+                                     max_pending=shared_config.transform_max_pending, chunker=chunker,
+                                     compute_simhash=any(config.near_duplicate_action != "off" for config in configs))
+    extraction_pool = None
+    if extract_workers > 0:
+        extraction_pool = ExtractionPool(extract_workers, timeout=shared_config.extract_timeout,
+                                         memory_limit=shared_config.extract_memory_limit,
+                                         max_chars=shared_config.extract_max_chars)
+
+    jobs: List[CrawlJob] = []
+    for name, config in zip(names, configs):
+        logger.info(f"[{name}] Initializing Elasticsearch client (index: {config.es_index}, description: {config.es_index_description})...")
+        rebuild_target = rebuild_targets.get(name)
+        # 再構築時の書き込み先のインデックスは作成済み
+        es_client = ElasticsearchClient(host=es_host, port=es_port, index_name=config.es_index,
+                                        index_description=config.es_index_description, transport=es_transport,
+                                        index_profile=config.index_profile, number_of_replicas=config.es_number_of_replicas,
+                                        create_index=rebuild_target is None)
+        if chunker and rebuild_target is None:
+            es_client.create_chunk_index_if_not_exists(config.chunk_index or chunk_index_name(config.es_index))
+        if shard is None:
+            job = CrawlJob(name=name, config=config, es_client=es_client, crawl_target_queue=create_crawl_target_queue(config),
+                           stop_event=threading.Event(), state_store=create_state_store(config))
+        else:
+            crawl_target_queue = ShardedCrawlTargetQueue(name, create_crawl_target_queue(config, shard.index), shard)
+            job = CrawlJob(name=name, config=config, es_client=es_client, crawl_target_queue=crawl_target_queue,
+                           stop_event=shard.stop_events[name], state_store=create_state_store(config, shard.index))
+        job.near_duplicate_index = create_near_duplicate_index(config, job.state_store)
+        job.rebuild = rebuild_target
+        for url in config.start_urls:
+            # シャード分割時は、各シャードが担当するホストの開始URLだけを追加する
+            if shard is None or shard.owns(url):
+                job.crawl_target_queue.put((url, 0))
+        REGISTRY.gauge("crawler_target_queue_depth", "URLs waiting in the crawl target queue", ["job"]).set_function(
+            job.crawl_target_queue.qsize, job=name)
+        jobs.append(job)
+
+    bulk_indexer = BulkIndexer(
+        jobs[0].es_client,
+        max_documents=shared_config.bulk_max_documents,
+        max_bytes=shared_config.bulk_max_bytes,
+        flush_interval=shared_config.bulk_flush_interval,
+        max_retries=shared_config.bulk_max_retries
+    )
+    processors = {
+        job.name: DocumentProcessor(bulk_indexer, transformer, job.config.max_documents, job.state_store,
+                                    index_name=job.index_name, stop_event=job.stop_event,
+                                    document_counter=shard.document_counters[job.name] if shard else None,
+                                    chunker=chunker,
+                                    chunk_index=job.chunk_index_name if chunker else None,
+                                    near_duplicate_index=job.near_duplicate_index,
+                                    near_duplicate_action=job.config.near_duplicate_action)
+        for job in jobs
+    }
+    shard_runtime = ShardRuntime(shard) if shard else None
+    crawlers = [
+        WebCrawler(job.config, job.crawl_target_queue, crawl_output_queue, job.stop_event, transform_stage, job.state_store,
+                   name=job.name, should_finish=shard_runtime.should_finish if shard_runtime else None,
+                   extraction_pool=extraction_pool, owns=shard.owns if shard else None)
+        for job in jobs
+    ]
+    if shard_runtime:
+        shard_runtime.attach({job.name: job.crawl_target_queue for job in jobs}, crawlers)
+    logger.info(f"{len(crawlers)} Web Crawler(s) initialized.")
+
+    logger.info("Starting web crawling process in a separate thread...")
+    crawler_thread = threading.Thread(target=crawl_concurrently, args=(crawlers,))
+    crawler_thread.start()
+
+    logger.info(f"Starting {shared_config.indexing_workers} indexing worker(s)...")
+    crawler_finished = threading.Event()
+    indexing_workers = [
+        threading.Thread(target=run_indexing_worker, args=(crawl_output_queue, processors, crawler_finished),
+                         name=f"indexing-worker-{i}")
+        for i in range(max(1, shared_config.indexing_workers))
+    ]
+    for worker in indexing_workers:
+        worker.start()
+
+    # クローラーの終了後、キューに残ったクロール結果をワーカーが処理し終えるまで待つ
+    crawler_thread.join()
+    crawler_finished.set()
+    for worker in indexing_workers:
+        worker.join()
+    logger.info("Crawler thread finished and the result queue is drained.")
+
+    transform_stage.close()
+    if extraction_pool:
+        extraction_pool.close()
+
+    for job in jobs:
+        # 最後まで巡回できた場合のみ、到達しなかったページを削除する（途中停止時は未到達ページを区別できない）
+        if job.config.delete_missing_documents and not job.stop_event.is_set():
+            processors[job.name].delete_missing_documents()
+
+    # 送信待ちのドキュメントをすべて送信してから終了する
+    bulk_indexer.close()
+    for job in jobs:
+        job.close()
+    logger.info(f"Elasticsearch transport stats: {es_transport.get_stats()}")
+    es_transport.close()
+
+    summary = {
+        job.name: {"indexed": processors[job.name].indexed_documents_count,
+                   "unchanged": processors[job.name].unchanged_documents_count,
+                   "duplicate": processors[job.name].duplicate_documents_count}
+        for job in jobs
+    }
+    if shard_runtime:
+        shard_runtime.close(summary)
+        return summary
+
+    log_stage_summary()
+    if metrics_writer:
+        metrics_writer.close()
+    if metrics_server:
+        metrics_server.close()
+    return summary
+
+def _run_shard(shard: ShardContext, configs: List[CrawlerConfig], names: List[str], es_host: str, es_port: int,
+               rebuild_targets: Dict[str, RebuildTarget]):
+    """
+    シャードプロセスのエントリーポイント。
+    """
+    logger.info(f"Crawl shard {shard.index + 1}/{shard.count} started.")
+    try:
+        run_crawl(configs, names, es_host, es_port, shard=shard, rebuild_targets=rebuild_targets)
+    except Exception as e:
+        logger.critical(f"Crawl shard {shard.index + 1}/{shard.count} failed: {e}")
+        sys.exit(1)
+
+def run_sharded_crawl(configs: List[CrawlerConfig], names: List[str], es_host: str, es_port: int,
+                      rebuild_targets: Optional[Dict[str, RebuildTarget]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    crawl_processes 個のシャードプロセスでクロールし、ジョブごとのインデックス済み・未変更・近似重複ドキュメント数を返します。
+    各シャードはURLのホストのハッシュで割り当てられたホストだけを担当し、クロールからインデックスまでを行います。
+    """
+    shared_config = configs[0]
+    rebuild_targets = rebuild_targets or {}
+    # 複数のシャードが同時にインデックスを作成しようとしないよう、起動前に作成しておく（再構築するジョブは作成済み）
+    es_transport = create_es_transport(shared_config, es_host, es_port)
+    for name, config in zip(names, configs):
+        if name in rebuild_targets:
+            continue
+        logger.info(f"[{name}] Initializing Elasticsearch client (index: {config.es_index}, description: {config.es_index_description})...")
+        es_client = ElasticsearchClient(host=es_host, port=es_port, index_name=config.es_index,
+                                        index_description=config.es_index_description, transport=es_transport,
+                                        index_profile=config.index_profile, number_of_replicas=config.es_number_of_replicas)
+        if shared_config.chunking:
+            es_client.create_chunk_index_if_not_exists(config.chunk_index or chunk_index_name(config.es_index))
+    es_transport.close()
+
+    metrics_server, metrics_writer = start_metrics_exporters(shared_config)
+    coordinator = ShardCoordinator(names, shared_config.crawl_processes)
+    shard_summaries = coordinator.run(_run_shard, (configs, names, es_host, es_port, rebuild_targets))
+    logger.info(f"Shard progress: {coordinator.progress()}")
+
+    log_stage_summary()
+    if metrics_writer:
+        metrics_writer.close()
+    if metrics_server:
+        metrics_server.close()
+    if coordinator.failed_shards and rebuild_targets:
+        # 一部のシャードのページが欠けたインデックスにエイリアスを切り替えないよう、再構築を失敗として扱う
+        raise RuntimeError(f"Crawl shard(s) failed during the rebuild: {', '.join(coordinator.failed_shards)}")
+    # インデックス済み数は全シャードで共有するカウンター、未変更数・近似重複数は各シャードの合計
+    return {
+        name: {"indexed": coordinator.context.document_counters[name].value,
+               "unchanged": sum(summary.get(name, {}).get("unchanged", 0) for summary in shard_summaries.values()),
+               "duplicate": sum(summary.get(name, {}).get("duplicate", 0) for summary in shard_summaries.values())}
+        for name in names
+    }
+
+def start_rebuilds(configs: List[CrawlerConfig], names: List[str], es_host: str,
+                   es_port: int) -> Tuple[Optional[EsTransport], Dict[str, Tuple[IndexRebuild, RebuildFiles]]]:
+    """
+    rebuild が有効な設定ごとに、再構築先の新しいインデックスを作成し、状態ファイルとフロンティアを再構築用に切り替えます。
+    """
+    shared_config = configs[0]
+    rebuilds: Dict[str, Tuple[IndexRebuild, RebuildFiles]] = {}
+    if not any(config.rebuild for config in configs):
+        return None, rebuilds
+    es_transport = create_es_transport(shared_config, es_host, es_port)
+    for name, config in zip(names, configs):
+        if not config.rebuild:
+            continue
+        es_client = ElasticsearchClient(host=es_host, port=es_port, index_name=config.es_index,
+                                        index_description=config.es_index_description, transport=es_transport,
+                                        index_profile=config.index_profile, number_of_replicas=config.es_number_of_replicas,
+                                        create_index=False)
+        chunk_alias = (config.chunk_index or chunk_index_name(config.es_index)) if shared_config.chunking else None
+        rebuild = IndexRebuild(es_client, chunk_alias=chunk_alias, max_num_segments=config.rebuild_max_num_segments,
+                               keep_previous=config.rebuild_keep_previous)
+        rebuild.start()
+        rebuilds[name] = (rebuild, prepare_rebuild_files(config, shared_config.crawl_processes))
+    return es_transport, rebuilds
+
+def finish_rebuilds(rebuilds: Dict[str, Tuple[IndexRebuild, RebuildFiles]], summaries: Optional[Dict[str, Dict[str, int]]]):
+    """
+    クロールが完了したジョブの再構築を完了し、エイリアスを新しいインデックスに切り替えます。
+    クロールが失敗した場合（summaries が None）や、1件もインデックスできなかった場合は再構築を中止します。
+    """
+    for name, (rebuild, files) in rebuilds.items():
+        if summaries is None or not summaries[name]["indexed"]:
+            if summaries is not None:
+                logger.error(f"[{name}] Rebuild indexed no documents.")
+            rebuild.abort()
+            files.discard()
+            continue
+        try:
+            rebuild.finish()
+            files.commit()
+        except Exception as e:
+            logger.error(f"[{name}] Error finishing the rebuild of '{rebuild.target.alias}': {e}")
+            rebuild.abort()
+            files.discard()
+
 def main():
     parser = argparse.ArgumentParser(description="Web Crawler for RAG system.")
-    parser.add_argument("--config", type=str, default="/app/crawler_config/crawler_config.yaml",
-                        help="Path to the crawler configuration YAML file.")
+    parser.add_argument("--config", type=str, nargs="+", default=["/app/crawler_config/crawler_config.yaml"],
+                        help="Path(s) to crawler configuration YAML files, or directories containing them. "
+                             "Multiple configurations are crawled concurrently.")
     parser.add_argument("--es_host", type=str, default="elasticsearch",
                         help="Elasticsearch host.")
     parser.add_argument("--es_port", type=int, default=9200,
                         help="Elasticsearch port.")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Number of crawl processes. Overrides crawl_processes of the configuration.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild the indices: crawl into new versioned indices and switch the aliases when done.")
     args = parser.parse_args()
 
-    config_path = args.config
+    config_paths = resolve_config_paths(args.config)
     es_host = args.es_host
     es_port = args.es_port
 
-    if not os.path.exists(config_path):
-        logger.error(f"Configuration file not found at {config_path}")
+    missing_paths = [path for path in config_paths if not os.path.exists(path)]
+    if missing_paths or not config_paths:
+        logger.error(f"Configuration file not found at {', '.join(missing_paths) or ', '.join(args.config)}")
         sys.exit(1)
 
     try:
-        logger.info(f"Loading crawler configuration from {config_path}...")
-        config = CrawlerConfig.from_yaml(config_path)
-        logger.info("Configuration loaded successfully.")
-        
-        es_index = config.es_index
-        es_index_description = config.es_index_description
-
-        logger.info(f"Initializing Elasticsearch client for {es_host}:{es_port} (index: {es_index}, description: {es_index_description})...")
-        es_client = ElasticsearchClient(host=es_host, port=es_port, index_name=es_index, index_description=es_index_description)
-        logger.info("Elasticsearch client initialized.")
+        configs = load_configs(config_paths)
+        names = job_names(config_paths)
+        shared_config = configs[0]
+        if len({config.html_parser for config in configs}) > 1:
+            logger.warning(f"Configurations use different HTML parsers. Using '{shared_config.html_parser}' for all crawls.")
+        if args.processes is not None:
+            shared_config.crawl_processes = args.processes
+        if args.rebuild:
+            for config in configs:
+                config.rebuild = True
 
-        logger.info("Initializing Content Transformer...")
-        transformer = ContentTransformer()
-        logger.info("Content Transformer initialized.")
-
-        crawl_target_queue = CrawlTargetQueue()
-        crawl_output_queue = CrawlResultQueue()
+        rebuild_transport, rebuilds = start_rebuilds(configs, names, es_host, es_port)
+        rebuild_targets = {name: rebuild.target for name, (rebuild, _) in rebuilds.items()}
+        summaries = None
+        try:
+            if shared_config.crawl_processes > 1:
+                summaries = run_sharded_crawl(configs, names, es_host, es_port, rebuild_targets)
+            else:
+                summaries = run_crawl(configs, names, es_host, es_port, rebuild_targets=rebuild_targets)
+        finally:
+            finish_rebuilds(rebuilds, summaries)
+            if rebuild_transport:
+                rebuild_transport.close()
 
-        for url in config.start_urls:
-            crawl_target_queue.put((url, 0))
-
-        logger.info("Initializing Web Crawler...")
-        stop_event = threading.Event()
-        crawler = WebCrawler(config, crawl_target_queue, crawl_output_queue, stop_event) 
-        logger.info("Web Crawler initialized.")
-
-        logger.info("Starting web crawling process in a separate thread...")
-        crawler_thread = threading.Thread(target=crawler.crawl)
-        crawler_thread.start()
-
-        logger.info("Main thread: Processing crawled data...")
-        document_processor = DocumentProcessor(es_client, transformer, config.max_documents)
-
-        while True:
-            try:
-                crawl_result: CrawlResult = crawl_output_queue.get(timeout=1)
-                
-                document_processor.process_crawl_result(crawl_result)
-                crawl_output_queue.task_done()
-
-                if document_processor.max_documents is not None and document_processor.indexed_documents_count >= document_processor.max_documents:
-                    logger.info(f"Main thread: Reached maximum document limit ({document_processor.max_documents}). Signalling crawler to stop and exiting.")
-                    stop_event.set()
-                    break
-
-            except queue.Empty:
-                if not crawler_thread.is_alive() and crawl_target_queue.empty():
-                    logger.info("Crawler thread finished and all queues are empty. Exiting main processing loop.")
-                    break
-                pass
-            except Exception as e:
-                logger.error(f"Main thread: An error occurred during processing: {e}")
-                crawl_output_queue.task_done()
-
-        crawler_thread.join()
-        logger.info("Web crawling and processing completed.")
+        for name, config in zip(names, configs):
+            logger.info(f"[{name}] Web crawling and processing completed. Index: {config.es_index}, "
+                        f"Indexed documents: {summaries[name]['indexed']}, Unchanged documents: {summaries[name]['unchanged']}, "
+                        f"Near-duplicate documents skipped: {summaries[name]['duplicate']}")
 
     except ConnectionError as e:
         logger.critical(f"Fatal Error: Could not connect to Elasticsearch. {e}")
@@ -0,0 +1,391 @@
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 処理時間（秒）のヒストグラムの既定のバケット
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric(ABC):
+    """
+    メトリクスの基底クラス。ラベルの値の組ごとに系列を保持します。
+    """
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def drain(self) -> Dict[LabelValues, Any]:
+        """
+        蓄積した系列を取り出してリセットします。ワーカープロセスから親プロセスへの集約に使用します。
+        """
+        with self._lock:
+            series = self._series
+            self._series = {}
+        return series
+
+    @abstractmethod
+    def merge(self, series: Dict[LabelValues, Any]):
+        """
+        drain で取り出した系列を、このメトリクスに加えます。
+        """
+
+
+class Counter(_Metric):
+    """
+    単調増加するカウンタ。
+    """
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0.0)
+
+    def merge(self, series: Dict[LabelValues, float]):
+        with self._lock:
+            for key, value in series.items():
+                self._series[key] = self._series.get(key, 0.0) + value
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(self._labels(key), value) for key, value in self._series.items()]
+
+
+class Gauge(_Metric):
+    """
+    任意に増減する値。set_function を指定した場合は、収集時に関数を呼び出して値を取得します。
+    ゲージはプロセスごとの値のため、drain/merge の対象外です。
+    """
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """
+        ゲージの値を、収集時に関数を呼び出して取得するようにします。
+        """
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def drain(self) -> Dict[LabelValues, Any]:
+        return {}
+
+    def merge(self, series: Dict[LabelValues, Any]):
+        pass
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            samples = [(self._labels(key), value) for key, value in self._series.items()]
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                samples.append((self._labels(key), float(function())))
+            except Exception as e:
+                logger.debug(f"Failed to collect gauge {self.name}: {e}")
+        return samples
+
+
+class Histogram(_Metric):
+    """
+    観測値の分布を固定のバケットで集計するヒストグラム。
+    系列ごとに [バケットごとの件数, 合計, 件数] を保持します。
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        with ブロックの経過時間を観測するコンテキストマネージャ。
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, series: Dict[LabelValues, list]):
+        with self._lock:
+            for key, (counts, total, count) in series.items():
+                state = self._series.get(key)
+                if state is None:
+                    self._series[key] = [list(counts), total, count]
+                    continue
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def samples(self) -> List[Tuple[Dict[str, str], List[int], float, int]]:
+        """
+        ラベル、累積バケット件数、合計、件数の組を返します。
+        """
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = []
+                running = 0
+                for bucket_count in counts:
+                    running += bucket_count
+                    cumulative.append(running)
+                result.append((self._labels(key), cumulative, total, count))
+        return result
+
+
+class MetricsRegistry:
+    """
+    メトリクスを登録・収集するレジストリ。
+    Prometheusのテキスト形式とJSON形式で出力できます。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self.started_at = time.time()
+
+    def _register(self, metric_class, name: str, help_text: str, labelnames: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, help_text, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as {metric.type_name}.")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def _all(self) -> List[_Metric]:
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+    def drain(self) -> Dict[str, Dict[LabelValues, Any]]:
+        """
+        カウンタとヒストグラムの蓄積値を取り出してリセットします。
+        """
+        drained = {}
+        for metric in self._all():
+            series = metric.drain()
+            if series:
+                drained[metric.name] = series
+        return drained
+
+    def merge(self, drained: Dict[str, Dict[LabelValues, Any]]):
+        """
+        drain() で取り出した値（別プロセスのものを含む）を加算します。
+        """
+        for name, series in drained.items():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(series)
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheusのテキスト形式（0.0.4）で出力します。
+        """
+        lines = []
+        for metric in self._all():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            if isinstance(metric, Histogram):
+                for labels, cumulative, total, count in metric.samples():
+                    for bound, bucket_count in zip(metric.buckets + (float("inf"),), cumulative):
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{metric.name}_bucket{_format_labels(dict(labels, le=le))} {bucket_count}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {count}")
+            else:
+                for labels, value in metric.samples():
+                    lines.append(f"{metric.name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON形式の統計情報を返します。カウンタには起動からの平均レート（/秒）、
+        ヒストグラムには平均値を付与します。
+        """
+        uptime = max(time.time() - self.started_at, 1e-9)
+        metrics = {}
+        for metric in self._all():
+            series = []
+            if isinstance(metric, Histogram):
+                for labels, cumulative, total, count in metric.samples():
+                    series.append({
+                        "labels": labels,
+                        "count": count,
+                        "sum": round(total, 6),
+                        "mean": round(total / count, 6) if count else None,
+                        "buckets": {("+Inf" if bound == float("inf") else repr(bound)): bucket_count
+                                    for bound, bucket_count in zip(metric.buckets + (float("inf"),), cumulative)},
+                    })
+            elif isinstance(metric, Counter):
+                for labels, value in metric.samples():
+                    series.append({"labels": labels, "value": value, "rate": round(value / uptime, 3)})
+            else:
+                for labels, value in metric.samples():
+                    series.append({"labels": labels, "value": value})
+            metrics[metric.name] = {"type": metric.type_name, "help": metric.help_text, "series": series}
+        return {"timestamp": time.time(), "uptime_seconds": round(uptime, 3), "metrics": metrics}
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# プロセス全体で共有する既定のレジストリ
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """
+    レジストリの内容をHTTPで公開するサーバー。
+    `/metrics` でPrometheusのテキスト形式、`/metrics.json` でJSON形式を返します。
+    """
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "0.0.0.0"):
+        self.registry = registry
+        handler = self._make_handler(registry)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+
+    @staticmethod
+    def _make_handler(registry: MetricsRegistry):
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = registry.render_prometheus().encode('utf-8')
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # アクセスログはクロールのログに混ぜない
+                pass
+        return _Handler
+
+    def start(self):
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsFileWriter:
+    """
+    レジストリの内容を一定間隔でJSONファイルに書き出すクラス。
+    書き込み途中のファイルが読まれないよう、一時ファイルに書いてから置き換えます。
+    """
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = max(0.1, interval)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Writing crawler metrics to {self.path} every {self.interval}s.")
+
+    def write(self):
+        """
+        現在の統計情報をファイルに書き出します。
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Failed to write metrics to {self.path}: {e}")
+
+    def close(self):
+        """
+        定期書き出しを停止し、最終的な統計情報を書き出します。
+        """
+        self._closed.set()
+        self._thread.join()
+        try:
+            self.write()
+        except OSError as e:
+            logger.error(f"Failed to write metrics to {self.path}: {e}")
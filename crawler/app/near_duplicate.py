@@ -0,0 +1,194 @@
+import hashlib
+import re
+import threading
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 空白で区切られない言語（日本語・中国語・韓国語）の文字。1文字を1トークンとして扱う
+_CJK_CHARS = "\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_PATTERN = re.compile(f"[{_CJK_CHARS}]|[^\\W_{_CJK_CHARS}]+")
+# 連続するトークンをまとめて1つの特徴（シングル）とする数
+_SHINGLE_SIZE = 3
+# 特徴がこれより少ない短いテキストは、署名が安定しないため判定の対象にしない
+_MIN_FEATURES = 8
+_MASK64 = (1 << 64) - 1
+# 各バイト値を、ビットごとに32ビットずつ離して配置した値（ビットごとの重みをまとめて加算するために使う）
+_SPREAD = [sum(((value >> bit) & 1) << (bit * 32) for bit in range(8)) for value in range(256)]
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _mix(value: int) -> int:
+    """
+    64ビット値のビットを撹拌します（splitmix64 の最終段）。
+    """
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def simhash(text: Optional[str]) -> Optional[int]:
+    """
+    テキストの64ビットSimHashを返します。特徴が少なすぎるテキストの場合はNoneを返します。
+    テキストを小文字化してトークン（単語、または日本語などの1文字）に分け、連続する3トークンを特徴とします。
+    ハッシュ値はプロセスによらず同じになるため、状態ストアに保存して次回のクロールでも使用できます。
+    """
+    if not text:
+        return None
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < _SHINGLE_SIZE + _MIN_FEATURES - 1:
+        return None
+    token_hashes: Dict[str, int] = {}
+    hashes = [token_hashes.get(token) or token_hashes.setdefault(token, _token_hash(token)) for token in tokens]
+    features = Counter(
+        _mix((hashes[i] * 0x9E3779B97F4A7C15 + hashes[i + 1] * 0xC2B2AE3D27D4EB4F + hashes[i + 2]) & _MASK64)
+        for i in range(len(hashes) - _SHINGLE_SIZE + 1)
+    )
+
+    # 特徴の重み（出現回数）を、ハッシュ値のバイトごと・バイト値ごとに集計してからビットごとの合計に展開する
+    byte_weights = [[0] * 256 for _ in range(8)]
+    for feature, weight in features.items():
+        for byte_index in range(8):
+            byte_weights[byte_index][(feature >> (byte_index * 8)) & 0xFF] += weight
+    total_weight = sum(features.values())
+    signature = 0
+    for byte_index, weights in enumerate(byte_weights):
+        lanes = sum(_SPREAD[value] * weight for value, weight in enumerate(weights) if weight)
+        for bit in range(8):
+            # 重みの過半数が1であるビットを1にする
+            if ((lanes >> (bit * 32)) & 0xFFFFFFFF) * 2 > total_weight:
+                signature |= 1 << (byte_index * 8 + bit)
+    return signature
+
+
+@dataclass(frozen=True)
+class NearDuplicate:
+    """
+    近似重複と判定されたドキュメントの、正規（先に登録された）ドキュメント。
+    """
+    url: str
+    distance: int
+
+
+class SimHashIndex:
+    """
+    SimHash署名を登録し、ハミング距離が max_distance 以下の署名を検索するインデックス。
+
+    64ビットの署名を max_distance + 1 個のブロックに分け、ブロックごとのハッシュテーブルに登録します。
+    距離が max_distance 以下の署名は少なくとも1つのブロックが完全に一致する（鳩の巣原理）ため、
+    一致したブロックのバケットだけを調べれば全件を比較せずに近似重複を見つけられます。
+    数十万件を登録しても、1件あたりのメモリはURLを除いて数十バイト程度です。
+    """
+    MAX_DISTANCE = 7
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = min(max(0, max_distance), self.MAX_DISTANCE)
+        blocks = self.max_distance + 1
+        # 64ビットをなるべく均等な幅のブロックに分ける
+        widths = [64 // blocks + (1 if i < 64 % blocks else 0) for i in range(blocks)]
+        self._blocks: List[Tuple[int, int]] = []
+        shift = 0
+        for width in widths:
+            self._blocks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, array]] = [{} for _ in self._blocks]
+        self._signatures = array("Q")
+        self._urls: List[Optional[str]] = [] # 削除・更新された登録はNone
+        self._entries: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, signature: int, exclude: Optional[str] = None) -> Optional[NearDuplicate]:
+        """
+        署名とのハミング距離が max_distance 以下で最も近い登録を返します。exclude のURLの登録は除きます。
+        """
+        with self._lock:
+            return self._find(signature, exclude)
+
+    def add(self, url: str, signature: int):
+        """
+        URLの署名を登録します。同じURLが登録済みの場合は署名を置き換えます。
+        """
+        with self._lock:
+            self._add(url, signature)
+
+    def check_and_add(self, url: str, signature: int) -> Optional[NearDuplicate]:
+        """
+        近似重複を検索し、見つからなければURLの署名を登録します。見つかった場合は、URLの以前の登録を削除します。
+        検索と登録を1つのロックで行うため、同じ内容のページを複数のスレッドが同時に処理しても、
+        正規ドキュメントとして登録されるのは1件だけです。
+        """
+        with self._lock:
+            match = self._find(signature, exclude=url)
+            if match is None:
+                self._add(url, signature)
+            else:
+                entry = self._entries.pop(url, None)
+                if entry is not None:
+                    self._urls[entry] = None
+            return match
+
+    def remove(self, url: str):
+        """
+        URLの登録を削除します。
+        """
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._urls[entry] = None
+
+    def load(self, items: Iterable[Tuple[str, int]]) -> int:
+        """
+        (URL, 署名) をまとめて登録し、登録した件数を返します。
+        """
+        count = 0
+        with self._lock:
+            for url, signature in items:
+                self._add(url, signature)
+                count += 1
+        return count
+
+    def _find(self, signature: int, exclude: Optional[str]) -> Optional[NearDuplicate]:
+        best: Optional[NearDuplicate] = None
+        checked = set()
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            bucket = table.get((signature >> shift) & mask)
+            if bucket is None:
+                continue
+            for entry in bucket:
+                if entry in checked:
+                    continue
+                checked.add(entry)
+                url = self._urls[entry]
+                if url is None or url == exclude:
+                    continue
+                distance = (self._signatures[entry] ^ signature).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best.distance):
+                    best = NearDuplicate(url=url, distance=distance)
+                    if distance == 0:
+                        return best
+        return best
+
+    def _add(self, url: str, signature: int):
+        previous = self._entries.get(url)
+        if previous is not None:
+            if self._signatures[previous] == signature:
+                return
+            self._urls[previous] = None
+        entry = len(self._signatures)
+        self._signatures.append(signature)
+        self._urls.append(url)
+        self._entries[url] = entry
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            key = (signature >> shift) & mask
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = array("I", [entry])
+            else:
+                bucket.append(entry)
@@ -0,0 +1,163 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml は任意の依存関係
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+except ImportError:  # selectolax は任意の依存関係 (1.0 未満は旧バックエンドのみ)
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxHTMLParser
+    except ImportError:
+        SelectolaxHTMLParser = None
+
+DEFAULT_BACKEND = "html.parser"
+SUPPORTED_BACKENDS = ("lxml", "selectolax", DEFAULT_BACKEND)
+
+# テキストから除去する要素
+_REMOVED_TAGS = ("script", "style")
+# 見出しとして抽出する要素
+_HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+
+@dataclass
+class ParsedPage:
+    """
+    HTMLを1回パースした結果。リンク抽出とドキュメント変換の両方で共有されます。
+    """
+    title: Optional[str]
+    text: str  # 整形済みのテキストコンテンツ
+    links: List[str] = field(default_factory=list)  # フラグメントを除去した絶対URL
+    headings: List[Tuple[int, str]] = field(default_factory=list)  # 文書順の (見出しレベル, 見出しテキスト)
+
+
+class PageParser:
+    """
+    HTMLを1回だけパースし、タイトル・整形済みテキスト・リンクをまとめて抽出するクラス。
+    バックエンドは lxml / selectolax / html.parser から選択でき、
+    ライブラリが利用できない場合やパースに失敗した場合は html.parser にフォールバックします。
+    """
+    def __init__(self, backend: str = DEFAULT_BACKEND):
+        self.backend = self._resolve_backend(backend)
+
+    def _resolve_backend(self, backend: str) -> str:
+        """
+        利用可能なバックエンド名を返します。
+        """
+        if backend not in SUPPORTED_BACKENDS:
+            logger.warning(f"Unknown HTML parser backend '{backend}'. Falling back to {DEFAULT_BACKEND}.")
+            return DEFAULT_BACKEND
+        if backend == "lxml" and lxml is None:
+            logger.warning(f"lxml is not installed. Falling back to {DEFAULT_BACKEND}.")
+            return DEFAULT_BACKEND
+        if backend == "selectolax" and SelectolaxHTMLParser is None:
+            logger.warning(f"selectolax is not installed. Falling back to {DEFAULT_BACKEND}.")
+            return DEFAULT_BACKEND
+        return backend
+
+    def parse(self, base_url: str, html_content: str) -> ParsedPage:
+        """
+        HTMLコンテンツをパースし、ParsedPageを返します。
+        """
+        if self.backend == "lxml":
+            try:
+                return self._parse_with_lxml(base_url, html_content)
+            except (ValueError, etree.LxmlError) as e:
+                logger.debug(f"lxml failed to parse {base_url}: {e}. Falling back to {DEFAULT_BACKEND}.")
+        elif self.backend == "selectolax":
+            return self._parse_with_selectolax(base_url, html_content)
+        return self._parse_with_html_parser(base_url, html_content)
+
+    def _parse_with_html_parser(self, base_url: str, html_content: str) -> ParsedPage:
+        """
+        BeautifulSoup (html.parser) でパースします。
+        """
+        soup = BeautifulSoup(html_content, 'html.parser')
+        # NavigableString はパースツリー全体を参照するため、変換ワーカーから返せるよう str にする
+        title = str(soup.title.string) if soup.title and soup.title.string is not None else None
+        links = [link['href'] for link in soup.find_all('a', href=True)]
+
+        for script_or_style in soup(list(_REMOVED_TAGS)):
+            script_or_style.extract()
+        text_content = soup.get_text(separator="\n", strip=True)
+        headings = [(int(node.name[1]), node.get_text(separator=" ", strip=True)) for node in soup.find_all(list(_HEADING_TAGS))]
+
+        return ParsedPage(title=title, text=_clean_text(text_content), links=_absolutize_links(base_url, links),
+                          headings=_clean_headings(headings))
+
+    def _parse_with_lxml(self, base_url: str, html_content: str) -> ParsedPage:
+        """
+        lxml.html でパースします。
+        """
+        root = lxml.html.document_fromstring(html_content)
+        title_element = root.find('.//title')
+        title = title_element.text if title_element is not None and len(title_element) == 0 else None
+        links = root.xpath('//a/@href')
+
+        etree.strip_elements(root, etree.Comment, *_REMOVED_TAGS, with_tail=False)
+        text_content = "\n".join(s for s in (t.strip() for t in root.itertext()) if s)
+        headings = [(int(node.tag[1]), " ".join(s for s in (t.strip() for t in node.itertext()) if s))
+                    for node in root.iter(*_HEADING_TAGS)]
+
+        return ParsedPage(title=title, text=_clean_text(text_content), links=_absolutize_links(base_url, links),
+                          headings=_clean_headings(headings))
+
+    def _parse_with_selectolax(self, base_url: str, html_content: str) -> ParsedPage:
+        """
+        selectolax でパースします。
+        """
+        tree = SelectolaxHTMLParser(html_content)
+        title_node = tree.css_first('title')
+        title = title_node.text() if title_node is not None else None
+        links = [node.attributes.get('href') for node in tree.css('a[href]')]
+
+        tree.strip_tags(list(_REMOVED_TAGS))
+        root = tree.root
+        text_content = root.text(separator="\n", strip=True) if root is not None else ""
+        headings = [(int(node.tag[1]), node.text(separator=" ", strip=True)) for node in tree.css(", ".join(_HEADING_TAGS))]
+
+        return ParsedPage(title=title, text=_clean_text(text_content), links=_absolutize_links(base_url, links),
+                          headings=_clean_headings(headings))
+
+
+def _clean_text(text_content: str) -> str:
+    """
+    連続する空行を1つの改行にまとめます。
+    """
+    return re.sub(r'\n\s*\n', '\n', text_content)
+
+
+def _clean_headings(headings: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """
+    空の見出しを除去します。
+    """
+    return [(level, text) for level, text in headings if text]
+
+
+def _absolutize_links(base_url: str, hrefs: List[Optional[str]]) -> List[str]:
+    """
+    hrefを絶対URLに変換し、フラグメント識別子を除去します。ページ内の重複は除去されます。
+    """
+    links = []
+    seen = set()
+    for href in hrefs:
+        if not href:
+            continue
+        absolute_url = urljoin(base_url, href.strip()).split('#')[0]
+        if absolute_url not in seen:
+            seen.add(absolute_url)
+            links.append(absolute_url)
+    return links
@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from frontier_priority import PriorityScorer
+
+
+@dataclass
+class _PendingUrl:
+    """
+    キュー内で取得を待っているURLの、スコアの計算に使う値。
+    """
+    depth: int
+    inlinks: int
+    sitemap_priority: Optional[float]
+    seq: int # ヒープ内の最新のエントリの番号（古いエントリの判定に使う）
+
+
+class PriorityCrawlTargetQueue:
+    """
+    スコアの大きいURLから順に取り出すクロール対象キュー。CrawlTargetQueue と同じインターフェースを持ちます。
+    URLの重複は CrawlTargetQueue と同様に排除し、取得前のURLが再び見つかった場合は被リンク数を増やして
+    スコアを更新します（浅い深さで見つかった場合は深さも更新します）。
+    スコアの更新はヒープに新しいエントリを追加し、古いエントリを取り出し時に読み飛ばすことで、追加・取り出しとも O(log n) で行います。
+    """
+    # 古いエントリがこの件数を超え、かつ有効なエントリ数より多くなったらヒープを作り直す
+    _COMPACT_THRESHOLD = 1024
+
+    def __init__(self, scorer: PriorityScorer):
+        self.scorer = scorer
+        self._heap: List[Tuple[float, int, str]] = [] # (-スコア, 番号, URL)
+        self._pending: Dict[str, _PendingUrl] = {}
+        self._seen_urls: Set[str] = set() # 既にキューに追加された、または処理中のURL
+        self._counter = itertools.count()
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def put(self, item: Tuple[str, int], sitemap_priority: Optional[float] = None) -> bool:
+        """
+        URLと深度のタプルをキューに追加します。
+        既にキューに存在するか、処理済みであれば追加しません。取得前のURLの場合はスコアを更新します。
+        """
+        url, depth = item
+        with self._not_empty:
+            if url in self._seen_urls:
+                pending = self._pending.get(url)
+                if pending is not None:
+                    pending.inlinks += 1
+                    pending.depth = min(pending.depth, depth)
+                    if sitemap_priority is not None:
+                        pending.sitemap_priority = sitemap_priority
+                    self._push(url, pending)
+                return False
+            self._seen_urls.add(url)
+            self._push(url, _PendingUrl(depth, 0, sitemap_priority, 0))
+            self._not_empty.notify()
+            return True
+
+    def requeue(self, item: Tuple[str, int]):
+        """
+        再試行するURLをキューに戻します。取得済みのURLのため、重複の判定は行いません。
+        """
+        url, depth = item
+        with self._not_empty:
+            self._push(url, self._pending.get(url) or _PendingUrl(depth, 0, None, 0))
+            self._not_empty.notify()
+
+    def get(self, timeout: float = None) -> Tuple[str, int]:
+        """
+        最もスコアの大きいURLと深度のタプルを取得します。
+        timeout秒以内に取得できない場合は queue.Empty を送出します。
+        """
+        with self._not_empty:
+            if timeout is None:
+                while not self._pending:
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+
+            while True:
+                _, seq, url = heapq.heappop(self._heap)
+                pending = self._pending.get(url)
+                if pending is not None and pending.seq == seq:
+                    del self._pending[url]
+                    return url, pending.depth
+
+    def task_done(self, item: Optional[Tuple[str, int]] = None):
+        """
+        取得したタスクの処理が完了したことを通知します。インターフェースを揃えるためのもので、何もしません。
+        """
+        pass
+
+    def empty(self) -> bool:
+        """
+        キューが空かどうかを返します。
+        """
+        with self._not_empty:
+            return not self._pending
+
+    def qsize(self) -> int:
+        """
+        キューの現在のサイズを返します。
+        """
+        with self._not_empty:
+            return len(self._pending)
+
+    def get_seen_urls_count(self) -> int:
+        """
+        これまでにキューに追加された、または処理中のユニークなURLの数を返します。
+        """
+        return len(self._seen_urls)
+
+    def close(self):
+        """
+        キューを閉じます。メモリ上のキューでは何もしません。
+        """
+        pass
+
+    def _push(self, url: str, pending: _PendingUrl):
+        """
+        URLのスコアを計算してヒープに追加します。ロックを取得した状態で呼び出します。
+        """
+        pending.seq = next(self._counter)
+        self._pending[url] = pending
+        score = self.scorer.score(url, pending.depth, pending.inlinks, pending.sitemap_priority)
+        heapq.heappush(self._heap, (-score, pending.seq, url))
+        if len(self._heap) > 2 * len(self._pending) + self._COMPACT_THRESHOLD:
+            self._compact()
+
+    def _compact(self):
+        """
+        古いエントリを取り除いてヒープを作り直します。
+        """
+        self._heap = [entry for entry in self._heap
+                      if entry[2] in self._pending and self._pending[entry[2]].seq == entry[1]]
+        heapq.heapify(self._heap)
@@ -0,0 +1,122 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# robots.txt として読み込む最大サイズ（RFC 9309 では少なくとも500KiBを解析することが求められる）
+MAX_ROBOTS_SIZE = 512 * 1024
+
+
+def product_token(user_agent: str) -> str:
+    """
+    User-Agent 文字列から、robots.txt の User-agent 行と照合するプロダクトトークンを返します。
+    `Mozilla/5.0 (compatible; MyCrawler/1.0)` の場合は `mycrawler` です。
+    """
+    match = re.search(r"compatible;\s*([A-Za-z0-9_-]+)", user_agent) or re.match(r"\s*([A-Za-z0-9_-]+)", user_agent)
+    return match.group(1).lower() if match else "*"
+
+
+@dataclass(frozen=True)
+class _Rule:
+    allow: bool
+    pattern: str
+    regex: Optional[re.Pattern] # ワイルドカード（* と $）を含む場合のみ
+
+    def matches(self, path: str) -> bool:
+        if self.regex is None:
+            return path.startswith(self.pattern)
+        return self.regex.match(path) is not None
+
+
+def _compile_rule(allow: bool, pattern: str) -> _Rule:
+    if "*" not in pattern and not pattern.endswith("$"):
+        return _Rule(allow, pattern, None)
+    anchored = pattern.endswith("$")
+    body = pattern[:-1] if anchored else pattern
+    regex = ".*".join(re.escape(part) for part in body.split("*")) + ("$" if anchored else "")
+    return _Rule(allow, pattern, re.compile(regex))
+
+
+@dataclass
+class RobotsRules:
+    """
+    1つのホストの robots.txt のうち、クローラーに適用されるルール。
+    Allow/Disallow は RFC 9309 に従い、パスに最も長く一致したルールを適用します（同じ長さの場合は Allow を優先）。
+    パターン中の `*`（任意の文字列）と末尾の `$`（パスの終端）に対応します。
+    unreachable は robots.txt が5xx・429・接続エラーで取得できず、一時的にすべて禁止していることを表します。
+    """
+    rules: List[_Rule] = field(default_factory=list)
+    crawl_delay: Optional[float] = None
+    sitemaps: List[str] = field(default_factory=list)
+    disallow_all: bool = False
+    unreachable: bool = False
+
+    @classmethod
+    def allow_all(cls) -> "RobotsRules":
+        return cls()
+
+    @classmethod
+    def deny_all(cls) -> "RobotsRules":
+        return cls(disallow_all=True)
+
+    @classmethod
+    def unreachable_host(cls) -> "RobotsRules":
+        return cls(disallow_all=True, unreachable=True)
+
+    @classmethod
+    def parse(cls, text: str, user_agent: str) -> "RobotsRules":
+        """
+        robots.txt の内容を解析し、user_agent に適用されるルールを返します。
+        プロダクトトークンと完全に一致する User-agent のグループが無い場合は `*` のグループを使用します。
+        """
+        token = product_token(user_agent)
+        # (User-agent の値のリスト, ルール, Crawl-delay)
+        groups: List[Tuple[List[str], List[_Rule], Optional[float]]] = []
+        sitemaps: List[str] = []
+        in_rules = False
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            key, value = (part.strip() for part in line.split(":", 1))
+            key = key.lower()
+            if key == "sitemap":
+                if value:
+                    sitemaps.append(value)
+            elif key == "user-agent":
+                # ルールの後の User-agent 行は新しいグループの開始
+                if in_rules or not groups:
+                    groups.append(([], [], None))
+                    in_rules = False
+                groups[-1][0].append(value.lower())
+            elif key in ("allow", "disallow") and groups:
+                in_rules = True
+                # 空の Disallow はすべてを許可する（ルールなし）
+                if value:
+                    groups[-1][1].append(_compile_rule(key == "allow", value))
+            elif key == "crawl-delay" and groups:
+                in_rules = True
+                try:
+                    groups[-1] = (groups[-1][0], groups[-1][1], max(0.0, float(value)))
+                except ValueError:
+                    pass
+
+        # RFC 9309 に従い、User-agent の値はプロダクトトークン全体と大文字小文字を区別せずに照合する
+        matched = [group for group in groups if token in group[0] and token != "*"]
+        if not matched:
+            matched = [group for group in groups if "*" in group[0]]
+        rules = [rule for group in matched for rule in group[1]]
+        delays = [group[2] for group in matched if group[2] is not None]
+        return cls(rules=rules, crawl_delay=max(delays) if delays else None, sitemaps=sitemaps)
+
+    def is_allowed(self, path: str) -> bool:
+        """
+        パス（クエリ文字列を含む）へのアクセスが許可されているかを返します。
+        """
+        if self.disallow_all:
+            return path == "/robots.txt"
+        best: Optional[_Rule] = None
+        for rule in self.rules:
+            if rule.matches(path) and (best is None or len(rule.pattern) > len(best.pattern)
+                                       or (len(rule.pattern) == len(best.pattern) and rule.allow)):
+                best = rule
+        return best is None or best.allow or path == "/robots.txt"
@@ -0,0 +1,314 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from crawl_target_queue import CrawlTargetQueue
+from fingerprint_set import FingerprintSet, url_fingerprint
+from metrics import REGISTRY
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# メトリクス
+_FORWARDED_LINKS = REGISTRY.counter("crawler_shard_forwarded_links_total", "Links sent to the shard that owns their host", ["job"])
+_RECEIVED_LINKS = REGISTRY.counter("crawler_shard_received_links_total", "Links received from other shards", ["job"])
+
+# シャード間で受け渡すメッセージの待ち時間・メトリクスの送信間隔（秒）
+_INBOX_POLL_INTERVAL = 0.2
+_METRICS_REPORT_INTERVAL = 2.0
+# コーディネーターが全シャードの状態を確認する間隔（秒）
+_COORDINATOR_POLL_INTERVAL = 0.2
+# コーディネーターが進捗をログに出力する間隔（秒）
+_PROGRESS_LOG_INTERVAL = 30.0
+# 全シャードのアイドル状態がこの回数連続して確認できたらクロールを終了する
+_QUIESCENT_CHECKS = 2
+# シャードがアイドルでないことを示す値
+_BUSY = -1
+
+
+def shard_of(url: str, num_shards: int) -> int:
+    """
+    URLのホストを担当するシャードの番号を返します。同じホストのURLは常に同じシャードに割り当てられます。
+    """
+    if num_shards <= 1:
+        return 0
+    return url_fingerprint(urlparse(url).netloc.lower()) % num_shards
+
+
+@dataclass
+class ShardContext:
+    """
+    シャードプロセス間で共有する状態。コーディネーター（親プロセス）が生成し、各シャードプロセスに渡します。
+
+    - inboxes: シャードごとの受信キュー。担当外のホストのリンクは、担当シャードの受信キューに (ジョブ名, URL, 深度, サイトマップの priority) として送る
+    - sent / received: シャードごとの送信・受信済みリンク数。全シャードの合計が一致すれば送信中のリンクは無い
+    - idle_marks: アイドル状態になったときの受信済みリンク数（アイドルでない場合は -1）
+    - stop_events / document_counters: ジョブごとの停止イベントとインデックス済みドキュメント数（全シャードで共有）
+    - done_event: 全シャードがアイドルになり、クロールを終了してよいことを示すイベント
+    - reports: シャードからコーディネーターへのメトリクスと集計結果の送信に使うキュー
+    """
+    index: int
+    count: int
+    inboxes: List[Any]
+    sent: Any
+    received: Any
+    idle_marks: Any
+    stop_events: Dict[str, Any]
+    document_counters: Dict[str, Any]
+    done_event: Any
+    reports: Any
+
+    def for_shard(self, index: int) -> "ShardContext":
+        """
+        指定したシャード番号のコンテキストを返します。共有オブジェクトはそのまま引き継ぎます。
+        """
+        return ShardContext(index, self.count, self.inboxes, self.sent, self.received, self.idle_marks,
+                            self.stop_events, self.document_counters, self.done_event, self.reports)
+
+    def owns(self, url: str) -> bool:
+        """
+        URLのホストをこのシャードが担当しているかを返します。
+        """
+        return shard_of(url, self.count) == self.index
+
+
+class ShardedCrawlTargetQueue:
+    """
+    シャード分割時のクロール対象キュー。
+    担当するホストのURLはローカルのキューに追加し、担当外のURLは担当シャードの受信キューへ転送します。
+    ホストごとに1つのシャードだけがURLを保持するため、重複排除とホスト単位の丁寧さの制御は分割前と同じく正確です。
+    """
+    def __init__(self, job_name: str, local_queue: CrawlTargetQueue, shard: ShardContext):
+        self.job_name = job_name
+        self.local_queue = local_queue
+        self.shard = shard
+        # 転送済みのURL。同じURLを何度も転送しないようにする（重複排除自体は担当シャードで行われる）
+        self._forwarded = FingerprintSet()
+
+    def put(self, item: Tuple[str, int], sitemap_priority: Optional[float] = None) -> bool:
+        """
+        URLと深度のタプルを、ホストを担当するシャードのキューに追加します。
+        2回目以降に見つかった担当外のURLは転送しないため、優先度順の場合の被リンク数はシャード内で見つかった数になります。
+        """
+        url, depth = item
+        owner = shard_of(url, self.shard.count)
+        if owner == self.shard.index:
+            return self.local_queue.put(item, sitemap_priority=sitemap_priority)
+        if not self._forwarded.add(url_fingerprint(url)):
+            return False
+        # 受信側が数える前に送信数を増やし、転送中のリンクがある間はアイドルと判定されないようにする
+        with self.shard.sent.get_lock():
+            self.shard.sent[self.shard.index] += 1
+        self.shard.inboxes[owner].put((self.job_name, url, depth, sitemap_priority))
+        _FORWARDED_LINKS.inc(job=self.job_name)
+        return True
+
+    def requeue(self, item: Tuple[str, int]):
+        # 再試行するURLは取得したシャード（担当シャード）のキューに戻す
+        self.local_queue.requeue(item)
+
+    def get(self, timeout: float = None) -> Tuple[str, int]:
+        return self.local_queue.get(timeout=timeout)
+
+    def task_done(self, item: Optional[Tuple[str, int]] = None):
+        self.local_queue.task_done(item)
+
+    def empty(self) -> bool:
+        return self.local_queue.empty()
+
+    def qsize(self) -> int:
+        return self.local_queue.qsize()
+
+    def get_seen_urls_count(self) -> int:
+        return self.local_queue.get_seen_urls_count()
+
+    def close(self):
+        self.local_queue.close()
+
+
+class ShardRuntime:
+    """
+    シャードプロセス内で動作する補助処理をまとめたクラス。
+
+    - 受信キューからリンクを取り出し、ジョブのローカルキューに追加するスレッド
+    - メトリクスを定期的にコーディネーターへ送るスレッド
+    - クローラーのワーカーから呼ばれる終了判定（should_finish）
+    """
+    def __init__(self, shard: ShardContext):
+        self.shard = shard
+        self._queues: Dict[str, ShardedCrawlTargetQueue] = {}
+        self._crawlers: List[Any] = []
+        self._closed = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # 停止時に受信側が読み出しを止めても、送信側のプロセスが終了時にブロックしないようにする
+        for inbox in shard.inboxes:
+            inbox.cancel_join_thread()
+
+    def attach(self, queues: Dict[str, ShardedCrawlTargetQueue], crawlers: List[Any]):
+        """
+        ジョブごとのクロール対象キューとクローラーを登録し、補助スレッドを開始します。
+        クローラーの crawl_target_queue には、queues のキューを渡しておく必要があります。
+        """
+        self._queues = queues
+        self._crawlers = crawlers
+        self._threads = [
+            threading.Thread(target=self._receive_links, name=f"shard-{self.shard.index}-inbox", daemon=True),
+            threading.Thread(target=self._report_metrics, name=f"shard-{self.shard.index}-metrics", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def should_finish(self) -> bool:
+        """
+        クローラーのワーカーがアイドルになったときに呼ばれ、終了してよいかを返します。
+        このシャードがアイドルであれば、その時点の受信済みリンク数をコーディネーターに通知します。
+        イベントループのスレッドから呼ばれるため、処理中のURL数の確認と競合しません。
+        """
+        if self.shard.done_event.is_set():
+            return True
+        # 受信数を先に読むことで、確認後に届いたリンクは受信数の不一致としてコーディネーターに検出される
+        received = self.shard.received[self.shard.index]
+        # 停止したジョブのキューに残ったURLは処理されないため、判定から除く
+        idle = all(crawler._in_flight == 0 and crawler.crawl_target_queue.empty()
+                   for crawler in self._crawlers if not crawler.stop_event.is_set())
+        self.shard.idle_marks[self.shard.index] = received if idle else _BUSY
+        return False
+
+    def _receive_links(self):
+        inbox = self.shard.inboxes[self.shard.index]
+        while not self._closed.is_set():
+            try:
+                job_name, url, depth, sitemap_priority = inbox.get(timeout=_INBOX_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            # キューに追加してから受信数を増やし、アイドル判定が追加前の状態で確定しないようにする
+            self._queues[job_name].local_queue.put((url, depth), sitemap_priority=sitemap_priority)
+            with self.shard.received.get_lock():
+                self.shard.received[self.shard.index] += 1
+            _RECEIVED_LINKS.inc(job=job_name)
+
+    def _report_metrics(self):
+        while not self._closed.wait(_METRICS_REPORT_INTERVAL):
+            self.shard.reports.put(("metrics", self.shard.index, REGISTRY.drain()))
+
+    def close(self, summary: Dict[str, Any]):
+        """
+        補助スレッドを停止し、残りのメトリクスとシャードの集計結果をコーディネーターへ送ります。
+        """
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+        self.shard.reports.put(("metrics", self.shard.index, REGISTRY.drain()))
+        self.shard.reports.put(("summary", self.shard.index, summary))
+
+
+class ShardCoordinator:
+    """
+    シャードプロセスを起動し、進捗を集約するコーディネーター（親プロセスで動作）。
+
+    全シャードがアイドルで、かつ転送中のリンクが無い状態が続いたときにクロールを終了させます。
+    max_documents はジョブごとの共有カウンターで全シャード合計に対して適用され、
+    上限に達したジョブの停止イベントは全シャードで共有されます。max_depth は各シャードのクローラーがリンクごとに適用します。
+    """
+    def __init__(self, job_names: List[str], num_shards: int):
+        self._mp = multiprocessing.get_context("spawn")
+        self.num_shards = num_shards
+        self.context = ShardContext(
+            index=0,
+            count=num_shards,
+            inboxes=[self._mp.Queue() for _ in range(num_shards)],
+            sent=self._mp.Array("q", num_shards),
+            received=self._mp.Array("q", num_shards),
+            idle_marks=self._mp.Array("q", [_BUSY] * num_shards),
+            stop_events={name: self._mp.Event() for name in job_names},
+            document_counters={name: self._mp.Value("q", 0) for name in job_names},
+            done_event=self._mp.Event(),
+            reports=self._mp.Queue(),
+        )
+        self.summaries: Dict[int, Dict[str, Any]] = {}
+        # 異常終了したシャードプロセスの名前
+        self.failed_shards: List[str] = []
+        self._processes: List[Any] = []
+
+    def run(self, target: Callable, args: Tuple = ()) -> Dict[int, Dict[str, Any]]:
+        """
+        シャードごとに target(ShardContext, *args) を別プロセスで実行し、すべて終了するまで待ちます。
+        シャードから受け取ったメトリクスはこのプロセスのレジストリに集約します。シャードごとの集計結果を返します。
+        """
+        self._processes = [
+            self._mp.Process(target=target, args=(self.context.for_shard(i), *args), name=f"crawl-shard-{i}")
+            for i in range(self.num_shards)
+        ]
+        for process in self._processes:
+            process.start()
+        logger.info(f"Started {self.num_shards} crawl shard process(es).")
+
+        quiescent_checks = 0
+        last_progress_log = time.monotonic()
+        while any(process.is_alive() for process in self._processes):
+            self._collect_reports(timeout=_COORDINATOR_POLL_INTERVAL)
+            if time.monotonic() - last_progress_log >= _PROGRESS_LOG_INTERVAL:
+                logger.info(f"Shard progress: {self.progress()}")
+                last_progress_log = time.monotonic()
+            if self._has_failed_shard():
+                self.stop()
+            if self.context.done_event.is_set():
+                continue
+            quiescent_checks = quiescent_checks + 1 if self._is_quiescent() else 0
+            if quiescent_checks >= _QUIESCENT_CHECKS:
+                logger.info("All shards are idle and no links are in transit. Finishing crawl.")
+                self.context.done_event.set()
+
+        for process in self._processes:
+            process.join()
+        self._collect_reports(timeout=0)
+        self.failed_shards = [process.name for process in self._processes if process.exitcode != 0]
+        if self.failed_shards:
+            logger.error(f"Crawl shard process(es) exited with an error: {', '.join(self.failed_shards)}")
+        return self.summaries
+
+    def stop(self):
+        """
+        全ジョブの停止イベントと終了イベントを設定し、全シャードを停止させます。
+        """
+        for event in self.context.stop_events.values():
+            event.set()
+        self.context.done_event.set()
+
+    def progress(self) -> Dict[str, Any]:
+        """
+        全シャードのリンクの送受信数とジョブごとのインデックス済みドキュメント数を返します。
+        """
+        return {
+            "forwarded_links": sum(self.context.sent[:]),
+            "received_links": sum(self.context.received[:]),
+            "indexed_documents": {name: counter.value for name, counter in self.context.document_counters.items()},
+        }
+
+    def _is_quiescent(self) -> bool:
+        # 送信数と受信数が一致し、全シャードが最後の受信以降アイドルであれば、新たなリンクは生まれない
+        received = self.context.received[:]
+        if sum(self.context.sent[:]) != sum(received):
+            return False
+        return all(mark == count for mark, count in zip(self.context.idle_marks[:], received))
+
+    def _has_failed_shard(self) -> bool:
+        return any(process.exitcode not in (None, 0) for process in self._processes) and not self.context.done_event.is_set()
+
+    def _collect_reports(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                kind, index, payload = self.context.reports.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return
+            if kind == "metrics":
+                REGISTRY.merge(payload)
+            elif kind == "summary":
+                self.summaries[index] = payload
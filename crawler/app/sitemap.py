@@ -0,0 +1,165 @@
+import re
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from xml.etree import ElementTree
+
+# サイトマップ1ファイルあたりの展開後の最大サイズ（sitemaps.org の仕様の上限は50MB・50,000URL）
+DEFAULT_MAX_SITEMAP_SIZE = 50 * 1024 * 1024
+# gzip を展開する際に1回で取り出す最大バイト数
+_INFLATE_CHUNK_SIZE = 64 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+_LASTMOD_PATTERN = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?)?\s*(Z|[+-]\d{2}:?\d{2})?$")
+
+
+class SitemapError(Exception):
+    """
+    サイトマップを解析できない場合に送出される例外。
+    """
+    pass
+
+
+@dataclass(frozen=True)
+class SitemapEntry:
+    """
+    サイトマップの1件のエントリ。is_sitemap が True の場合はサイトマップインデックスに含まれる子サイトマップです。
+    priority はサイトマップの <priority>（0.0〜1.0）で、指定がない場合はNoneです。
+    """
+    loc: str
+    lastmod: Optional[datetime] = None
+    is_sitemap: bool = False
+    priority: Optional[float] = None
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """
+    W3C Datetime 形式の lastmod（`2024-05-01`、`2024-05-01T10:20:30+09:00` など）を、タイムゾーン付きの日時に変換します。
+    タイムゾーンなしの場合はUTCとみなします。日付のみの場合はその日のうちに更新された可能性があるため、
+    その日の終わり（23:59:59 UTC）とみなします。解析できない場合はNoneを返します。
+    """
+    if not value:
+        return None
+    match = _LASTMOD_PATTERN.match(value.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    tz = timezone.utc
+    if zone and zone != "Z":
+        sign = -1 if zone[0] == "-" else 1
+        digits = zone[1:].replace(":", "")
+        tz = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+    if hour is None:
+        hour, minute, second = 23, 59, 59
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0), tzinfo=tz)
+    except ValueError:
+        return None
+
+
+def parse_priority(value: Optional[str]) -> Optional[float]:
+    """
+    サイトマップの <priority> を 0.0〜1.0 の数値に変換します。解析できない場合はNoneを返します。
+    """
+    if not value:
+        return None
+    try:
+        priority = float(value.strip())
+    except ValueError:
+        return None
+    if priority != priority: # NaN
+        return None
+    return min(1.0, max(0.0, priority))
+
+
+class SitemapParser:
+    """
+    サイトマップ（urlset）とサイトマップインデックス（sitemapindex）をストリーミングで解析するクラス。
+    レスポンスボディをチャンクごとに feed() に渡すと、そのチャンクまでに読み終えたエントリを返します。
+    gzip 圧縮されたファイル（sitemap.xml.gz）は先頭のバイト列で判定して逐次展開します。
+    読み終えた要素はすぐに破棄するため、5万URLのサイトマップでもメモリ使用量はエントリ数によらずほぼ一定です。
+    """
+    def __init__(self, max_size: int = DEFAULT_MAX_SITEMAP_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self._decompressor = None
+        self._header = b""
+        self._started = False
+        self._root = None
+        self._depth = 0
+        self._loc: Optional[str] = None
+        self._lastmod: Optional[str] = None
+        self._priority: Optional[str] = None
+
+    def feed(self, data: bytes) -> List[SitemapEntry]:
+        """
+        ボディの一部を解析し、読み終えたエントリのリストを返します。
+        """
+        if not self._started:
+            self._header += data
+            if len(self._header) < len(_GZIP_MAGIC):
+                return []
+            data, self._header = self._header, b""
+            self._started = True
+            if data.startswith(_GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._decompressor is None:
+            return self._feed_xml(data)
+        # 圧縮率の高いファイルでも一度に大きなデータを展開しないよう、一定サイズずつ展開して解析する
+        entries = self._feed_xml(self._decompressor.decompress(data, _INFLATE_CHUNK_SIZE))
+        while self._decompressor.unconsumed_tail:
+            entries.extend(self._feed_xml(self._decompressor.decompress(self._decompressor.unconsumed_tail, _INFLATE_CHUNK_SIZE)))
+        return entries
+
+    def close(self) -> List[SitemapEntry]:
+        """
+        残りのデータを解析し、最後のエントリのリストを返します。
+        """
+        entries = []
+        if not self._started and self._header:
+            self._started = True
+            entries = self._feed_xml(self._header)
+        try:
+            self._parser.close()
+        except ElementTree.ParseError as e:
+            raise SitemapError(f"Invalid sitemap XML: {e}")
+        return entries + self._read_entries()
+
+    def _feed_xml(self, data: bytes) -> List[SitemapEntry]:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise SitemapError(f"Sitemap exceeds the limit of {self.max_size} bytes.")
+        try:
+            self._parser.feed(data)
+        except ElementTree.ParseError as e:
+            raise SitemapError(f"Invalid sitemap XML: {e}")
+        return self._read_entries()
+
+    def _read_entries(self) -> List[SitemapEntry]:
+        entries = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                if self._root is None:
+                    self._root = element
+                continue
+            self._depth -= 1
+            name = element.tag.rsplit("}", 1)[-1]
+            # <urlset>/<url>/<loc> の深さの要素だけを読む（画像サイトマップなどの拡張の <loc> は無視する）
+            if self._depth == 2 and name == "loc":
+                self._loc = (element.text or "").strip()
+            elif self._depth == 2 and name == "lastmod":
+                self._lastmod = element.text
+            elif self._depth == 2 and name == "priority":
+                self._priority = element.text
+            elif self._depth == 1 and name in ("url", "sitemap"):
+                if self._loc:
+                    entries.append(SitemapEntry(self._loc, parse_lastmod(self._lastmod), name == "sitemap",
+                                                parse_priority(self._priority)))
+                self._loc = self._lastmod = self._priority = None
+                # 読み終えたエントリを破棄し、ルート要素に子要素が溜まらないようにする
+                self._root.clear()
+        return entries
+
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+import pytest
+
+from bulk_indexer import BulkIndexer
+from document_entity import Document
+
+
+class FakeBulkClient:
+    """
+    _bulk のレスポンスを順に返す ElasticsearchClient の代替。responses を使い切った後はすべて成功を返します。
+    """
+    index_name = "docs"
+
+    def __init__(self, responses=None, delay=0.0):
+        self.responses = list(responses or [])
+        self.delay = delay
+        self.requests = []
+
+    def bulk(self, body: bytes):
+        lines = body.decode("utf-8").splitlines()
+        ids = [json.loads(line)["index"]["_id"] for line in lines if '"index"' in line and '"_id"' in line]
+        self.requests.append(ids)
+        time.sleep(self.delay)
+        if self.responses:
+            response = self.responses.pop(0)
+            return response(ids) if callable(response) else response
+        return {"errors": False, "items": [{"index": {"_id": doc_id, "status": 201}} for doc_id in ids]}
+
+
+def make_document(i: int) -> Document:
+    return Document(url=f"http://example.com/{i}", title=f"t{i}", content="c", content_length=1,
+                    mime_type="text/html", timestamp="2024-01-01T00:00:00")
+
+
+@pytest.fixture
+def results():
+    return {}
+
+
+def make_indexer(client, **kwargs):
+    kwargs.setdefault("max_documents", 100)
+    kwargs.setdefault("flush_interval", 60.0)
+    kwargs.setdefault("retry_backoff", 0.0)
+    return BulkIndexer(client, **kwargs)
+
+
+def callback_into(results):
+    def callback(doc_id, success, error):
+        results[doc_id] = (success, error)
+    return callback
+
+
+def test_all_items_succeed(results):
+    client = FakeBulkClient()
+    indexer = make_indexer(client)
+    for i in range(3):
+        indexer.add(make_document(i), f"id{i}", callback=callback_into(results))
+    indexer.close()
+    assert results == {f"id{i}": (True, None) for i in range(3)}
+    assert indexer.indexed_count == 3
+
+
+def test_rejected_items_are_retried(results):
+    def reject_second(ids):
+        return {"errors": True, "items": [{"index": {"_id": ids[0], "status": 201}},
+                                          {"index": {"_id": ids[1], "status": 429}}]}
+    client = FakeBulkClient([reject_second])
+    indexer = make_indexer(client)
+    indexer.add(make_document(0), "id0", callback=callback_into(results))
+    indexer.add(make_document(1), "id1", callback=callback_into(results))
+    indexer.close()
+    assert client.requests == [["id0", "id1"], ["id1"]]
+    assert results == {"id0": (True, None), "id1": (True, None)}
+
+
+@pytest.mark.parametrize("response", [
+    {"errors": False},
+    {"errors": True, "items": [{"index": {"_id": "id0", "status": 201}}]},
+    {"error": {"type": "illegal_argument_exception"}, "status": 400},
+])
+def test_unmatched_items_are_retried_then_reported(results, response):
+    client = FakeBulkClient([response] * 10)
+    indexer = make_indexer(client, max_retries=2)
+    indexer.add(make_document(0), "id0", callback=callback_into(results))
+    indexer.add(make_document(1), "id1", callback=callback_into(results))
+    indexer.close()
+    # 再送のたびにバッチ全体を送り、最後は失敗としてすべてのアイテムに通知する
+    assert client.requests == [["id0", "id1"]] * 3
+    assert set(results) == {"id0", "id1"}
+    assert all(not success and error for success, error in results.values())
+    assert indexer.failed_count == 2
+
+
+def test_unmatched_items_succeed_on_retry(results):
+    client = FakeBulkClient([{"errors": False, "items": []}])
+    indexer = make_indexer(client)
+    indexer.add(make_document(0), "id0", callback=callback_into(results))
+    indexer.close()
+    assert results == {"id0": (True, None)}
+
+
+def test_retry_wait_does_not_block_other_flushes(results):
+    def reject_all(ids):
+        return {"errors": True, "items": [{"index": {"_id": doc_id, "status": 503}} for doc_id in ids]}
+    client = FakeBulkClient([reject_all])
+    indexer = make_indexer(client, retry_backoff=1.0)
+    indexer.add(make_document(0), "id0", callback=callback_into(results))
+    retrying = threading.Thread(target=indexer.flush)
+    retrying.start()
+    while len(client.requests) < 1:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    indexer.add(make_document(1), "id1", callback=callback_into(results))
+    indexer.flush()
+    assert time.monotonic() - started < 0.5
+    assert results == {"id1": (True, None)}
+
+    retrying.join()
+    indexer.close()
+    assert results["id0"] == (True, None)
@@ -0,0 +1,78 @@
+from chunker import Chunker, chunk_id, chunk_index_name
+from document_entity import Document
+
+
+def assert_offsets_match(text, chunks):
+    encoded = text.encode("utf-8")
+    for chunk in chunks:
+        assert encoded[chunk.start_offset:chunk.end_offset].decode("utf-8") == chunk.content
+
+
+def test_names():
+    assert chunk_index_name("docs") == "docs-chunks"
+    assert chunk_id("abc", 3) == "abc-3"
+
+
+def test_empty_text():
+    assert Chunker().split("") == []
+
+
+def test_short_text_is_one_chunk():
+    chunks = Chunker().split("hello\nworld")
+    assert len(chunks) == 1
+    assert chunks[0].content == "hello\nworld"
+    assert chunks[0].position == 0
+    assert chunks[0].heading_path == []
+
+
+def test_headings_start_new_chunks_with_heading_path():
+    text = "Intro\n" + "a" * 20 + "\nSetup\n" + "b" * 20 + "\nLinux\n" + "c" * 20 + "\nUsage\n" + "d" * 20
+    headings = [(1, "Intro"), (2, "Setup"), (3, "Linux"), (2, "Usage")]
+    chunks = Chunker(max_chars=100, overlap_chars=0, min_chars=10).split(text, headings)
+    assert [chunk.content.split("\n")[0] for chunk in chunks] == ["Intro", "Setup", "Linux", "Usage"]
+    assert [chunk.heading_path for chunk in chunks] == [
+        ["Intro"], ["Intro", "Setup"], ["Intro", "Setup", "Linux"], ["Intro", "Usage"]]
+    assert [chunk.position for chunk in chunks] == [0, 1, 2, 3]
+    assert_offsets_match(text, chunks)
+
+
+def test_short_sections_are_merged():
+    text = "A\nx\nB\n" + "y" * 30
+    chunks = Chunker(max_chars=100, overlap_chars=0, min_chars=10).split(text, [(2, "A"), (2, "B")])
+    assert len(chunks) == 1
+    # 結合したチャンクの見出しの階層は末尾のもの
+    assert chunks[0].heading_path == ["B"]
+
+
+def test_chunks_respect_max_chars_and_overlap():
+    lines = [f"line {i:02d} " + "x" * 10 for i in range(40)]
+    text = "\n".join(lines)
+    chunks = Chunker(max_chars=100, overlap_chars=40, min_chars=0).split(text)
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert len(chunk.content.replace("\n", "")) <= 100
+        # 直前のチャンクの末尾の行を先頭に含める
+        assert chunk.content.split("\n")[0] in previous.content.split("\n")[-2:]
+    assert chunks[-1].content.endswith(lines[-1])
+    assert_offsets_match(text, chunks)
+
+
+def test_long_line_is_split_with_overlap():
+    text = "あいうえお" * 50
+    chunks = Chunker(max_chars=100, overlap_chars=20, min_chars=0).split(text)
+    assert all(len(chunk.content) <= 100 for chunk in chunks)
+    assert chunks[0].content[-20:] == chunks[1].content[:20]
+    assert chunks[-1].content == text[-len(chunks[-1].content):]
+    assert_offsets_match(text, chunks)
+
+
+def test_build_chunks():
+    document = Document(url="http://example.com/", title="t", content="Intro\nbody", content_length=10,
+                        mime_type="text/html", timestamp="2024-01-01T00:00:00")
+    chunker = Chunker()
+    built = chunker.build_chunks(document, "doc1", chunker.split(document.content, [(1, "Intro")]))
+    assert len(built) == 1
+    assert built[0].doc_id == "doc1"
+    assert built[0].url == document.url
+    assert built[0].heading_path == ["Intro"]
+    assert built[0].content == "Intro\nbody"
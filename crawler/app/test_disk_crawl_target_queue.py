@@ -0,0 +1,85 @@
+import queue
+
+import pytest
+
+from disk_crawl_target_queue import DiskCrawlTargetQueue
+from frontier_priority import PriorityScorer
+
+
+@pytest.fixture
+def frontier_path(tmp_path):
+    return str(tmp_path / "frontier.sqlite3")
+
+
+def drain(frontier):
+    items = []
+    while not frontier.empty():
+        item = frontier.get(timeout=1)
+        frontier.task_done(item)
+        items.append(item)
+    return items
+
+
+def test_fifo_order_and_dedup(frontier_path):
+    frontier = DiskCrawlTargetQueue(frontier_path)
+    assert frontier.put(("http://example.com/a", 0))
+    assert frontier.put(("http://example.com/b", 1))
+    assert not frontier.put(("http://example.com/a", 2))
+    assert drain(frontier) == [("http://example.com/a", 0), ("http://example.com/b", 1)]
+    assert frontier.get_seen_urls_count() == 2
+    with pytest.raises(queue.Empty):
+        frontier.get(timeout=0.01)
+    frontier.close()
+
+
+def test_resume_keeps_pending_and_seen_urls(frontier_path):
+    frontier = DiskCrawlTargetQueue(frontier_path, checkpoint_interval=1)
+    frontier.put(("http://example.com/a", 0))
+    frontier.put(("http://example.com/b", 0))
+    frontier.task_done(frontier.get(timeout=1))
+    # 取得したまま完了していないURLは再開後にもう一度取り出す
+    frontier.get(timeout=1)
+    frontier.close()
+
+    resumed = DiskCrawlTargetQueue(frontier_path)
+    assert not resumed.put(("http://example.com/a", 0))
+    assert drain(resumed) == [("http://example.com/b", 0)]
+    resumed.close()
+
+
+def test_priority_order_and_rescore_on_rediscovery(frontier_path):
+    frontier = DiskCrawlTargetQueue(frontier_path, scorer=PriorityScorer())
+    frontier.put(("http://example.com/deep", 3))
+    frontier.put(("http://example.com/linked", 2))
+    frontier.put(("http://example.com/shallow", 1))
+    # 被リンク数が3になり、スコアは log2(4) - 2 = 0 で shallow（-1）より大きくなる
+    for _ in range(3):
+        assert not frontier.put(("http://example.com/linked", 2))
+    assert [url for url, _ in drain(frontier)] == [
+        "http://example.com/linked", "http://example.com/shallow", "http://example.com/deep"]
+    frontier.close()
+
+
+def test_priority_requeue_keeps_score(frontier_path):
+    frontier = DiskCrawlTargetQueue(frontier_path, scorer=PriorityScorer(url_weights={"/important": 10.0}))
+    frontier.put(("http://example.com/important", 0))
+    item = frontier.get(timeout=1)
+    frontier.task_done(item)
+    frontier.put(("http://example.com/other", 0))
+    # 再試行のために戻したURLも、スコアに従って先に取り出される
+    frontier.requeue(item)
+    assert [url for url, _ in drain(frontier)] == ["http://example.com/important", "http://example.com/other"]
+    frontier.close()
+
+
+def test_priority_mode_resumes_leased_rows(frontier_path):
+    frontier = DiskCrawlTargetQueue(frontier_path, checkpoint_interval=1, scorer=PriorityScorer())
+    for i in range(5):
+        frontier.put((f"http://example.com/{i}", i))
+    frontier.get(timeout=1)
+    frontier.close()
+
+    resumed = DiskCrawlTargetQueue(frontier_path, scorer=PriorityScorer())
+    assert resumed.qsize() == 5
+    assert [depth for _, depth in drain(resumed)] == [0, 1, 2, 3, 4]
+    resumed.close()
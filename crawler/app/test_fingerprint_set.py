@@ -0,0 +1,48 @@
+import random
+
+from fingerprint_set import FingerprintSet, url_fingerprint
+
+
+def test_url_fingerprint_is_stable_64_bit():
+    assert url_fingerprint("http://example.com/") == url_fingerprint("http://example.com/")
+    assert url_fingerprint("http://example.com/") != url_fingerprint("http://example.com/a")
+    assert 0 <= url_fingerprint("http://example.com/") < 2 ** 64
+
+
+def test_add_and_contains():
+    fingerprints = FingerprintSet()
+    assert fingerprints.add(42)
+    assert not fingerprints.add(42)
+    assert 42 in fingerprints
+    assert 43 not in fingerprints
+    assert len(fingerprints) == 1
+
+
+def test_zero_is_stored_as_one():
+    # 0 は空きスロットを表すため 1 と同じ値として扱う
+    fingerprints = FingerprintSet()
+    assert fingerprints.add(0)
+    assert 0 in fingerprints
+    assert 1 in fingerprints
+    assert not fingerprints.add(1)
+
+
+def test_grows_and_keeps_all_members():
+    rng = random.Random(0)
+    values = {rng.getrandbits(64) for _ in range(10000)}
+    fingerprints = FingerprintSet(capacity=4)
+    initial_bytes = fingerprints.nbytes()
+    fingerprints.update(values)
+    assert len(fingerprints) == len(values)
+    assert all(value in fingerprints for value in values)
+    assert fingerprints.nbytes() > initial_bytes
+    assert len(fingerprints) <= fingerprints.nbytes() // 8 * FingerprintSet._MAX_LOAD
+
+
+def test_colliding_slots_are_probed():
+    fingerprints = FingerprintSet(capacity=8)
+    size = fingerprints.nbytes() // 8
+    colliding = [3 + size * i for i in range(1, 6)]
+    fingerprints.update(colliding)
+    assert all(value in fingerprints for value in colliding)
+    assert 3 + size * 10 not in fingerprints
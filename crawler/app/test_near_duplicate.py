@@ -0,0 +1,97 @@
+import random
+from collections import Counter
+
+import near_duplicate
+from near_duplicate import NearDuplicate, SimHashIndex, simhash
+
+_MASK = (1 << 64) - 1
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def reference_simhash(text):
+    """
+    ビットごとに重みを加算する素朴な実装。
+    """
+    tokens = near_duplicate._TOKEN_PATTERN.findall(text.lower())
+    hashes = [near_duplicate._token_hash(token) for token in tokens]
+    features = Counter(
+        near_duplicate._mix((hashes[i] * 0x9E3779B97F4A7C15 + hashes[i + 1] * 0xC2B2AE3D27D4EB4F + hashes[i + 2])
+                            & near_duplicate._MASK64)
+        for i in range(len(hashes) - 2))
+    total = sum(features.values())
+    signature = 0
+    for bit in range(64):
+        ones = sum(weight for feature, weight in features.items() if (feature >> bit) & 1)
+        if ones * 2 > total:
+            signature |= 1 << bit
+    return signature
+
+
+def flip_bits(signature, bits):
+    for bit in bits:
+        signature ^= 1 << bit
+    return signature
+
+
+def test_simhash_matches_reference():
+    for text in (TEXT, "日本語のテキストを一文字ずつトークンにして署名を計算します。" * 3, TEXT + " word1 word2 word3" * 20):
+        assert simhash(text) == reference_simhash(text)
+
+
+def test_short_text_has_no_signature():
+    assert simhash(None) is None
+    assert simhash("") is None
+    assert simhash("only a few words here") is None
+
+
+def test_similar_texts_are_close():
+    signature = simhash(TEXT)
+    assert simhash(TEXT.upper()) == signature
+    edited = TEXT.replace("word100", "changed")
+    assert (simhash(edited) ^ signature).bit_count() <= 3
+    different = " ".join(f"other{i}" for i in range(200))
+    assert (simhash(different) ^ signature).bit_count() > 10
+
+
+def test_index_finds_nearest_within_distance():
+    index = SimHashIndex(max_distance=3)
+    base = random.Random(0).getrandbits(64)
+    index.add("http://example.com/a", base)
+    index.add("http://example.com/b", flip_bits(base, [1, 2]))
+    assert index.find(flip_bits(base, [1])) == NearDuplicate("http://example.com/a", 1)
+    assert index.find(flip_bits(base, [1, 2, 40])) == NearDuplicate("http://example.com/b", 1)
+    assert index.find(flip_bits(base, [10, 20, 30, 40, 50])) is None
+    assert index.find(base, exclude="http://example.com/a") == NearDuplicate("http://example.com/b", 2)
+
+
+def test_every_distance_up_to_max_is_found():
+    rng = random.Random(1)
+    for max_distance in range(SimHashIndex.MAX_DISTANCE + 1):
+        index = SimHashIndex(max_distance=max_distance)
+        base = rng.getrandbits(64)
+        index.add("http://example.com/", base)
+        for _ in range(20):
+            bits = rng.sample(range(64), max_distance)
+            assert index.find(flip_bits(base, bits)) == NearDuplicate("http://example.com/", max_distance)
+
+
+def test_check_and_add_registers_only_canonical_documents():
+    index = SimHashIndex()
+    assert index.check_and_add("http://example.com/a", 0b1111) is None
+    assert index.check_and_add("http://example.com/b", 0b0111) == NearDuplicate("http://example.com/a", 1)
+    assert len(index) == 1
+    # 重複と判定されたURLの以前の登録は削除される
+    index.add("http://example.com/c", 1 << 60)
+    assert index.check_and_add("http://example.com/c", 0b1110) == NearDuplicate("http://example.com/a", 1)
+    assert index.find(1 << 60) is None
+
+
+def test_replace_remove_and_load():
+    index = SimHashIndex()
+    assert index.load([("http://example.com/a", 0), ("http://example.com/b", _MASK)]) == 2
+    index.add("http://example.com/a", (1 << 32) - 1)
+    assert index.find(0) is None
+    assert len(index) == 2
+    index.remove("http://example.com/b")
+    assert index.find(_MASK) is None
+    assert len(index) == 1
@@ -0,0 +1,61 @@
+import asyncio
+import pickle
+
+import pytest
+
+from crawl_result_queue import CrawlResult
+from page_parser import SUPPORTED_BACKENDS, PageParser
+from transform_stage import TransformStage
+
+# 段落が多いページ。パースツリーへの参照が残っていると pickle で RecursionError になる
+LARGE_PAGE = (
+    "<html><head><title>Large page</title></head><body>"
+    "<h1>Heading</h1>"
+    + "".join(f"<p>paragraph {i} <a href='/p/{i}#frag'>link</a></p>" for i in range(2000))
+    + "<script>var x = 1;</script></body></html>"
+)
+
+
+@pytest.mark.parametrize("backend", SUPPORTED_BACKENDS)
+def test_parsed_page_is_plain_and_picklable(backend):
+    parsed = PageParser(backend).parse("http://example.com/", LARGE_PAGE)
+
+    assert type(parsed.title) is str
+    assert parsed.title == "Large page"
+    assert all(type(link) is str for link in parsed.links)
+    assert all(type(text) is str for _, text in parsed.headings)
+    assert "http://example.com/p/0" in parsed.links
+    assert "var x" not in parsed.text
+
+    restored = pickle.loads(pickle.dumps(parsed))
+    assert restored == parsed
+
+
+@pytest.mark.parametrize("backend", SUPPORTED_BACKENDS)
+def test_title_with_child_elements(backend):
+    parsed = PageParser(backend).parse("http://example.com/", "<html><head><title></title></head><body>x</body></html>")
+    assert parsed.title is None or type(parsed.title) is str
+
+
+@pytest.mark.parametrize("backend", SUPPORTED_BACKENDS)
+def test_transform_output_is_picklable(backend):
+    stage = TransformStage(backend, workers=0)
+    result = CrawlResult(url="http://example.com/", content_bytes=LARGE_PAGE.encode("utf-8"),
+                         mime_type="text/html", encoding="utf-8")
+    output = asyncio.run(stage.transform(result))
+    assert output.document.title == "Large page"
+    restored = pickle.loads(pickle.dumps(output))
+    assert restored.document.title == "Large page"
+    assert restored.links == output.links
+
+
+def test_transform_in_worker_process():
+    stage = TransformStage("html.parser", workers=1)
+    try:
+        result = CrawlResult(url="http://example.com/", content_bytes=LARGE_PAGE.encode("utf-8"),
+                             mime_type="text/html", encoding="utf-8")
+        output = asyncio.run(stage.transform(result))
+    finally:
+        stage.close()
+    assert output.document.title == "Large page"
+    assert len(output.links) == 2000
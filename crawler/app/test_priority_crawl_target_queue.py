@@ -0,0 +1,66 @@
+import queue
+
+import pytest
+
+from frontier_priority import PriorityScorer
+from priority_crawl_target_queue import PriorityCrawlTargetQueue
+
+
+def drain(frontier):
+    items = []
+    while not frontier.empty():
+        items.append(frontier.get(timeout=1))
+    return items
+
+
+def test_scorer_combines_depth_inlinks_sitemap_and_url_weights():
+    scorer = PriorityScorer(depth_weight=1.0, url_weights={r"\.pdf$": -2.0}, inlink_weight=1.0, sitemap_weight=2.0)
+    assert scorer.score("http://example.com/a", 2) == -2.0
+    assert scorer.score("http://example.com/a", 0, inlinks=3) == 2.0
+    assert scorer.score("http://example.com/a", 0, sitemap_priority=1.0) == 1.0
+    assert scorer.score("http://example.com/a.pdf", 0) == -2.0
+
+
+def test_scorer_ignores_invalid_pattern():
+    scorer = PriorityScorer(url_weights={"[": 1.0, "/docs/": 1.0})
+    assert scorer.score("http://example.com/docs/", 0) == 1.0
+
+
+def test_highest_score_first_and_rescore_on_rediscovery():
+    frontier = PriorityCrawlTargetQueue(PriorityScorer())
+    frontier.put(("http://example.com/deep", 3))
+    frontier.put(("http://example.com/linked", 2))
+    frontier.put(("http://example.com/shallow", 1))
+    for _ in range(3):
+        assert not frontier.put(("http://example.com/linked", 2))
+    assert frontier.qsize() == 3
+    assert [url for url, _ in drain(frontier)] == [
+        "http://example.com/linked", "http://example.com/shallow", "http://example.com/deep"]
+    # 取得済みのURLは再び追加されない
+    assert not frontier.put(("http://example.com/linked", 0))
+    with pytest.raises(queue.Empty):
+        frontier.get(timeout=0.01)
+
+
+def test_rediscovery_at_shallower_depth_updates_depth():
+    frontier = PriorityCrawlTargetQueue(PriorityScorer())
+    frontier.put(("http://example.com/a", 4))
+    frontier.put(("http://example.com/a", 1))
+    assert frontier.get(timeout=1) == ("http://example.com/a", 1)
+
+
+def test_requeue_bypasses_dedup():
+    frontier = PriorityCrawlTargetQueue(PriorityScorer())
+    frontier.put(("http://example.com/a", 0))
+    item = frontier.get(timeout=1)
+    frontier.requeue(item)
+    assert frontier.get(timeout=1) == item
+
+
+def test_heap_is_compacted():
+    frontier = PriorityCrawlTargetQueue(PriorityScorer())
+    frontier.put(("http://example.com/a", 0))
+    for _ in range(5000):
+        frontier.put(("http://example.com/a", 0))
+    assert len(frontier._heap) <= 2 * frontier.qsize() + PriorityCrawlTargetQueue._COMPACT_THRESHOLD + 1
+    assert drain(frontier) == [("http://example.com/a", 0)]
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+from aiohttp import web
+
+from crawl_config import CrawlerConfig
+from crawl_result_queue import CrawlResultQueue
+from crawl_target_queue import CrawlTargetQueue
+from crawler import WebCrawler
+from robots import RobotsRules, product_token
+
+USER_AGENT = "Mozilla/5.0 (compatible; MyCrawler/1.0)"
+
+
+def test_product_token():
+    assert product_token(USER_AGENT) == "mycrawler"
+    assert product_token("OtherBot/2.0") == "otherbot"
+
+
+def test_longest_match_wins_and_allow_breaks_ties():
+    rules = RobotsRules.parse(
+        "User-agent: *\n"
+        "Disallow: /docs/\n"
+        "Allow: /docs/public/\n"
+        "Disallow: /tie\n"
+        "Allow: /tie\n", USER_AGENT)
+    assert rules.is_allowed("/")
+    assert not rules.is_allowed("/docs/private.html")
+    assert rules.is_allowed("/docs/public/index.html")
+    assert rules.is_allowed("/tie")
+
+
+def test_wildcards():
+    rules = RobotsRules.parse("User-agent: *\nDisallow: /*.pdf$\nDisallow: /search*q=\n", USER_AGENT)
+    assert not rules.is_allowed("/files/a.pdf")
+    assert rules.is_allowed("/files/a.pdf?download=1")
+    assert not rules.is_allowed("/search?lang=ja&q=x")
+    assert rules.is_allowed("/search?lang=ja")
+
+
+def test_matching_group_takes_precedence_over_star():
+    rules = RobotsRules.parse(
+        "User-agent: *\n"
+        "Disallow: /\n"
+        "\n"
+        "User-agent: OtherBot\n"
+        "User-agent: MyCrawler\n"
+        "Disallow: /private\n"
+        "Crawl-delay: 2.5\n"
+        "Sitemap: https://example.com/sitemap.xml\n", USER_AGENT)
+    assert rules.is_allowed("/public")
+    assert not rules.is_allowed("/private/a")
+    assert rules.crawl_delay == 2.5
+    assert rules.sitemaps == ["https://example.com/sitemap.xml"]
+
+
+def test_partial_user_agent_does_not_match():
+    rules = RobotsRules.parse(
+        "User-agent: bot\n"
+        "User-agent: Crawler\n"
+        "User-agent: MyCrawlerPro\n"
+        "Disallow: /\n"
+        "\n"
+        "User-agent: *\n"
+        "Disallow: /private\n", USER_AGENT)
+    # プロダクトトークンの一部に一致するだけのグループは使わず、`*` のグループに従う
+    assert rules.is_allowed("/public")
+    assert not rules.is_allowed("/private")
+    exact = RobotsRules.parse("User-agent: MYCRAWLER\nDisallow: /\n\nUser-agent: *\nDisallow:\n", USER_AGENT)
+    assert not exact.is_allowed("/public")
+
+
+def test_empty_disallow_and_comments():
+    rules = RobotsRules.parse("# comment\nUser-agent: *  # all\nDisallow:\nCrawl-delay: abc\n", USER_AGENT)
+    assert rules.is_allowed("/anything")
+    assert rules.crawl_delay is None
+
+
+def test_deny_all_still_allows_robots_txt():
+    for rules in (RobotsRules.deny_all(), RobotsRules.unreachable_host()):
+        assert not rules.is_allowed("/")
+        assert rules.is_allowed("/robots.txt")
+    assert RobotsRules.unreachable_host().unreachable
+    assert not RobotsRules.deny_all().unreachable
+    assert RobotsRules.allow_all().is_allowed("/")
+
+
+def crawl_with_server(robots_statuses, **config):
+    """
+    robots_statuses の順に robots.txt の応答を返すサーバーに対してクロールし、取得したURLと robots.txt の取得回数を返します。
+    """
+    statuses = list(robots_statuses)
+    robots_requests = []
+
+    async def robots(request):
+        robots_requests.append(request.path)
+        status = statuses.pop(0) if statuses else 200
+        return web.Response(status=status, text="User-agent: *\nDisallow: /private\n")
+
+    async def page(request):
+        return web.Response(text="<html><body><a href='/private'>p</a></body></html>", content_type="text/html")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/robots.txt", robots)
+        app.router.add_get("/{path:.*}", page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        start_url = f"http://127.0.0.1:{port}/"
+        crawler_config = CrawlerConfig(start_urls=[start_url], es_index="test", es_index_description="test",
+                                       delay=0.0, retry_base_delay=0.0, **config)
+        target_queue = CrawlTargetQueue()
+        target_queue.put((start_url, 0))
+        output_queue = CrawlResultQueue()
+        crawler = WebCrawler(crawler_config, target_queue, output_queue, threading.Event())
+        try:
+            await crawler._crawl_async()
+        finally:
+            await runner.cleanup()
+        fetched = []
+        while not output_queue.empty():
+            fetched.append(output_queue.get(timeout=1).url)
+        return fetched, len(robots_requests)
+
+    return asyncio.run(run())
+
+
+def test_unreachable_robots_txt_is_fetched_again_after_interval():
+    fetched, robots_fetches = crawl_with_server([503], robots_retry_interval=0.1)
+    assert len(fetched) == 1 and fetched[0].endswith("/")
+    assert robots_fetches == 2
+
+
+def test_urls_are_skipped_when_robots_txt_stays_unreachable():
+    fetched, robots_fetches = crawl_with_server([503] * 10, robots_retry_interval=0.05, fetch_max_retries=2)
+    assert fetched == []
+    assert robots_fetches == 3
+
+
+def test_robots_txt_not_found_allows_all():
+    fetched, robots_fetches = crawl_with_server([404])
+    assert sorted(url.rsplit("/", 1)[1] for url in fetched) == ["", "private"]
+    assert robots_fetches == 1
@@ -0,0 +1,54 @@
+import pytest
+
+from url_filter import REJECTED_BY_DOMAIN, REJECTED_BY_TARGET_PATTERN, UrlFilter
+
+
+def test_no_rules_allows_everything():
+    url_filter = UrlFilter()
+    assert url_filter.is_allowed("http://example.com/")
+    assert url_filter.rejection_reason("ftp://anything") is None
+
+
+def test_allowed_domains():
+    url_filter = UrlFilter(allowed_domains=["example.com", "*.docs.example.org", ".blog.example.net", "localhost:8080"])
+    assert url_filter.is_allowed("http://Example.com/a")
+    assert not url_filter.is_allowed("http://sub.example.com/a")
+    # `*.` はドメイン自体も許可する
+    assert url_filter.is_allowed("http://docs.example.org/")
+    assert url_filter.is_allowed("http://a.b.docs.example.org/")
+    assert url_filter.is_allowed("http://x.blog.example.net/")
+    assert not url_filter.is_allowed("http://evildocs.example.org/")
+    assert url_filter.is_allowed("http://localhost:8080/")
+    assert url_filter.rejection_reason("http://localhost:9090/") == REJECTED_BY_DOMAIN
+
+
+@pytest.mark.parametrize("targets", [
+    [r"http://example\.com/docs/", r"http://example\.com/blog/"],
+    # 後方参照を含む場合は個別にマッチさせる
+    [r"http://example\.com/docs/", r"http://(example)\.com/\1/"],
+])
+def test_target_and_exclude_patterns(targets):
+    url_filter = UrlFilter(target_url_patterns=targets, exclude_url_patterns=[r".*\.pdf$", r".*/private/"])
+    assert url_filter.is_allowed("http://example.com/docs/index.html")
+    assert url_filter.rejection_reason("http://example.com/other/") == REJECTED_BY_TARGET_PATTERN
+    assert url_filter.rejection_reason("http://example.com/docs/a.pdf") == r"exclude_pattern:.*\.pdf$"
+    assert url_filter.rejection_reason("http://example.com/docs/private/a") == "exclude_pattern:.*/private/"
+
+
+def test_backreference_pattern_keeps_its_meaning():
+    url_filter = UrlFilter(target_url_patterns=[r"http://example\.com/", r"http://(\w+)\.org/\1/"])
+    assert url_filter.is_allowed("http://site.org/site/")
+    assert not url_filter.is_allowed("http://site.org/other/")
+
+
+def test_stats_and_cache():
+    url_filter = UrlFilter(allowed_domains=["example.com"], exclude_url_patterns=[r".*\?"], cache_size=16)
+    for _ in range(3):
+        url_filter.is_allowed("http://example.com/")
+    url_filter.is_allowed("http://other.com/")
+    url_filter.is_allowed("http://example.com/?q")
+    stats = url_filter.get_stats()
+    assert stats["accepted"] == 3
+    assert stats["rejected"] == {"domain": 1, r"exclude_pattern:.*\?": 1}
+    assert stats["cache_hits"] == 2
+    assert stats["cache_misses"] == 3
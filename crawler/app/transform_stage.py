@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from chunker import Chunker, TextChunk
+from crawl_result_queue import CrawlResult
+from document_entity import Document
+from metrics import REGISTRY
+from near_duplicate import simhash
+from page_parser import PageParser
+from transformer import ContentTransformer, TRANSFORM_SECONDS
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@dataclass
+class TransformOutput:
+    """
+    変換ステージの出力。インデックス用のドキュメントと、ページから抽出したリンクを持ちます。
+    """
+    document: Document
+    links: List[str] = field(default_factory=list)
+    chunks: Optional[List[TextChunk]] = None # チャンク分割が有効な場合の、本文のパッセージ
+    simhash: Optional[int] = None # 近似重複の検出が有効な場合の、本文のSimHash署名
+    metrics: Optional[Dict[str, Any]] = None # ワーカープロセスで計測したメトリクス（親プロセスで集約する）
+
+
+# ワーカープロセスごとに1つだけ生成される変換器
+_worker_parser: Optional[PageParser] = None
+_worker_transformer: Optional[ContentTransformer] = None
+_worker_chunker: Optional[Chunker] = None
+_worker_simhash = False
+
+
+def _init_worker(parser_backend: str, chunker: Optional[Chunker] = None, compute_simhash: bool = False):
+    """
+    ワーカープロセスの初期化処理。パーサーと変換器をプロセスごとに1回だけ生成します。
+    """
+    global _worker_parser, _worker_transformer, _worker_chunker, _worker_simhash
+    _worker_parser = PageParser(parser_backend)
+    _worker_transformer = ContentTransformer(_worker_parser)
+    _worker_chunker = chunker
+    _worker_simhash = compute_simhash
+
+
+def _transform_in_worker(crawl_result: CrawlResult) -> TransformOutput:
+    """
+    生のHTMLバイト列をデコード・パースし、ドキュメントとリンクを生成します。
+    ワーカープロセス内（またはインライン実行時は呼び出し元スレッド内）で実行されます。
+    """
+    with TRANSFORM_SECONDS.time(step="decode"):
+        html_content = crawl_result.get_text_content()
+    with TRANSFORM_SECONDS.time(step="parse"):
+        crawl_result.parsed = _worker_parser.parse(crawl_result.url, html_content) if html_content else None
+    document = _worker_transformer.transform_crawl_result_to_document(crawl_result)
+    links = crawl_result.parsed.links if crawl_result.parsed else []
+    chunks = None
+    if _worker_chunker and document.content:
+        with TRANSFORM_SECONDS.time(step="chunk"):
+            chunks = _worker_chunker.split(document.content, crawl_result.parsed.headings if crawl_result.parsed else ())
+    signature = None
+    if _worker_simhash and document.content:
+        with TRANSFORM_SECONDS.time(step="simhash"):
+            signature = simhash(document.content)
+    return TransformOutput(document=document, links=links, chunks=chunks, simhash=signature)
+
+
+def _transform_in_worker_process(crawl_result: CrawlResult) -> TransformOutput:
+    """
+    ワーカープロセスで変換し、計測したメトリクスを結果に添えて返します。
+    """
+    output = _transform_in_worker(crawl_result)
+    output.metrics = REGISTRY.drain()
+    return output
+
+
+class TransformStage:
+    """
+    HTMLのデコード・パース・テキスト整形（と、chunker を指定した場合はパッセージへの分割、
+    compute_simhash を指定した場合は近似重複の検出に使うSimHash署名の計算）を ProcessPoolExecutor で実行するステージ。
+    GILの影響を受けずにCPUコア数に応じてスケールします。
+    同時に投入できる変換タスク数を制限し、ワーカーへの投入が処理能力を超えないようにします（バックプレッシャー）。
+    """
+    def __init__(self, parser_backend: str, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 chunker: Optional[Chunker] = None, compute_simhash: bool = False):
+        self.parser_backend = parser_backend
+        self.chunker = chunker
+        self.compute_simhash = compute_simhash
+        self.workers = (os.cpu_count() or 1) if workers is None else max(0, workers)
+        self.max_pending = max_pending or max(1, self.workers * 2)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        if self.workers > 0:
+            # クローラースレッドからのforkを避けるため spawn でワーカーを起動する
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(parser_backend, chunker, compute_simhash)
+            )
+            logger.info(f"Transform stage started with {self.workers} worker process(es).")
+        else:
+            _init_worker(parser_backend, chunker, compute_simhash)
+            logger.info("Transform stage runs inline in the crawler thread.")
+
+    async def transform(self, crawl_result: CrawlResult) -> TransformOutput:
+        """
+        クロール結果を変換します。投入中のタスクが max_pending に達している場合は空きが出るまで待機します。
+        """
+        if self._executor is None:
+            return _transform_in_worker(crawl_result)
+
+        if self._slots is None:
+            # セマフォは実行中のイベントループ上で生成する
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(self._executor, _transform_in_worker_process, crawl_result)
+        if output.metrics:
+            REGISTRY.merge(output.metrics)
+            output.metrics = None
+        return output
+
+    def close(self):
+        """
+        ワーカープロセスを終了します。
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -1,15 +1,21 @@
-from bs4 import BeautifulSoup
+import hashlib
 from typing import Any, Optional
-import re
 from datetime import datetime, timezone # トップレベルでインポート
 
 from crawl_result_queue import CrawlResult
 from document_entity import Document
+from metrics import REGISTRY
+from page_parser import PageParser, ParsedPage
+
+# メトリクス
+TRANSFORM_SECONDS = REGISTRY.histogram("crawler_transform_seconds", "CPU time spent transforming pages, by step", ["step"])
 
 class ContentTransformer:
     """
     クロールしたコンテンツをElasticsearchに保存するために整形するクラス。
     """
+    def __init__(self, page_parser: Optional[PageParser] = None):
+        self.page_parser = page_parser or PageParser()
 
     def transform_crawl_result_to_document(self, crawl_result: CrawlResult) -> Document:
         """
@@ -21,24 +27,24 @@ class ContentTransformer:
         mime_type = crawl_result.mime_type
         timestamp = self._get_current_timestamp()
 
-        if mime_type and 'text/html' in mime_type and crawl_result.content:
-            return self._transform_html_content(url, mime_type, timestamp, crawl_result.content)
+        if mime_type and 'text/html' in mime_type and (crawl_result.parsed or crawl_result.content_bytes):
+            # 変換ステージでパース済みであれば、その結果を再利用する
+            parsed = crawl_result.parsed
+            if parsed is None:
+                with TRANSFORM_SECONDS.time(step="parse"):
+                    parsed = self.page_parser.parse(url, crawl_result.get_text_content())
+            with TRANSFORM_SECONDS.time(step="document"):
+                return self._transform_html_content(url, mime_type, timestamp, parsed)
         else:
-            return self._transform_binary_content(url, mime_type, timestamp, crawl_result.content_bytes)
+            with TRANSFORM_SECONDS.time(step="document"):
+                return self._transform_binary_content(url, mime_type, timestamp, crawl_result)
 
-    def _transform_html_content(self, url: str, mime_type: str, timestamp: str, html_content: str) -> Document:
+    def _transform_html_content(self, url: str, mime_type: str, timestamp: str, parsed: ParsedPage) -> Document:
         """
-        HTMLコンテンツをElasticsearchドキュメント形式に変換します。
+        パース済みのHTMLコンテンツをElasticsearchドキュメント形式に変換します。
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        title = soup.title.string if soup.title else "No Title"
-
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.extract()
-
-        text_content = soup.get_text(separator="\n", strip=True)
-        text_content = re.sub(r'\n\s*\n', '\n', text_content)
+        title = parsed.title if parsed.title else "No Title"
+        text_content = parsed.text
 
         return Document(
             url=url,
@@ -46,25 +52,44 @@ class ContentTransformer:
             content=text_content,
             content_length=len(text_content),
             mime_type=mime_type,
-            timestamp=timestamp
+            timestamp=timestamp,
+            content_hash=self._compute_content_hash(f"{title}\n{text_content}".encode('utf-8'))
         )
 
-    def _transform_binary_content(self, url: str, mime_type: str, timestamp: str, content_bytes: Optional[bytes]) -> Document:
+    def _transform_binary_content(self, url: str, mime_type: str, timestamp: str, crawl_result: CrawlResult) -> Document:
         """
         HTML以外のバイナリコンテンツをElasticsearchドキュメント形式に変換します。
+        本文を読み込まずにサイズとハッシュ値だけを取得した場合は、その値を使用します。
+        PDFやOffice文書からテキストを抽出済みの場合は、そのテキストを本文として保存します。
         """
-        title = f"Binary Content: {url}"
-        content_length = len(content_bytes) if content_bytes else 0
-        
+        title = crawl_result.extracted_title or f"Binary Content: {url}"
+        content_bytes = crawl_result.content_bytes
+        if content_bytes:
+            content_length = len(content_bytes)
+            content_hash = self._compute_content_hash(content_bytes)
+        else:
+            content_length = crawl_result.content_length or 0
+            content_hash = crawl_result.content_hash
+        content = crawl_result.extracted_text or None
+        if content is not None:
+            content_length = len(content)
+
         return Document(
             url=url,
             title=title,
-            content=None, # バイナリコンテンツはテキストとして保存しない
+            content=content, # テキストを抽出できないバイナリコンテンツは本文を保存しない
             content_length=content_length,
             mime_type=mime_type,
-            timestamp=timestamp
+            timestamp=timestamp,
+            content_hash=content_hash
         )
 
+    def _compute_content_hash(self, data: bytes) -> str:
+        """
+        コンテンツのSHA-256ハッシュ値を返します。
+        """
+        return hashlib.sha256(data).hexdigest()
+
     def _get_current_timestamp(self) -> str:
         """
         現在のUTCタイムスタンプをISO 8601形式で取得します。
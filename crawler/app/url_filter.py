@@ -0,0 +1,176 @@
+import functools
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Pattern
+from urllib.parse import urlparse
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 拒否理由
+REJECTED_BY_DOMAIN = "domain"
+REJECTED_BY_TARGET_PATTERN = "target_pattern"
+REJECTED_BY_EXCLUDE_PATTERN = "exclude_pattern"
+
+
+class _PatternSet:
+    """
+    複数の正規表現を1つの正規表現にまとめてマッチさせるクラス。
+    各パターンを名前付きグループで囲み、マッチしたグループ名からどのパターンに合致したかを判定します。
+    まとめられないパターン（後方参照、位置に依存するインラインフラグなど）が含まれる場合は、個別にマッチします。
+    """
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = list(patterns)
+        self._combined: Optional[Pattern] = None
+        self._compiled: List[Pattern] = []
+
+        if not self.patterns:
+            return
+        if not any(_has_backreference(p) for p in self.patterns):
+            try:
+                self._combined = re.compile("|".join(f"(?P<_p{i}>{p})" for i, p in enumerate(self.patterns)))
+                return
+            except re.error as e:
+                logger.debug(f"Could not combine URL patterns into one regex ({e}). Matching them one by one.")
+        self._compiled = [re.compile(p) for p in self.patterns]
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def match(self, url: str) -> Optional[str]:
+        """
+        re.match と同じ意味（先頭一致）でマッチさせ、合致したパターン文字列を返します。
+        """
+        if self._combined is not None:
+            m = self._combined.match(url)
+            if m is None:
+                return None
+            return self.patterns[int(m.lastgroup[2:])]
+        for pattern, compiled in zip(self.patterns, self._compiled):
+            if compiled.match(url):
+                return pattern
+        return None
+
+
+def _has_backreference(pattern: str) -> bool:
+    """
+    番号付き後方参照を含むかを返します。結合するとグループ番号がずれるため、個別にマッチさせる必要があります。
+    """
+    return re.search(r'\\[1-9]', pattern) is not None
+
+
+class _DomainSet:
+    """
+    許可ドメインをハッシュセットで保持するクラス。
+    `*.example.com` または `.example.com` の形式で指定されたドメインはサブドメインも許可します。
+    （`*.example.com` は example.com 自体も許可します）
+    """
+    def __init__(self, domains: Iterable[str]):
+        self.exact = set()
+        self.suffixes = set()
+        for domain in domains:
+            domain = domain.strip().lower()
+            if domain.startswith("*."):
+                self.suffixes.add(domain[2:])
+            elif domain.startswith("."):
+                self.suffixes.add(domain[1:])
+            elif domain:
+                self.exact.add(domain)
+
+    def __bool__(self) -> bool:
+        return bool(self.exact or self.suffixes)
+
+    def contains(self, netloc: str, hostname: Optional[str]) -> bool:
+        """
+        ドメインが許可されているかを返します。完全一致はポートを含むnetlocで判定します。
+        """
+        netloc = netloc.lower()
+        if netloc in self.exact:
+            return True
+        if not self.suffixes or not hostname:
+            return False
+        labels = hostname.split(".")
+        return any(".".join(labels[i:]) in self.suffixes for i in range(len(labels)))
+
+
+class UrlFilter:
+    """
+    クロール対象URLかを判定するフィルタ。CrawlerConfig から一度だけ構築します。
+    対象パターン・除外パターンはそれぞれ1つの正規表現にまとめ、許可ドメインはハッシュセットで判定します。
+    直近の判定結果はLRUキャッシュに保持し、どのルールで拒否されたかを集計します。
+    """
+    def __init__(self, allowed_domains: Iterable[str] = (), target_url_patterns: Iterable[str] = (),
+                 exclude_url_patterns: Iterable[str] = (), cache_size: int = 4096):
+        self._domains = _DomainSet(allowed_domains)
+        self._targets = _PatternSet(target_url_patterns)
+        self._excludes = _PatternSet(exclude_url_patterns)
+        self._verdict = functools.lru_cache(maxsize=cache_size)(self._evaluate)
+        self._accepted_count = 0
+        self._rejections: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "UrlFilter":
+        """
+        CrawlerConfig からフィルタを構築します。
+        """
+        return cls(
+            allowed_domains=config.allowed_domains,
+            target_url_patterns=config.target_url_patterns,
+            exclude_url_patterns=config.exclude_url_patterns,
+            cache_size=config.url_filter_cache_size
+        )
+
+    def is_allowed(self, url: str) -> bool:
+        """
+        URLがクロール対象のドメインとパターンに合致し、除外パターンに合致しないかを返します。
+        """
+        reason = self._verdict(url)
+        with self._stats_lock:
+            if reason is None:
+                self._accepted_count += 1
+            else:
+                self._rejections[reason] += 1
+        return reason is None
+
+    def rejection_reason(self, url: str) -> Optional[str]:
+        """
+        URLを拒否したルールを返します。許可される場合はNoneを返します。集計には含めません。
+        """
+        return self._verdict(url)
+
+    def get_stats(self) -> Dict[str, object]:
+        """
+        判定件数、ルールごとの拒否件数、キャッシュのヒット率を返します。
+        """
+        cache_info = self._verdict.cache_info()
+        with self._stats_lock:
+            return {
+                "accepted": self._accepted_count,
+                "rejected": dict(self._rejections),
+                "cache_hits": cache_info.hits,
+                "cache_misses": cache_info.misses,
+            }
+
+    def _evaluate(self, url: str) -> Optional[str]:
+        """
+        URLを判定し、拒否理由を返します。
+        拒否理由は "domain", "target_pattern", "exclude_pattern:<パターン>" のいずれかです。
+        """
+        if self._domains:
+            parsed_url = urlparse(url)
+            if not self._domains.contains(parsed_url.netloc, parsed_url.hostname):
+                return REJECTED_BY_DOMAIN
+
+        if self._targets and self._targets.match(url) is None:
+            return REJECTED_BY_TARGET_PATTERN
+
+        if self._excludes:
+            matched = self._excludes.match(url)
+            if matched is not None:
+                return f"{REJECTED_BY_EXCLUDE_PATTERN}:{matched}"
+
+        return None
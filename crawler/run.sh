@@ -1,7 +1,8 @@
 #!/bin/sh
 
 # 環境変数が設定されていなければデフォルト値を使用
-CRAWLER_CONFIG_PATH="/app/crawler_config/crawler_config.yaml"
+# CRAWLER_CONFIG_PATH にはディレクトリも指定でき、その場合は中の設定ファイルをすべて同時にクロールする
+CRAWLER_CONFIG_PATH=${CRAWLER_CONFIG_PATH:-/app/crawler_config/crawler_config.yaml}
 ES_HOST=${ES_HOST:-elasticsearch}
 ES_PORT=${ES_PORT:-9200}
 # main.py に引数を渡して実行
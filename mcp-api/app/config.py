@@ -1,6 +1,8 @@
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from .elasticsearch_client import ElasticsearchClient
+from .search_cache import SearchCache, create_search_cache
 
 load_dotenv()
 
@@ -10,7 +12,33 @@ class AppConfig:
     環境変数から設定値を読み込み、Elasticsearchクライアントを初期化します。
     """
     ELASTICSEARCH_URL: str = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
-    ELASTICSEARCH_CLIENT: ElasticsearchClient = ElasticsearchClient(host=ELASTICSEARCH_URL)
+    # Elasticsearchへの接続・応答の読み取りのタイムアウト（秒）と、接続プールの大きさ
+    ELASTICSEARCH_CONNECT_TIMEOUT: float = float(os.getenv("ELASTICSEARCH_CONNECT_TIMEOUT", "2.0"))
+    ELASTICSEARCH_READ_TIMEOUT: float = float(os.getenv("ELASTICSEARCH_READ_TIMEOUT", "10.0"))
+    ELASTICSEARCH_MAX_CONNECTIONS: int = int(os.getenv("ELASTICSEARCH_MAX_CONNECTIONS", "20"))
+    ELASTICSEARCH_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("ELASTICSEARCH_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    ELASTICSEARCH_CLIENT: ElasticsearchClient = ElasticsearchClient(
+        host=ELASTICSEARCH_URL,
+        connect_timeout=ELASTICSEARCH_CONNECT_TIMEOUT,
+        read_timeout=ELASTICSEARCH_READ_TIMEOUT,
+        max_connections=ELASTICSEARCH_MAX_CONNECTIONS,
+        max_keepalive_connections=ELASTICSEARCH_MAX_KEEPALIVE_CONNECTIONS
+    )
+    # 検索結果のキャッシュ。SEARCH_CACHE_TTL が0の場合は使わない。
+    # SEARCH_CACHE_REDIS_URL を指定すると、複数のワーカーでRedisを介して検索結果を共有する（redis パッケージが必要）
+    SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "10000"))
+    SEARCH_CACHE_MAX_BYTES: int = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    SEARCH_CACHE_TOKEN_TTL: float = float(os.getenv("SEARCH_CACHE_TOKEN_TTL", "1.0"))
+    SEARCH_CACHE: Optional[SearchCache] = create_search_cache(
+        ttl=SEARCH_CACHE_TTL,
+        max_entries=SEARCH_CACHE_MAX_ENTRIES,
+        max_bytes=SEARCH_CACHE_MAX_BYTES,
+        token_ttl=SEARCH_CACHE_TOKEN_TTL,
+        redis_url=os.getenv("SEARCH_CACHE_REDIS_URL")
+    )
+    # チャンクインデックス名の接尾辞。クローラーはドキュメントのパッセージを <インデックス名><接尾辞> に保存する
+    CHUNK_INDEX_SUFFIX: str = os.getenv("CHUNK_INDEX_SUFFIX", "-chunks")
     # 新しい設定項目
     MCP_TRANSPORT_TYPE: str = os.getenv("MCP_TRANSPORT_TYPE", "streamable-http").lower() # デフォルトはstreamable-http
 
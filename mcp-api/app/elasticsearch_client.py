@@ -1,27 +1,47 @@
+import json
 import os
-import requests
+from typing import Any, Optional
+
+import httpx
 
 # Elasticsearchでドキュメントが見つからなかった場合に投げられる例外クラス
 class NotFoundError(Exception):
     """Elasticsearchにドキュメントが存在しないときに発生する例外"""
     pass
 
+# Elasticsearchへのリクエストがタイムアウトした場合に投げられる例外クラス
+class ElasticsearchTimeoutError(Exception):
+    """Elasticsearchへの接続または応答の待機が、設定した時間を超えたときに発生する例外"""
+    pass
+
 # Elasticsearchへの簡易クライアント
 class ElasticsearchClient:
     """
-    Elasticsearchの簡易HTTPクライアント。
-    環境変数またはコンストラクタ引数からホストを読み取り、
-    HTTPリクエストで検索・取得を行います。
+    Elasticsearchの非同期HTTPクライアント。
+    環境変数またはコンストラクタ引数からホストを読み取り、HTTPリクエストで検索・取得を行います。
+    接続はプール（最大 max_connections 本）で再利用し、すべてのリクエストに接続・読み取りのタイムアウトを設定します。
+    各メソッドはコルーチンのため、Elasticsearchの応答を待つ間もイベントループは他のセッションのリクエストを処理できます。
     """
 
-    def __init__(self, host: str):
+    def __init__(self, host: str, connect_timeout: float = 2.0, read_timeout: float = 10.0,
+                 max_connections: int = 20, max_keepalive_connections: int = 10):
         """
         クライアントを初期化します。
         :param host: ElasticsearchのホストURLまたはホスト名（例: http://localhost:9200）
+        :param connect_timeout: 接続（プールの空きを待つ時間を含む）のタイムアウト（秒）
+        :param read_timeout: 応答の読み取り・リクエストの送信のタイムアウト（秒）
+        :param max_connections: 同時に使用する接続の最大数
+        :param max_keepalive_connections: 再利用のために保持するアイドル接続の最大数
         """
         self.host = host
         self.base_url = self._normalize_host_url(self.host)
-        self.session = requests.Session()
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout)
+        self.session = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max(1, max_connections),
+                                max_keepalive_connections=max(0, max_keepalive_connections))
+        )
 
     def _normalize_host_url(self, host: str) -> str:
         """
@@ -31,22 +51,38 @@ class ElasticsearchClient:
             return f"http://{host}"
         return host
 
-    def search(self, body: dict, index: str):
+    async def _request(self, method: str, path: str, json: Any = None, params: Optional[dict] = None,
+                       read_timeout: Optional[float] = None) -> httpx.Response:
+        """
+        Elasticsearchにリクエストを送信します。read_timeout を指定した場合は、そのリクエストだけ読み取りのタイムアウトを変更します。
+        :raises ElasticsearchTimeoutError: 接続または応答の待機がタイムアウトした場合
+        """
+        timeout = self.timeout if read_timeout is None else httpx.Timeout(
+            read_timeout, connect=self.timeout.connect, pool=self.timeout.pool)
+        try:
+            return await self.session.request(method, path, json=json, params=params, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise ElasticsearchTimeoutError(f"Elasticsearch request {method} {path} timed out: {type(e).__name__}")
+
+    async def search(self, body: dict, index: str, read_timeout: Optional[float] = None):
         """
         Elasticsearchに対して検索を実行します。
         :param body: ElasticsearchのクエリDSLを表す辞書
         :param index: 検索対象のインデックス名
+        :param read_timeout: この検索の読み取りのタイムアウト（秒）。省略時はクライアントの設定を使います
         :return: idとtitleを含む辞書のリスト
         """
-        url = f"{self.base_url}/{index}/_search"
-        response = self.session.get(url, json=body)
+        response = await self._request("POST", f"/{index}/_search", json=body, read_timeout=read_timeout)
+        # インデックスが存在しない場合は未検出として例外を発生
+        if response.status_code == 404:
+            raise NotFoundError(f"Index '{index}' not found")
         # HTTPエラーがあれば例外を投げる
         response.raise_for_status()
         data = response.json()
         # 検索結果から完全なElasticsearchレスポンスを返す
         return data
 
-    def get(self, doc_id: str, index: str):
+    async def get(self, doc_id: str, index: str):
         """
         ドキュメントIDを指定して全文を取得します。
         :param doc_id: 取得するドキュメントのID
@@ -54,8 +90,7 @@ class ElasticsearchClient:
         :return: id, title, contentを含む辞書
         :raises NotFoundError: ドキュメントが存在しない場合
         """
-        url = f"{self.base_url}/{index}/_doc/{doc_id}"
-        response = self.session.get(url)
+        response = await self._request("GET", f"/{index}/_doc/{doc_id}")
         # ステータスコード404ならドキュメント未検出として例外を発生
         if response.status_code == 404:
             raise NotFoundError(f"Document with ID {doc_id} not found")
@@ -69,26 +104,59 @@ class ElasticsearchClient:
             "content": source.get("content")
         }
 
-    def list_indices(self):
+    async def list_indices_with_meta(self, pattern: str = "*,-.*") -> dict:
         """
-        Elasticsearchの全インデックスのリストを取得します。
-        :return: インデックス情報のリスト（例: [{"index": "my_index", ...}]）
+        パターンに一致するインデックスのエイリアスとマッピングの _meta を、1回のリクエストでまとめて取得します。
+        既定のパターンは、"." で始まるシステムインデックスをElasticsearch側で除外します。
+        :param pattern: インデックス名のパターン（カンマ区切り、"-" で除外）
+        :return: インデックス名ごとの辞書（例: {"my_index": {"aliases": {...}, "mappings": {"_meta": {...}}}}）
         """
-        url = f"{self.base_url}/_cat/indices?format=json"
-        response = self.session.get(url)
+        # _meta もエイリアスも無いインデックスが応答から消えないよう、必ず存在する uuid も含める
+        response = await self._request("GET", f"/{pattern}", params={
+            "filter_path": "*.aliases,*.mappings._meta,*.settings.index.uuid",
+            "expand_wildcards": "open"
+        })
         response.raise_for_status()
         return response.json()
 
-    def get_index_mapping(self, index_name: str) -> dict:
+    async def get_index_mapping(self, index_name: str) -> dict:
         """
         指定されたインデックスのマッピングを取得します。
         :param index_name: マッピングを取得するインデックス名
         :return: インデックスのマッピングを表す辞書
         :raises NotFoundError: インデックスが存在しない場合
         """
-        url = f"{self.base_url}/{index_name}/_mapping"
-        response = self.session.get(url)
+        response = await self._request("GET", f"/{index_name}/_mapping")
         if response.status_code == 404:
             raise NotFoundError(f"Index '{index_name}' not found")
         response.raise_for_status()
         return response.json()
+
+    async def get_index_change_token(self, index: str) -> str:
+        """
+        インデックスの内容が変わると値が変わる文字列（変更トークン）を返します。
+        エイリアスやワイルドカードが指すインデックスごとの、ドキュメントの追加・削除数とリフレッシュ回数から作ります。
+        エイリアスの指すインデックスが切り替わった場合もインデックス名が変わるため値が変わります。
+        :param index: インデックス名、エイリアス名またはワイルドカード
+        :raises NotFoundError: インデックスが存在しない場合
+        """
+        response = await self._request("GET", f"/{index}/_stats/indexing,refresh", params={
+            "filter_path": "indices.*.total.indexing.index_total,indices.*.total.indexing.delete_total,"
+                           "indices.*.total.refresh.total"
+        })
+        if response.status_code == 404:
+            raise NotFoundError(f"Index '{index}' not found")
+        response.raise_for_status()
+        token = []
+        for name, stats in sorted(response.json().get("indices", {}).items()):
+            total = stats.get("total", {})
+            indexing = total.get("indexing", {})
+            token.append([name, indexing.get("index_total"), indexing.get("delete_total"),
+                          total.get("refresh", {}).get("total")])
+        return json.dumps(token)
+
+    async def close(self):
+        """
+        プールしている接続を閉じます。アプリケーションの終了時に呼び出します。
+        """
+        await self.session.aclose()
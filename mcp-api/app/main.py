@@ -1,11 +1,14 @@
 import logging
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import contextlib
 from collections.abc import AsyncIterator
 
 from .config import config
 from .mcp_handler import mcp # 新しく作成したmcp_handlerをインポート
+from .tools import warm_index_list_cache
 
 # ログ設定
 logging.basicConfig(
@@ -20,11 +23,18 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     """Manage application lifecycle for MCP server."""
     logger.info("MCP API server starting up")
     logger.info(f"Version: {app.version}")
+    # インデックスのリストを先に取得しておき、セッション開始時の list_elasticsearch_indices をすぐに返せるようにする
+    warm_task = asyncio.create_task(warm_index_list_cache(config.ELASTICSEARCH_CLIENT))
             
     # FastMCPのセッションマネージャーの起動は、app.mount()でFastMCPのASGIアプリがマウントされる際に
     # 内部で処理されるため、ここでは不要。
     yield
     logger.info("MCP API server shutting down")
+    warm_task.cancel()
+    # Elasticsearchクライアントの接続プールと、検索結果のキャッシュの共有の保存先への接続を閉じる
+    await config.ELASTICSEARCH_CLIENT.close()
+    if config.SEARCH_CACHE is not None:
+        await config.SEARCH_CACHE.close()
 
 
 app = FastAPI(
@@ -44,6 +54,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    検索結果のキャッシュのヒット・ミスなどのメトリクスをPrometheusのテキスト形式で返します。
+    MCPのアプリケーションは "/" にマウントされ、それ以降に登録したパスには到達しないため、マウントより前に登録します。
+    """
+    if config.SEARCH_CACHE is None:
+        return ""
+    return config.SEARCH_CACHE.render_prometheus()
+
 # トランスポートタイプに基づいてエンドポイントをマウント
 if config.MCP_TRANSPORT_TYPE == "sse":
     logger.info("Using SSE transport")
@@ -8,10 +8,12 @@ from .config import config
 from .elasticsearch_client import ElasticsearchClient, NotFoundError
 from .tools import ( # tools.py からツール関数とPydanticモデルをインポート
     search_tool,
+    search_passages_tool,
     get_document_by_id_tool,
     list_elasticsearch_indices_tool,
     SearchResultItem,
     SearchResults,
+    PassageResults,
     DocumentContent,
     IndexInfo,
     IndexListResult,
@@ -23,14 +25,14 @@ logger = logging.getLogger(__name__)
 mcp = FastMCP(
     name="RAG MCP Server",
     version="0.1.0", # 仮のバージョン。configから取得することも可能
-    instructions="This server provides tools for searching documents and getting document content by ID. Use the 'search' tool to find documents by keyword. Use the 'get_document_by_id' tool to retrieve the full content of a document."
+    instructions="This server provides tools for searching documents and getting document content by ID. Use the 'search' tool to find documents by keyword. Use the 'search_passages' tool to get the most relevant passages directly, which is much smaller than full documents. Use the 'get_document_by_id' tool to retrieve the full content of a document."
 )
 
 # ツール定義
 @mcp.tool(
     description="Search documents by keyword in title or content."
 )
-def search(
+async def search(
     query: Annotated[str, Field(description="Keyword to search for")],
     index: Annotated[str, Field(description="Index to search in")],
     cursor: Annotated[Optional[str], Field(description="Opaque cursor for pagination, obtained from a previous search result.", nullable=True)] = None
@@ -41,12 +43,29 @@ def search(
     指定されたindexを検索します。
     """
     # tools.py の search_tool を呼び出す
-    return search_tool(config.ELASTICSEARCH_CLIENT, query=query, index=index, cursor=cursor)
+    return await search_tool(config.ELASTICSEARCH_CLIENT, query=query, index=index, cursor=cursor,
+                             cache=config.SEARCH_CACHE)
+
+@mcp.tool(
+    description="Search passages (chunks of documents) by keyword and return the top passages with their content, "
+                "heading path and byte offsets in the document."
+)
+async def search_passages(
+    query: Annotated[str, Field(description="Keyword to search for")],
+    index: Annotated[str, Field(description="Index of the documents to search in")],
+    size: Annotated[int, Field(description="Number of passages to return (1-20)")] = 5
+) -> PassageResults:
+    """
+    ドキュメントを分割したパッセージを検索し、関連度の高いパッセージの本文を返します。
+    """
+    # tools.py の search_passages_tool を呼び出す
+    return await search_passages_tool(config.ELASTICSEARCH_CLIENT, query=query, index=index, size=size,
+                                      chunk_index_suffix=config.CHUNK_INDEX_SUFFIX)
 
 @mcp.tool(
     description="Get document content by document ID."
 )
-def get_document_by_id(
+async def get_document_by_id(
     document_id: Annotated[str, Field(description="ID of the document to retrieve")],
     index: Annotated[str, Field(description="Index where the document is located")]
 ) -> DocumentContent:
@@ -54,14 +73,14 @@ def get_document_by_id(
     ドキュメントIDを指定して全文を取得します。
     """
     # tools.py の get_document_by_id_tool を呼び出す
-    return get_document_by_id_tool(config.ELASTICSEARCH_CLIENT, document_id=document_id, index=index)
+    return await get_document_by_id_tool(config.ELASTICSEARCH_CLIENT, document_id=document_id, index=index)
 
 @mcp.tool(
     description="List all available Elasticsearch indices with their descriptions."
 )
-def list_elasticsearch_indices() -> IndexListResult:
+async def list_elasticsearch_indices() -> IndexListResult:
     """
     Elasticsearchの全インデックスのリストと説明を返します。
     """
     # tools.py の list_elasticsearch_indices_tool を呼び出す
-    return list_elasticsearch_indices_tool(config.ELASTICSEARCH_CLIENT)
+    return await list_elasticsearch_indices_tool(config.ELASTICSEARCH_CLIENT)
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .elasticsearch_client import ElasticsearchClient
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # redis は任意の依存関係
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    キャッシュのキーと検索に使うクエリを正規化します（前後の空白を除き、連続する空白を1つにまとめます）。
+    """
+    return " ".join(query.split())
+
+
+class RedisCacheBackend:
+    """
+    複数のuvicornワーカーで検索結果を共有するための、Redisを使用したキャッシュの保存先。
+    Redisに接続できない場合はキャッシュが無いものとして扱い、検索は継続します。
+    """
+    def __init__(self, url: str, prefix: str = "mcp-search:"):
+        if redis_asyncio is None:
+            raise RuntimeError("The redis package is required for the shared search cache.")
+        self.prefix = prefix
+        self._client = redis_asyncio.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self._client.get(self.prefix + key)
+        except Exception as e:
+            # 接続先の情報（パスワードを含む場合がある）はログに出さない
+            logger.warning(f"Could not read the shared search cache: {type(e).__name__}")
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, ttl: float):
+        try:
+            await self._client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            logger.warning(f"Could not write the shared search cache: {type(e).__name__}")
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class SearchCache:
+    """
+    検索結果のキャッシュ。イベントループのスレッドからのみ使用します。プロセス内のLRUキャッシュ（件数と合計バイト数の上限を超えると古いものから破棄）に、
+    ttl 秒の有効期限付きで検索結果（JSON文字列）を保存します。shared を指定した場合は、プロセス内に無い結果を共有の保存先から探します。
+
+    キーには (インデックス, 正規化したクエリ, 開始位置, 件数) に加えて、インデックスの変更トークンを含めます。
+    変更トークンはインデックスの統計情報（ドキュメントの追加・削除数とリフレッシュ回数、エイリアスの指すインデックス名）から作り、
+    ドキュメントの更新やエイリアスの切り替えがあるとキーが変わるため、古い結果は使われずに期限切れやLRUで破棄されます。
+    変更トークンはインデックスごとに token_ttl 秒キャッシュするため、更新が検索結果に反映されるまで最大 token_ttl 秒かかります。
+    """
+    def __init__(self, ttl: float = 300.0, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 token_ttl: float = 1.0, shared: Optional[RedisCacheBackend] = None):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.token_ttl = token_ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict() # キー -> (有効期限, 検索結果, サイズ)
+        self._bytes = 0
+        self._tokens: Dict[str, Tuple[float, str]] = {} # インデックス -> (有効期限, 変更トークン)
+        self._token_requests: Dict[str, "asyncio.Future[str]"] = {}
+        self._counters: Dict[str, int] = {
+            "hits_local": 0, "hits_shared": 0, "misses": 0, "bypassed": 0, "evictions": 0, "expired": 0
+        }
+
+    async def make_key(self, es_client: ElasticsearchClient, index: str, query: str, from_: int, size: int) -> Optional[str]:
+        """
+        検索のキャッシュキーを返します。インデックスの変更トークンを取得できない場合はNoneを返します（キャッシュを使わずに検索します）。
+        """
+        try:
+            token = await self._get_change_token(es_client, index)
+        except Exception as e:
+            logger.debug(f"Search cache bypassed for index {index}: {e}")
+            self._counters["bypassed"] += 1
+            return None
+        raw = json.dumps([index, token, query, from_, size], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        キャッシュされた検索結果を返します。無い場合はNoneを返します。
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self._counters["hits_local"] += 1
+                return entry[1]
+            self._remove(key)
+            self._counters["expired"] += 1
+        if self.shared is not None:
+            value = await self.shared.get(key)
+            if value is not None:
+                self._counters["hits_shared"] += 1
+                self._store(key, value, now)
+                return value
+        self._counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        """
+        検索結果をキャッシュに保存します。
+        """
+        self._store(key, value, time.monotonic())
+        if self.shared is not None:
+            await self.shared.set(key, value, self.ttl)
+
+    def _store(self, key: str, value: str, now: float):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (now + self.ttl, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counters["evictions"] += 1
+
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key)[2]
+
+    async def _get_change_token(self, es_client: ElasticsearchClient, index: str) -> str:
+        """
+        インデックスの変更トークンを返します。同じインデックスへの同時の問い合わせは1回にまとめます。
+        """
+        now = time.monotonic()
+        cached = self._tokens.get(index)
+        if cached and cached[0] > now:
+            return cached[1]
+        request = self._token_requests.get(index)
+        if request is None:
+            request = asyncio.ensure_future(es_client.get_index_change_token(index))
+            self._token_requests[index] = request
+            try:
+                token = await asyncio.shield(request)
+            finally:
+                self._token_requests.pop(index, None)
+            self._tokens[index] = (time.monotonic() + self.token_ttl, token)
+            return token
+        return await asyncio.shield(request)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        ヒット・ミスなどの回数と、現在の件数・バイト数を返します。
+        """
+        return dict(self._counters, entries=len(self._entries), bytes=self._bytes)
+
+    def render_prometheus(self) -> str:
+        """
+        キャッシュのメトリクスをPrometheusのテキスト形式で返します。
+        """
+        stats = self.stats()
+        lines = [
+            "# HELP mcp_search_cache_requests_total Search cache lookups by result",
+            "# TYPE mcp_search_cache_requests_total counter",
+            f'mcp_search_cache_requests_total{{result="hit",tier="local"}} {stats["hits_local"]}',
+            f'mcp_search_cache_requests_total{{result="hit",tier="shared"}} {stats["hits_shared"]}',
+            f'mcp_search_cache_requests_total{{result="miss",tier=""}} {stats["misses"]}',
+            f'mcp_search_cache_requests_total{{result="bypassed",tier=""}} {stats["bypassed"]}',
+            "# HELP mcp_search_cache_removals_total Search cache entries removed by reason",
+            "# TYPE mcp_search_cache_removals_total counter",
+            f'mcp_search_cache_removals_total{{reason="evicted"}} {stats["evictions"]}',
+            f'mcp_search_cache_removals_total{{reason="expired"}} {stats["expired"]}',
+            "# HELP mcp_search_cache_entries Search results held in the in-process cache",
+            "# TYPE mcp_search_cache_entries gauge",
+            f"mcp_search_cache_entries {stats['entries']}",
+            "# HELP mcp_search_cache_bytes Total size of the search results held in the in-process cache",
+            "# TYPE mcp_search_cache_bytes gauge",
+            f"mcp_search_cache_bytes {stats['bytes']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+
+def create_search_cache(ttl: float, max_entries: int, max_bytes: int, token_ttl: float,
+                        redis_url: Optional[str] = None) -> Optional[SearchCache]:
+    """
+    設定に応じて検索結果のキャッシュを生成します。ttl が0以下の場合はキャッシュを使わずNoneを返します。
+    redis_url を指定した場合はRedisを共有の保存先に使います（redis パッケージが無い場合は警告してプロセス内のみで使います）。
+    """
+    if ttl <= 0:
+        return None
+    shared = None
+    if redis_url:
+        if redis_asyncio is None:
+            logger.warning("SEARCH_CACHE_REDIS_URL is set but the redis package is not installed. Using the in-process search cache only.")
+        else:
+            shared = RedisCacheBackend(redis_url)
+    return SearchCache(ttl=ttl, max_entries=max_entries, max_bytes=max_bytes, token_ttl=token_ttl, shared=shared)
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app import tools
+
+
+class FakeIndexClient:
+    """
+    list_indices_with_meta だけを持つ ElasticsearchClient の代替。
+    """
+    def __init__(self, indices):
+        self.indices = indices
+        self.calls = 0
+        self.fail = False
+
+    async def list_indices_with_meta(self, pattern: str = "*,-.*") -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("cluster unavailable")
+        return self.indices
+
+
+INDICES = {
+    "docs-v2": {"aliases": {"docs": {}}, "mappings": {"_meta": {"description": " Product docs ", "alias": "docs"}}},
+    "docs-v1": {"mappings": {"_meta": {"description": "old", "alias": "docs"}}},
+    "plain": {"settings": {"index": {"uuid": "x"}}},
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_cache(monkeypatch):
+    monkeypatch.setattr(tools, "_index_list_cache", tools._IndexListCache())
+
+
+def test_fetch_index_list_uses_aliases_and_meta():
+    result = asyncio.run(tools.fetch_index_list(FakeIndexClient(INDICES)))
+    assert [(info.name, info.description) for info in result.indices] == [
+        ("docs", "Product docs"),
+        ("plain", "'plain' に関連するドキュメントのインデックス"),
+    ]
+
+
+def test_concurrent_first_calls_share_one_request():
+    client = FakeIndexClient(INDICES)
+
+    async def run():
+        return await asyncio.gather(*[tools.list_elasticsearch_indices_tool(client) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert client.calls == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_stale_list_is_returned_while_refreshing(monkeypatch):
+    monkeypatch.setattr(tools, "INDEX_LIST_CACHE_TTL", 0.05)
+    client = FakeIndexClient(dict(INDICES))
+
+    async def run():
+        first = await tools.list_elasticsearch_indices_tool(client)
+        await asyncio.sleep(0.06)
+        client.indices = {"new": {}}
+        stale = await tools.list_elasticsearch_indices_tool(client)
+        await asyncio.sleep(0.05)
+        fresh = await tools.list_elasticsearch_indices_tool(client)
+        return first, stale, fresh
+
+    first, stale, fresh = asyncio.run(run())
+    assert stale == first
+    assert [info.name for info in fresh.indices] == ["new"]
+    assert client.calls == 2
+
+
+def test_failed_refresh_keeps_previous_list(monkeypatch):
+    monkeypatch.setattr(tools, "INDEX_LIST_CACHE_TTL", 0.05)
+    client = FakeIndexClient(INDICES)
+
+    async def run():
+        first = await tools.list_elasticsearch_indices_tool(client)
+        await asyncio.sleep(0.06)
+        client.fail = True
+        await tools.list_elasticsearch_indices_tool(client)
+        await asyncio.sleep(0.05)
+        return first, await tools.list_elasticsearch_indices_tool(client)
+
+    first, after_failure = asyncio.run(run())
+    assert after_failure == first
+
+
+def test_first_call_failure_is_raised():
+    client = FakeIndexClient(INDICES)
+    client.fail = True
+    with pytest.raises(RuntimeError):
+        asyncio.run(tools.list_elasticsearch_indices_tool(client))
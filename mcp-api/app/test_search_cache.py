@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from app import search_cache
+from app.search_cache import SearchCache, create_search_cache, normalize_query
+
+
+class FakeTokenClient:
+    """
+    get_index_change_token だけを持つ ElasticsearchClient の代替。
+    """
+    def __init__(self, token="t1"):
+        self.token = token
+        self.calls = 0
+        self.fail = False
+
+    async def get_index_change_token(self, index: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("cluster unavailable")
+        return self.token
+
+
+class FakeSharedBackend:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ttl):
+        self.values[key] = value
+
+    async def close(self):
+        pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # イベントループの時計は変えずに、キャッシュの有効期限の判定にだけ使う時刻を進める
+    fake = FakeClock()
+    monkeypatch.setattr(search_cache, "time", fake)
+    return fake
+
+
+def test_normalize_query():
+    assert normalize_query("  hello \n  world ") == "hello world"
+
+
+def test_local_hit_and_ttl(clock):
+    async def run():
+        cache = SearchCache(ttl=10.0)
+        await cache.set("k", "v")
+        assert await cache.get("k") == "v"
+        clock.now += 11.0
+        assert await cache.get("k") is None
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert stats["hits_local"] == 1
+    assert stats["expired"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 0 and stats["bytes"] == 0
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    async def run():
+        cache = SearchCache(max_entries=2)
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        await cache.get("a")
+        await cache.set("c", "3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "1"
+
+        small = SearchCache(max_bytes=search_cache.sys.getsizeof("x" * 100) * 2)
+        await small.set("a", "x" * 100)
+        await small.set("b", "y" * 100)
+        await small.set("c", "z" * 100)
+        assert await small.get("a") is None
+        # 上限より大きい結果は保存しない
+        await small.set("huge", "x" * 1000)
+        assert await small.get("huge") is None
+        assert await small.get("c") == "z" * 100
+        return cache.stats(), small.stats()
+
+    stats, small_stats = asyncio.run(run())
+    assert stats["evictions"] == 1
+    assert small_stats["entries"] == 2
+    assert small_stats["bytes"] <= search_cache.sys.getsizeof("x" * 100) * 2
+
+
+def test_key_changes_with_the_index_change_token(clock):
+    async def run():
+        cache = SearchCache(token_ttl=1.0)
+        client = FakeTokenClient()
+        key = await cache.make_key(client, "docs", "q", 0, 10)
+        assert await cache.make_key(client, "docs", "q", 0, 10) == key
+        assert await cache.make_key(client, "docs", "q", 10, 10) != key
+        assert client.calls == 1
+        client.token = "t2"
+        # token_ttl の間は以前の変更トークンを使う
+        assert await cache.make_key(client, "docs", "q", 0, 10) == key
+        clock.now += 2.0
+        assert await cache.make_key(client, "docs", "q", 0, 10) != key
+        return client.calls
+
+    assert asyncio.run(run()) == 2
+
+
+def test_concurrent_token_requests_are_merged():
+    async def run():
+        cache = SearchCache()
+        client = FakeTokenClient()
+        keys = await asyncio.gather(*(cache.make_key(client, "docs", "q", 0, 10) for _ in range(5)))
+        return client.calls, keys
+
+    calls, keys = asyncio.run(run())
+    assert calls == 1
+    assert len(set(keys)) == 1
+
+
+def test_token_error_bypasses_the_cache():
+    async def run():
+        cache = SearchCache()
+        client = FakeTokenClient()
+        client.fail = True
+        assert await cache.make_key(client, "docs", "q", 0, 10) is None
+        client.fail = False
+        assert await cache.make_key(client, "docs", "q", 0, 10) is not None
+        return cache.stats()
+
+    assert asyncio.run(run())["bypassed"] == 1
+
+
+def test_shared_backend():
+    async def run():
+        shared = FakeSharedBackend()
+        writer = SearchCache(shared=shared)
+        reader = SearchCache(shared=shared)
+        await writer.set("k", "v")
+        assert await reader.get("k") == "v"
+        assert await reader.get("k") == "v"
+        return reader.stats()
+
+    stats = asyncio.run(run())
+    assert stats["hits_shared"] == 1
+    assert stats["hits_local"] == 1
+
+
+def test_create_search_cache():
+    assert create_search_cache(ttl=0, max_entries=10, max_bytes=1024, token_ttl=1.0) is None
+    cache = create_search_cache(ttl=5.0, max_entries=10, max_bytes=1024, token_ttl=1.0)
+    assert cache.ttl == 5.0 and cache.shared is None
+    assert 'mcp_search_cache_entries 0' in cache.render_prometheus()
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app import tools
+
+PROFILE_MAPPING = {"docs": {"mappings": {"_meta": {"search_fields": ["title^3", "content_ja"],
+                                                   "highlight_fields": ["content_ja", "title"]}}}}
+
+
+class FakeMappingClient:
+    """
+    get_index_mapping だけを持つ ElasticsearchClient の代替。
+    """
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    async def get_index_mapping(self, index_name: str) -> dict:
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return PROFILE_MAPPING
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    tools._search_fields_cache.clear()
+    yield
+    tools._search_fields_cache.clear()
+
+
+def test_fields_from_meta_are_cached():
+    client = FakeMappingClient()
+    for _ in range(2):
+        fields = asyncio.run(tools.get_index_search_fields(client, "docs"))
+    assert fields.search == ["title^3", "content_ja"]
+    assert fields.highlight == ["content_ja", "title"]
+    assert client.calls == 1
+
+
+def test_failed_lookup_is_not_cached():
+    client = FakeMappingClient(error=ConnectionResetError("reset"))
+    fields = asyncio.run(tools.get_index_search_fields(client, "docs"))
+    assert fields.search[0] == tools._LEGACY_SEARCH_FIELDS[0]
+    assert "docs" not in tools._search_fields_cache
+
+    # 次の検索ではマッピングを取得し直す
+    client.error = None
+    fields = asyncio.run(tools.get_index_search_fields(client, "docs"))
+    assert fields.search == ["title^3", "content_ja"]
+    assert client.calls == 2
+
+
+def test_timeout_is_raised():
+    client = FakeMappingClient(error=tools.ElasticsearchTimeoutError("timed out"))
+    with pytest.raises(tools.ElasticsearchTimeoutError):
+        asyncio.run(tools.get_index_search_fields(client, "docs"))
+    assert "docs" not in tools._search_fields_cache
@@ -1,17 +1,67 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 from pydantic import BaseModel, Field, ValidationError
 
-from .elasticsearch_client import ElasticsearchClient, NotFoundError
+from .elasticsearch_client import ElasticsearchClient, ElasticsearchTimeoutError, NotFoundError
+from .search_cache import SearchCache, normalize_query
 
 logger = logging.getLogger(__name__)
 
+# _meta.search_fields が無いインデックス（インデックスプロファイルの導入前にクローラーが作成したもの）で使うフィールド
+_LEGACY_SEARCH_FIELDS = [
+    "title",
+    "content",
+    "content_ngram.phrase",
+    "content_en",
+    "content_en.phrase^10",
+    "content_ja",
+    "content_ja.phrase^10"
+]
+_LEGACY_HIGHLIGHT_FIELDS = ["content_ja", "content_ngram", "content", "title"]
+# インデックスごとの検索フィールドをキャッシュする時間（秒）
+SEARCH_FIELDS_CACHE_TTL = 60.0
+
+
+class IndexSearchFields(NamedTuple):
+    """
+    インデックスに実際に存在する、検索対象のフィールド（重み付き）とハイライトするフィールド（優先度順）。
+    """
+    search: List[str]
+    highlight: List[str]
+
+
+_search_fields_cache: Dict[str, Tuple[float, IndexSearchFields]] = {}
+
+
+# インデックスのリストをキャッシュする時間（秒）。過ぎた後はキャッシュを返しつつバックグラウンドで更新する
+INDEX_LIST_CACHE_TTL = 30.0
+
+
+class _IndexListCache:
+    """
+    list_elasticsearch_indices_tool の結果のキャッシュ。
+    """
+    def __init__(self):
+        self.result: Optional["IndexListResult"] = None
+        self.expires_at = 0.0
+        self.refreshing: Optional["asyncio.Future[None]"] = None
+
+
+_index_list_cache = _IndexListCache()
+
 # ツール関数の引数として使用されるPydanticモデルは残す
 class SearchToolParams(BaseModel):
     query: str
     index: str
     cursor: Optional[str] = None
 
+class SearchPassagesToolParams(BaseModel):
+    query: str
+    index: str
+    size: int = 5
+
 class GetDocumentByIdToolParams(BaseModel):
     document_id: str
     index: str
@@ -29,6 +79,21 @@ class SearchResults(BaseModel):
     items: List[SearchResultItem]
     next_cursor: Optional[str] = None
 
+# search_passages_toolの結果を表現するPydanticモデル
+class PassageItem(BaseModel):
+    document_id: str
+    chunk_id: str
+    title: str
+    url: Optional[str] = None
+    heading_path: List[str] = Field(default_factory=list)
+    content: str
+    start_offset: int # ドキュメントの content（UTF-8）におけるパッセージの開始バイト位置
+    end_offset: int
+    score: Optional[float] = None
+
+class PassageResults(BaseModel):
+    items: List[PassageItem]
+
 # get_document_by_id_toolの結果を表現するPydanticモデル
 class DocumentContent(BaseModel):
     id: str
@@ -44,11 +109,12 @@ class IndexListResult(BaseModel):
     indices: List[IndexInfo]
 
 
-def search_tool(es_client: ElasticsearchClient, query: str, index: str, cursor: Optional[str]) -> SearchResults:
+async def search_tool(es_client: ElasticsearchClient, query: str, index: str, cursor: Optional[str],
+                      cache: Optional[SearchCache] = None) -> SearchResults:
     """
     タイトルまたはコンテンツにキーワードを含むドキュメントを検索し、
     {id, title} のリストを返します。
-    指定されたindexを検索します。
+    指定されたindexを検索します。cache を指定した場合は、インデックスが変わっていない間は同じ検索の結果を再利用します。
     This function implements the 'search' tool logic.
     """
     size = 10
@@ -58,36 +124,33 @@ def search_tool(es_client: ElasticsearchClient, query: str, index: str, cursor:
             from_ = int(cursor)
         except ValueError:
             from_ = 0
+    query = normalize_query(query)
 
+    cache_key = None
+    if cache is not None:
+        cache_key = await cache.make_key(es_client, index, query, from_, size)
+        if cache_key is not None:
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                return SearchResults.model_validate_json(cached)
+
+    fields = await get_index_search_fields(es_client, index)
     body = {
         "query": {
             "multi_match": {
                 "query": query,
-                "fields": [
-                    "title",
-                    "content",
-                    "content_ngram.phrase",
-                    "content_en",
-                    "content_en.phrase^10",
-                    "content_ja",
-                    "content_ja.phrase^10"
-                ]
+                "fields": fields.search
             }
         },
         "highlight": {
-            "fields": {
-                "content": {},
-                "title": {},
-                "content_ngram": {},
-                "content_ja": {}
-            },
+            "fields": {field: {} for field in fields.highlight},
             "pre_tags": ["<em>"],
             "post_tags": ["</em>"]
         },
         "from": from_,
         "size": size
     }
-    search_response = es_client.search(body, index)
+    search_response = await es_client.search(body, index)
     search_hits = search_response.get("hits", {}).get("hits", [])
     total_hits = search_response.get("hits", {}).get("total", {}).get("value", 0)
 
@@ -95,7 +158,7 @@ def search_tool(es_client: ElasticsearchClient, query: str, index: str, cursor:
     for hit in search_hits:
         doc_id = hit["_id"]
         doc_title = hit["_source"].get("title")
-        highlight = _extract_highlight(hit)
+        highlight = _extract_highlight(hit, fields.highlight)
 
         if doc_id and doc_title:
             items.append(SearchResultItem(id=doc_id, title=doc_title, highlight=highlight))
@@ -104,37 +167,116 @@ def search_tool(es_client: ElasticsearchClient, query: str, index: str, cursor:
     next_cursor = None
     if (from_ + len(items)) < total_hits:
         next_cursor = str(from_ + len(items))
-    
-    return SearchResults(items=items, next_cursor=next_cursor)
+
+    results = SearchResults(items=items, next_cursor=next_cursor)
+    if cache_key is not None:
+        await cache.set(cache_key, results.model_dump_json())
+    return results
+
+async def search_passages_tool(es_client: ElasticsearchClient, query: str, index: str, size: int = 5,
+                               chunk_index_suffix: str = "-chunks") -> PassageResults:
+    """
+    ドキュメントを分割したパッセージ（チャンク）を検索し、関連度の高いパッセージの本文を直接返します。
+    index にはドキュメントのインデックス名を指定し、対応するチャンクインデックス（<index><接尾辞>）を検索します。
+    This function implements the 'search_passages' tool logic.
+    """
+    size = max(1, min(size, 20))
+    chunk_index = index if index.endswith(chunk_index_suffix) else f"{index}{chunk_index_suffix}"
+    try:
+        fields = await get_index_search_fields(es_client, chunk_index, legacy_extra_fields=["heading_path^2"])
+        body = {
+            "query": {
+                "multi_match": {
+                    "query": query,
+                    "fields": fields.search
+                }
+            },
+            "_source": ["doc_id", "url", "title", "heading_path", "content", "start_offset", "end_offset"],
+            "size": size
+        }
+        search_response = await es_client.search(body, chunk_index)
+    except NotFoundError:
+        raise NotFoundError(f"Chunk index {chunk_index} not found for index {index}")
+
+    items = []
+    for hit in search_response.get("hits", {}).get("hits", []):
+        source = hit.get("_source", {})
+        if not source.get("doc_id") or not source.get("content"):
+            continue
+        items.append(PassageItem(
+            document_id=source["doc_id"],
+            chunk_id=hit["_id"],
+            title=source.get("title") or "",
+            url=source.get("url"),
+            heading_path=source.get("heading_path") or [],
+            content=source["content"],
+            start_offset=source.get("start_offset", 0),
+            end_offset=source.get("end_offset", 0),
+            score=hit.get("_score"),
+        ))
+    return PassageResults(items=items)
+
+async def get_index_search_fields(es_client: ElasticsearchClient, index: str,
+                                  legacy_extra_fields: Sequence[str] = ()) -> IndexSearchFields:
+    """
+    インデックスのマッピングの _meta（クローラーがインデックスプロファイルに従って保存する search_fields / highlight_fields）から、
+    インデックスに実際に存在するフィールドを返します。_meta に情報が無いインデックスでは従来のフィールドを使います。
+    結果はインデックスごとに SEARCH_FIELDS_CACHE_TTL 秒キャッシュします（マッピングを取得できなかった場合はキャッシュしません）。
+    """
+    now = time.monotonic()
+    cached = _search_fields_cache.get(index)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    search: List[str] = []
+    highlight: List[str] = []
+    try:
+        # エイリアスやワイルドカードの場合は、対象となるすべてのインデックスのフィールドを合わせる
+        for index_mapping in (await es_client.get_index_mapping(index)).values():
+            meta = index_mapping.get("mappings", {}).get("_meta", {})
+            search += [field for field in meta.get("search_fields", []) if field not in search]
+            highlight += [field for field in meta.get("highlight_fields", []) if field not in highlight]
+    except (NotFoundError, ElasticsearchTimeoutError):
+        # タイムアウトの場合は従来のフィールドをキャッシュせず、呼び出し元にエラーを返す
+        raise
+    except Exception as e:
+        logger.error(f"Error getting search fields for index {index}: {e}")
+        # マッピングを取得できなかった場合は、この検索だけ従来のフィールドを使い、キャッシュしない
+        return IndexSearchFields(search=_LEGACY_SEARCH_FIELDS[:1] + list(legacy_extra_fields) + _LEGACY_SEARCH_FIELDS[1:],
+                                 highlight=_LEGACY_HIGHLIGHT_FIELDS)
+    if not search:
+        search = _LEGACY_SEARCH_FIELDS[:1] + list(legacy_extra_fields) + _LEGACY_SEARCH_FIELDS[1:]
+        highlight = _LEGACY_HIGHLIGHT_FIELDS
+    fields = IndexSearchFields(search=search, highlight=highlight or ["title"])
+    _search_fields_cache[index] = (now + SEARCH_FIELDS_CACHE_TTL, fields)
+    return fields
 
 # _extract_highlight ヘルパー関数
-def _extract_highlight(hit: Dict[str, Any]) -> Optional[Dict[str, List[str]]]:
+def _extract_highlight(hit: Dict[str, Any], highlight_fields: Sequence[str] = _LEGACY_HIGHLIGHT_FIELDS) -> Optional[Dict[str, List[str]]]:
     """
     Elasticsearchのヒット結果からハイライト情報を抽出します。
-    優先順位: content_ja -> content_ngram -> content
+    本文のハイライトは highlight_fields の順（例: content_ja -> content_ngram -> content）に最初に見つかったものを使います。
     """
     highlight = None
     if "highlight" in hit:
         highlight_data = hit["highlight"]
         highlight = {}
-        if "content_ja" in highlight_data:
-            highlight["content"] = highlight_data["content_ja"]
-        elif "content_ngram" in highlight_data:
-            highlight["content"] = highlight_data["content_ngram"]
-        elif "content" in highlight_data:
-            highlight["content"] = highlight_data["content"]
-        
+        for field in highlight_fields:
+            if field != "title" and field in highlight_data:
+                highlight["content"] = highlight_data[field]
+                break
+
         if "title" in highlight_data:
             highlight["title"] = highlight_data["title"]
     return highlight
 
-def get_document_by_id_tool(es_client: ElasticsearchClient, document_id: str, index: str) -> DocumentContent:
+async def get_document_by_id_tool(es_client: ElasticsearchClient, document_id: str, index: str) -> DocumentContent:
     """
     ドキュメントIDを指定して全文を取得します。
     This function implements the 'get_document_by_id' tool logic.
     """
     try:
-        document = es_client.get(document_id, index)
+        document = await es_client.get(document_id, index)
         content = document.get("content")
         title = document.get("title")
         if content is None:
@@ -147,42 +289,77 @@ def get_document_by_id_tool(es_client: ElasticsearchClient, document_id: str, in
     except Exception as e:
         raise ValueError(f"Error retrieving document {document_id}: {str(e)}")
 
-def list_elasticsearch_indices_tool(es_client: ElasticsearchClient) -> IndexListResult:
+async def list_elasticsearch_indices_tool(es_client: ElasticsearchClient) -> IndexListResult:
     """
     Elasticsearchの全インデックスのリストと説明を返します。
+    エイリアスが設定されたインデックス（クローラーが再構築したインデックス）は、インデックス名の代わりにエイリアス名を返します。
+    エイリアスから外れた再構築前・再構築中のインデックスは返しません。
+    結果は INDEX_LIST_CACHE_TTL 秒キャッシュし、過ぎた後はキャッシュを返しつつバックグラウンドで更新します。
     This function implements the 'list_elasticsearch_indices' tool logic.
     """
-    indices_raw = es_client.list_indices()
+    cache = _index_list_cache
+    if cache.result is None:
+        # 初回（起動直後の取得が終わっていない場合）は取得を待つ。同時の呼び出しは1回の取得を共有する
+        await asyncio.shield(_start_index_list_refresh(es_client))
+        return cache.result
+    if cache.expires_at <= time.monotonic():
+        _start_index_list_refresh(es_client)
+    return cache.result
+
+async def warm_index_list_cache(es_client: ElasticsearchClient):
+    """
+    インデックスのリストを取得してキャッシュします。起動時に呼び出し、最初のツールの呼び出しを待たせないようにします。
+    """
+    try:
+        await _start_index_list_refresh(es_client)
+    except Exception as e:
+        logger.error(f"Error listing indices: {e}")
+
+def _start_index_list_refresh(es_client: ElasticsearchClient) -> "asyncio.Future[None]":
+    """
+    インデックスのリストの更新を開始します。更新中の場合は実行中の更新を返します。
+    """
+    cache = _index_list_cache
+    if cache.refreshing is None or cache.refreshing.done():
+        cache.refreshing = asyncio.ensure_future(_refresh_index_list(es_client))
+    return cache.refreshing
+
+async def _refresh_index_list(es_client: ElasticsearchClient):
+    cache = _index_list_cache
+    try:
+        result = await fetch_index_list(es_client)
+    except Exception as e:
+        if cache.result is None:
+            raise
+        # 取得に失敗した場合は前回のリストを返し続け、TTLの後に再試行する
+        logger.error(f"Error refreshing the index list: {e}")
+        cache.expires_at = time.monotonic() + INDEX_LIST_CACHE_TTL
+        return
+    cache.result = result
+    cache.expires_at = time.monotonic() + INDEX_LIST_CACHE_TTL
+
+async def fetch_index_list(es_client: ElasticsearchClient) -> IndexListResult:
+    """
+    インデックスのリストと説明を、エイリアスと _meta.description を含めて1回のリクエストで取得します。
+    "." で始まるシステムインデックスはElasticsearch側で除外されます。
+    """
+    indices_raw = await es_client.list_indices_with_meta()
     indices_info = []
-    for idx in indices_raw:
-        index_name = idx.get("index")
-        if index_name:
-            description = ""
-            try:
-                # インデックスのマッピングを取得
-                mapping = es_client.get_index_mapping(index_name)
-                # _meta.description を取得
-                # mappingの構造は {index_name: {mappings: {_meta: {description: "..."}}}}
-                index_mapping = mapping.get(index_name, {})
-                mappings_data = index_mapping.get("mappings", {})
-                meta_data = mappings_data.get("_meta", {})
-                meta_description = meta_data.get("description")
-
-                if meta_description and isinstance(meta_description, str) and meta_description.strip():
-                    description = meta_description.strip()
-            except NotFoundError:
-                # マッピングが見つからない場合は、descriptionは空のまま
-                logger.debug(f"Mapping not found for index {index_name}. Description will be default.")
-                pass
-            except Exception as e:
-                # その他のエラーが発生した場合も、descriptionは空のまま
-                logger.error(f"Error getting mapping for index {index_name}: {e}")
-
-            if not description: # _meta.description が存在しないか空文字の場合
-                if index_name.startswith("."):
-                    description = f"Elasticsearchのシステムインデックス '{index_name}'"
-                else:
-                    description = f"'{index_name}' に関連するドキュメントのインデックス"
-            indices_info.append(IndexInfo(name=index_name, description=description))
-    
+    for index_name, index_data in sorted(indices_raw.items()):
+        # _meta.description を取得
+        # index_data の構造は {aliases: {...}, mappings: {_meta: {description: "..."}}}
+        meta_data = (index_data.get("mappings") or {}).get("_meta") or {}
+        aliases = sorted(index_data.get("aliases") or {})
+        if not aliases and meta_data.get("alias"):
+            # 再構築で作成されたが、エイリアスが指していないインデックス（切り替え前のバージョンなど）
+            continue
+
+        meta_description = meta_data.get("description")
+        if meta_description and isinstance(meta_description, str) and meta_description.strip():
+            description = meta_description.strip()
+        else: # _meta.description が存在しないか空文字の場合
+            description = f"'{index_name}' に関連するドキュメントのインデックス"
+        for name in aliases or [index_name]:
+            indices_info.append(IndexInfo(name=name, description=description))
+
     return IndexListResult(indices=indices_info)
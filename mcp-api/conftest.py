@@ -0,0 +1 @@
+# mcp-api のテストから `app` パッケージをインポートできるよう、このディレクトリを sys.path に追加させるための conftest
@@ -0,0 +1,192 @@
+"""
+クローラーのエンドツーエンドベンチマーク。
+
+合成サイト（synthetic_site.py）とElasticsearchの代替サーバー（fake_elasticsearch.py）をローカルで起動し、
+crawler/app/main.py を子プロセスとして実行して、以下をJSONで出力します。
+
+- pages_per_sec: 取得したページ数（HTMLとバイナリ）/ クローラーの実行時間
+- cpu_ms_per_page: クローラープロセス（変換ワーカーを含む）のCPU時間 / ページ数
+- peak_rss_mb: クローラーのプロセス（変換ワーカーを含む）のうち最大の常駐メモリ
+- es: Elasticsearchへのリクエスト数・接続数・受信バイト数など
+- stages: クローラーのメトリクス（ステージごとの処理時間）
+
+結果は --output で指定したファイルに追記（JSON Lines）できるため、回帰の追跡に使用できます。
+
+使い方:
+    python scripts/benchmark/crawler_bench.py --pages 2000 --fanout 5 --latency-ms 5 --repeat 3 \\
+        --set transform_workers=4 --set html_parser=lxml --output bench_results.jsonl
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_elasticsearch import FakeElasticsearch  # noqa: E402
+from synthetic_site import SyntheticSite  # noqa: E402
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CRAWLER_APP_DIR = os.path.join(REPO_ROOT, "crawler", "app")
+
+
+def parse_overrides(values: List[str]) -> Dict[str, Any]:
+    """
+    `key=value` 形式の設定の上書きを解析します。値はJSONとして解釈し、解釈できない場合は文字列として扱います。
+    """
+    overrides = {}
+    for value in values:
+        key, _, raw = value.partition("=")
+        try:
+            overrides[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            overrides[key] = raw
+    return overrides
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def stage_summary(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    クローラーのメトリクスから、ステージごとの処理時間の合計・件数・平均を抜き出します。
+    """
+    stages = {}
+    for name, metric in metrics.get("metrics", {}).items():
+        if metric["type"] != "histogram" or not name.endswith("_seconds"):
+            continue
+        for series in metric["series"]:
+            labels = ",".join(f"{key}={value}" for key, value in series["labels"].items())
+            stages[f"{name}{{{labels}}}" if labels else name] = {
+                "sum": series["sum"], "count": series["count"], "mean": series["mean"]
+            }
+    return stages
+
+
+def run_once(args, overrides: Dict[str, Any], work_dir: str, run: int) -> Dict[str, Any]:
+    """
+    合成サイトとElasticsearchの代替サーバーを起動し、クローラーを1回実行して結果を返します。
+    """
+    site = SyntheticSite(args.pages, args.fanout, args.page_size, args.binary_ratio, args.binary_size, args.latency_ms).start()
+    es = FakeElasticsearch(args.es_reject_rate, args.es_latency_ms).start()
+    metrics_path = os.path.join(work_dir, f"metrics-{run}.json")
+    config = {
+        "start_urls": [site.start_url],
+        "allowed_domains": [site.base_url.split("://", 1)[1]],
+        "max_depth": args.pages,
+        "delay": 0.0,
+        "es_index": "crawler-bench",
+        "es_index_description": "crawler benchmark",
+        "metrics_file": metrics_path,
+        "metrics_interval": 60.0,
+    }
+    config.update(overrides)
+    config_path = os.path.join(work_dir, f"config-{run}.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)  # JSONはYAMLとしても読み込める
+
+    command = [sys.executable, "main.py", "--config", config_path, "--es_host", "127.0.0.1", "--es_port", str(es.port)]
+    log_path = os.path.join(work_dir, f"crawler-{run}.log")
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            completed = subprocess.run(command, cwd=CRAWLER_APP_DIR, stdout=log, stderr=subprocess.STDOUT, timeout=args.timeout)
+        elapsed = time.perf_counter() - started
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        site_stats = dict(site.stats)
+        es_stats = es.snapshot()
+    finally:
+        site.close()
+        es.close()
+
+    if completed.returncode != 0:
+        raise RuntimeError(f"Crawler exited with status {completed.returncode}. See {log_path}.")
+
+    metrics = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding="utf-8") as f:
+            metrics = json.load(f)
+
+    pages = site_stats["html"] + site_stats["binary"]
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        "run": run,
+        "elapsed_seconds": round(elapsed, 3),
+        "pages": pages,
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed else None,
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_ms_per_page": round(cpu_seconds * 1000 / pages, 3) if pages else None,
+        # ru_maxrss は子孫プロセスのうち最大のもの（LinuxではKB単位）
+        "peak_rss_mb": round(usage_after.ru_maxrss / 1024, 1),
+        "site": site_stats,
+        "es": es_stats,
+        "stages": stage_summary(metrics),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end crawler benchmark against a synthetic site and a fake Elasticsearch.")
+    parser.add_argument("--pages", type=int, default=1000, help="Number of HTML pages on the synthetic site.")
+    parser.add_argument("--fanout", type=int, default=5, help="Links per page.")
+    parser.add_argument("--page-size", type=int, default=4096, help="Approximate HTML page size in bytes.")
+    parser.add_argument("--binary-ratio", type=float, default=0.1, help="Ratio of pages linking to a binary file.")
+    parser.add_argument("--binary-size", type=int, default=256 * 1024, help="Size of each binary file in bytes.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency injected into each site response.")
+    parser.add_argument("--es-latency-ms", type=float, default=0.0, help="Latency injected into each ES write.")
+    parser.add_argument("--es-reject-rate", type=float, default=0.0, help="Ratio of bulk items rejected with 429.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs.")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="Timeout of a single crawler run in seconds.")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a crawler config value (value parsed as JSON). Can be repeated.")
+    parser.add_argument("--output", help="Append the result as a JSON line to this file.")
+    parser.add_argument("--keep-logs", action="store_true", help="Keep the crawler logs and configs.")
+    args = parser.parse_args()
+
+    overrides = parse_overrides(args.overrides)
+    work_dir = tempfile.mkdtemp(prefix="crawler-bench-")
+    runs = [run_once(args, overrides, work_dir, run) for run in range(args.repeat)]
+
+    result = {
+        "benchmark": "crawler_e2e",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "params": {
+            "pages": args.pages, "fanout": args.fanout, "page_size": args.page_size, "binary_ratio": args.binary_ratio,
+            "binary_size": args.binary_size, "latency_ms": args.latency_ms, "es_latency_ms": args.es_latency_ms,
+            "es_reject_rate": args.es_reject_rate, "config_overrides": overrides,
+        },
+        "median": {
+            key: statistics.median(run[key] for run in runs)
+            for key in ("elapsed_seconds", "pages_per_sec", "cpu_ms_per_page", "peak_rss_mb")
+            if all(run[key] is not None for run in runs)
+        },
+        "runs": runs,
+    }
+    if args.keep_logs:
+        result["work_dir"] = work_dir
+    else:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+ベンチマーク用のElasticsearchの代替サーバー。
+
+クローラーが使用するAPI（接続確認、インデックスの存在確認・作成・削除、`_doc` と `_bulk` による書き込み、
+インデックスの再構築で使う設定の変更・リフレッシュ・forcemerge・エイリアス）だけを受け付け、ドキュメントはメモリ上に保持します。gzip圧縮されたリクエストボディにも対応します。
+リクエスト数・接続数・受信バイト数などを `GET /_bench/stats` で返します。
+
+使い方（単体で起動する場合）:
+    python scripts/benchmark/fake_elasticsearch.py --port 9299
+"""
+import argparse
+import fnmatch
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict
+
+from synthetic_site import QuietHTTPServer
+
+
+class FakeElasticsearch:
+    """
+    Elasticsearchの代替サーバー。
+    reject_rate を指定すると、_bulk のアイテムをその割合で 429 として拒否します。latency_ms は書き込みごとの遅延です。
+    """
+    def __init__(self, reject_rate: float = 0.0, latency_ms: float = 0.0, seed: int = 42):
+        self.reject_rate = reject_rate
+        self.latency = latency_ms / 1000.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.indices: Dict[str, Dict[str, Any]] = {}
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.aliases: Dict[str, str] = {}
+        self.stats: Dict[str, int] = {
+            "requests": 0, "connections": 0, "doc_requests": 0, "bulk_requests": 0, "bulk_items": 0,
+            "rejected_items": 0, "bytes_received": 0, "bytes_decoded": 0, "gzip_requests": 0, "refresh_requests": 0,
+            "forcemerge_requests": 0,
+        }
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, documents=sum(len(docs) for docs in self.documents.values()))
+
+    def _count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self.stats[key] += amount
+
+    def resolve(self, name: str) -> str:
+        """
+        エイリアスの場合は、エイリアスが指すインデックスの名前を返します。
+        """
+        return self.aliases.get(name, name)
+
+    def _update_aliases(self, actions):
+        with self._lock:
+            for action in actions:
+                op, params = next(iter(action.items()))
+                if op == "add":
+                    self.aliases[params["alias"]] = params["index"]
+                elif op == "remove":
+                    self.aliases.pop(params["alias"], None)
+                elif op == "remove_index":
+                    self._delete_index(params["index"])
+
+    def _delete_index(self, index: str):
+        self.indices.pop(index, None)
+        self.documents.pop(index, None)
+        for alias in [alias for alias, target in self.aliases.items() if target == index]:
+            del self.aliases[alias]
+
+    def _bulk(self, body: bytes) -> Dict[str, Any]:
+        lines = [line for line in body.split(b"\n") if line.strip()]
+        items = []
+        rejected = 0
+        i = 0
+        with self._lock:
+            while i < len(lines):
+                action = json.loads(lines[i])
+                op, meta = next(iter(action.items()))
+                index = self.resolve(meta.get("_index"))
+                docs = self.documents.setdefault(index, {})
+                if op == "delete":
+                    i += 1
+                    status = 200 if docs.pop(meta["_id"], None) is not None else 404
+                    items.append({op: {"_index": index, "_id": meta["_id"], "status": status}})
+                    continue
+                source = json.loads(lines[i + 1])
+                i += 2
+                if self.reject_rate and self._random.random() < self.reject_rate:
+                    rejected += 1
+                    items.append({op: {"_index": index, "_id": meta["_id"], "status": 429,
+                                       "error": {"type": "es_rejected_execution_exception"}}})
+                    continue
+                docs[meta["_id"]] = source
+                items.append({op: {"_index": index, "_id": meta["_id"], "status": 201, "result": "created"}})
+            self.stats["bulk_items"] += len(items)
+            self.stats["rejected_items"] += rejected
+        return {"took": 1, "errors": rejected > 0, "items": items}
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        es = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                es._count(connections=1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                es._count(requests=1, bytes_received=len(body))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    es._count(gzip_requests=1)
+                    body = gzip.decompress(body)
+                es._count(bytes_decoded=len(body))
+                return body
+
+            def _send(self, status: int, payload: Dict[str, Any]):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _parts(self):
+                return [part for part in self.path.split("?", 1)[0].split("/") if part]
+
+            def do_HEAD(self):
+                self._read_body()
+                parts = self._parts()
+                self._send(200 if len(parts) == 1 and es.resolve(parts[0]) in es.indices else 404, {})
+
+            def do_GET(self):
+                self._read_body()
+                parts = self._parts()
+                if not parts:
+                    return self._send(200, {"name": "fake-es", "version": {"number": "8.18.1"}})
+                if parts == ["_bench", "stats"]:
+                    return self._send(200, es.snapshot())
+                if len(parts) == 2 and parts[0] == "_alias":
+                    index = es.aliases.get(parts[1])
+                    if index is None:
+                        return self._send(404, {"error": f"alias [{parts[1]}] missing", "status": 404})
+                    return self._send(200, {index: {"aliases": {parts[1]: {}}}})
+                if len(parts) == 3 and parts[:2] == ["_cat", "indices"]:
+                    return self._send(200, [{"index": name} for name in es.indices if fnmatch.fnmatchcase(name, parts[2])])
+                if parts[0] == "_cluster":
+                    return self._send(200, {"status": "green", "timed_out": False})
+                if len(parts) == 3 and parts[1] == "_doc":
+                    doc = es.documents.get(es.resolve(parts[0]), {}).get(parts[2])
+                    if doc is None:
+                        return self._send(404, {"found": False})
+                    return self._send(200, {"_id": parts[2], "found": True, "_source": doc})
+                self._send(404, {"error": "not supported"})
+
+            def do_PUT(self):
+                body = self._read_body()
+                parts = self._parts()
+                if len(parts) == 1:
+                    if es.resolve(parts[0]) in es.indices:
+                        return self._send(400, {"error": {"type": "resource_already_exists_exception"}, "status": 400})
+                    es.indices[parts[0]] = json.loads(body) if body else {}
+                    return self._send(200, {"acknowledged": True, "index": parts[0]})
+                if len(parts) == 2 and parts[1] == "_settings":
+                    index = es.indices.get(es.resolve(parts[0]))
+                    if index is None:
+                        return self._send(404, {"error": "index_not_found_exception", "status": 404})
+                    index.setdefault("settings", {}).update(json.loads(body).get("index", {}))
+                    return self._send(200, {"acknowledged": True})
+                if len(parts) == 3 and parts[1] == "_doc":
+                    if es.latency:
+                        time.sleep(es.latency)
+                    with es._lock:
+                        es.documents.setdefault(es.resolve(parts[0]), {})[parts[2]] = json.loads(body)
+                        es.stats["doc_requests"] += 1
+                    return self._send(201, {"_id": parts[2], "result": "created"})
+                self._send(404, {"error": "not supported"})
+
+            def do_POST(self):
+                body = self._read_body()
+                parts = self._parts()
+                if parts and parts[-1] == "_bulk":
+                    if es.latency:
+                        time.sleep(es.latency)
+                    es._count(bulk_requests=1)
+                    return self._send(200, es._bulk(body))
+                if parts and parts[-1] == "_search":
+                    return self._send(200, {"hits": {"total": {"value": 0}, "hits": []}})
+                if parts == ["_aliases"]:
+                    es._update_aliases(json.loads(body)["actions"])
+                    return self._send(200, {"acknowledged": True})
+                if len(parts) == 2 and parts[1] in ("_refresh", "_forcemerge"):
+                    es._count(**{"refresh_requests" if parts[1] == "_refresh" else "forcemerge_requests": 1})
+                    return self._send(200, {"_shards": {"total": 1, "successful": 1, "failed": 0}})
+                self._send(404, {"error": "not supported"})
+
+            def do_DELETE(self):
+                self._read_body()
+                parts = self._parts()
+                if len(parts) == 1:
+                    with es._lock:
+                        for index in parts[0].split(","):
+                            es._delete_index(index)
+                    return self._send(200, {"acknowledged": True})
+                self._send(404, {"error": "not supported"})
+
+        self._server = QuietHTTPServer((host, port), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-elasticsearch", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Elasticsearch stand-in for crawler benchmarks.")
+    parser.add_argument("--port", type=int, default=9299)
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Ratio of bulk items rejected with 429.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to each write request.")
+    args = parser.parse_args()
+
+    es = FakeElasticsearch(args.reject_rate, args.latency_ms)
+    es.start(port=args.port)
+    print(f"Fake Elasticsearch listening on http://127.0.0.1:{es.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        es.close()
+
+
+if __name__ == "__main__":
+    main()
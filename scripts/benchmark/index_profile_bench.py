@@ -0,0 +1,155 @@
+"""
+インデックスプロファイルのベンチマーク。
+
+合成のドキュメント（英語と日本語の本文）を、プロファイル（crawler/app/index_profiles.py）ごとに別のインデックスへ
+BulkIndexer でインデックスし、以下をJSONで出力します。アナライザーの処理とディスク使用量を測るため、
+kuromojiプラグインを導入した実際のElasticsearch（docker compose のもの）が必要です。
+
+- docs_per_sec: インデックスしたドキュメント数 / 送信開始から全件の送信完了までの時間
+- store_size_bytes: refresh と forcemerge（1セグメント）後のインデックスのディスク使用量
+- bytes_per_doc: store_size_bytes / ドキュメント数
+- size_ratio: 最初のプロファイル（既定では full）に対するサイズの比
+
+ベンチマーク用のインデックス（<prefix>-<プロファイル名>）は、--keep-indices を指定しない限り終了時に削除します。
+
+使い方:
+    python scripts/benchmark/index_profile_bench.py --es-url http://localhost:9200 --docs 5000 \\
+        --profiles full no_ngram ja ja_compact en --output bench_results.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "crawler", "app"))
+
+from bulk_indexer import BulkIndexer  # noqa: E402
+from document_entity import Document  # noqa: E402
+from elasticsearch_client import ElasticsearchClient  # noqa: E402
+from index_profiles import INDEX_PROFILES  # noqa: E402
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+_EN_WORDS = ("crawler", "search", "index", "document", "elastic", "query", "token", "vector", "passage", "shard",
+             "replica", "cluster", "analyzer", "mapping", "latency", "throughput", "the", "of", "and", "with")
+_JA_WORDS = ("検索", "インデックス", "ドキュメント", "クローラー", "形態素解析", "東京都", "システム", "設定", "取得",
+             "します", "です", "の", "を", "は", "に", "で", "文書", "全文", "性能", "改善")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_documents(count: int, chars: int, ja_ratio: float, seed: int) -> List[Document]:
+    """
+    合成のドキュメントを生成します。ja_ratio の割合のドキュメントは日本語の本文になります。
+    """
+    rng = random.Random(seed)
+    timestamp = datetime.now(timezone.utc).isoformat()
+    documents = []
+    for i in range(count):
+        japanese = rng.random() < ja_ratio
+        words = _JA_WORDS if japanese else _EN_WORDS
+        separator = "" if japanese else " "
+        sentences = []
+        length = 0
+        while length < chars:
+            sentence = separator.join(rng.choice(words) for _ in range(rng.randint(8, 20))) + ("。" if japanese else ".")
+            sentences.append(sentence)
+            length += len(sentence)
+        content = "\n".join(sentences)
+        documents.append(Document(url=f"https://bench.example.com/{i}", title=f"Benchmark document {i}",
+                                  content=content, content_length=len(content), mime_type="text/html",
+                                  timestamp=timestamp))
+    return documents
+
+
+def run_profile(args, profile: str, documents: List[Document]) -> Dict[str, Any]:
+    """
+    プロファイルのインデックスを作り直してドキュメントを投入し、投入速度とディスク使用量を返します。
+    """
+    base_url = args.es_url.rstrip("/")
+    url = urlparse(base_url)
+    index_name = f"{args.prefix}-{profile}"
+    requests.delete(f"{base_url}/{index_name}", timeout=30)
+    es_client = ElasticsearchClient(host=url.hostname, port=url.port or 9200, index_name=index_name,
+                                    index_description=f"Index profile benchmark ({profile})", index_profile=profile)
+    try:
+        bulk_indexer = BulkIndexer(es_client, max_documents=args.bulk_size, flush_interval=3600)
+        started = time.perf_counter()
+        for i, document in enumerate(documents):
+            bulk_indexer.add(document, doc_id=str(i))
+        bulk_indexer.close()
+        elapsed = time.perf_counter() - started
+
+        requests.post(f"{base_url}/{index_name}/_refresh", timeout=300).raise_for_status()
+        requests.post(f"{base_url}/{index_name}/_forcemerge?max_num_segments=1", timeout=3600).raise_for_status()
+        stats = requests.get(f"{base_url}/{index_name}/_stats/store,docs", timeout=60)
+        stats.raise_for_status()
+        primaries = stats.json()["indices"][index_name]["primaries"]
+        size = primaries["store"]["size_in_bytes"]
+        indexed = primaries["docs"]["count"]
+        return {
+            "profile": profile,
+            "indexed": indexed,
+            "failed": bulk_indexer.failed_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "docs_per_sec": round(len(documents) / elapsed, 1) if elapsed else None,
+            "store_size_bytes": size,
+            "bytes_per_doc": round(size / indexed, 1) if indexed else None,
+        }
+    finally:
+        if not args.keep_indices:
+            requests.delete(f"{base_url}/{index_name}", timeout=30)
+        es_client.transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare index size and ingest rate across index profiles.")
+    parser.add_argument("--es-url", default="http://localhost:9200", help="Elasticsearch URL (with the kuromoji plugin).")
+    parser.add_argument("--docs", type=int, default=5000, help="Number of documents per profile.")
+    parser.add_argument("--chars", type=int, default=3000, help="Approximate content length of each document.")
+    parser.add_argument("--ja-ratio", type=float, default=0.5, help="Ratio of documents with Japanese content.")
+    parser.add_argument("--bulk-size", type=int, default=500, help="Documents per _bulk request.")
+    parser.add_argument("--profiles", nargs="+", default=list(INDEX_PROFILES), choices=list(INDEX_PROFILES),
+                        help="Profiles to compare. The first one is the baseline for size_ratio.")
+    parser.add_argument("--prefix", default="bench-index-profile", help="Prefix of the benchmark index names.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-indices", action="store_true", help="Keep the benchmark indices.")
+    parser.add_argument("--output", help="Append the result as a JSON line to this file.")
+    args = parser.parse_args()
+
+    documents = build_documents(args.docs, args.chars, args.ja_ratio, args.seed)
+    results = [run_profile(args, profile, documents) for profile in args.profiles]
+    baseline = results[0]["store_size_bytes"]
+    for result in results:
+        result["size_ratio"] = round(result["store_size_bytes"] / baseline, 3) if baseline else None
+
+    output = {
+        "benchmark": "index_profiles",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "params": {"docs": args.docs, "chars": args.chars, "ja_ratio": args.ja_ratio, "bulk_size": args.bulk_size},
+        "profiles": results,
+    }
+    print(json.dumps(output, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(output, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+ベンチマーク用の合成Webサイト。
+
+ページ数・リンクの分岐数・ページサイズ・バイナリの割合・応答の遅延を指定して、
+決定的なリンク構造を持つサイトをローカルに配信します。ETag による条件付きGET（304）にも対応します。
+全ページを列挙した /sitemap.xml も配信します（クローラーの use_sitemaps で使用）。
+
+使い方（単体で起動する場合）:
+    python scripts/benchmark/synthetic_site.py --pages 1000 --fanout 5 --port 8765
+"""
+import argparse
+import hashlib
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+_WORDS = ("crawler", "search", "index", "document", "elastic", "query", "token", "vector",
+          "passage", "shard", "replica", "cluster", "analyzer", "mapping", "latency", "throughput")
+
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """
+    クライアントによる切断（Keep-Aliveの終了やボディを読まない切断）をエラーとして出力しないHTTPサーバー。
+    """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class SyntheticSite:
+    """
+    合成サイトのページ生成とHTTPサーバーをまとめたクラス。
+    ページ i は /p/i で配信され、fanout 本の他ページへのリンクと、binary_ratio の割合でバイナリへのリンクを持ちます。
+    """
+    def __init__(self, pages: int = 1000, fanout: int = 5, page_size: int = 4096, binary_ratio: float = 0.1,
+                 binary_size: int = 256 * 1024, latency_ms: float = 0.0, seed: int = 42):
+        self.pages = max(1, pages)
+        self.fanout = max(1, fanout)
+        self.page_size = page_size
+        self.binary_ratio = binary_ratio
+        self.binary_size = binary_size
+        self.latency = latency_ms / 1000.0
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "html": 0, "binary": 0, "not_modified": 0, "sitemap": 0, "not_found": 0, "bytes_sent": 0}
+        self._server = None
+        self._thread = None
+
+    @property
+    def start_url(self) -> str:
+        return f"{self.base_url}/p/0"
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def has_binary(self, page: int) -> bool:
+        return random.Random(self.seed * 7919 + page).random() < self.binary_ratio
+
+    def render(self, path: str):
+        """
+        パスに対応する (ボディ, Content-Type, ETag) を返します。存在しない場合はNoneを返します。
+        ページ数が多くてもメモリを消費しないよう、ボディはリクエストのたびに生成します。
+        """
+        if path.startswith("/p/"):
+            page = self._parse_id(path[3:])
+            if page is None:
+                return None
+            body = self._render_page(page)
+            content_type = "text/html; charset=utf-8"
+        elif path.startswith("/bin/") and path.endswith(".pdf"):
+            page = self._parse_id(path[5:-4])
+            if page is None or not self.has_binary(page):
+                return None
+            rng = random.Random(page)
+            body = b"%PDF-1.4\n" + rng.randbytes(max(0, self.binary_size - 9))
+            content_type = "application/pdf"
+        elif path == "/sitemap.xml":
+            body = self._render_sitemap()
+            content_type = "application/xml"
+        else:
+            return None
+        return body, content_type, '"' + hashlib.md5(body).hexdigest() + '"'
+
+    def _parse_id(self, value: str):
+        try:
+            page = int(value)
+        except ValueError:
+            return None
+        return page if 0 <= page < self.pages else None
+
+    def _render_page(self, page: int) -> bytes:
+        rng = random.Random(self.seed + page)
+        # 次のページへのリンクで全ページに到達できるようにし、残りは決定的な乱択リンクにする
+        targets = [(page + 1) % self.pages] + [rng.randrange(self.pages) for _ in range(self.fanout - 1)]
+        links = "".join(f'<li><a href="/p/{target}">Page {target}</a></li>' for target in targets)
+        if self.has_binary(page):
+            links += f'<li><a href="/bin/{page}.pdf">Attachment {page}</a></li>'
+        head = f"<html><head><title>Synthetic page {page}</title><style>body{{margin:0}}</style></head><body>"
+        nav = f"<nav><ul>{links}</ul></nav>"
+        tail = "</body></html>"
+        paragraphs = []
+        size = len(head) + len(nav) + len(tail)
+        while size < self.page_size:
+            paragraph = "<p>" + " ".join(rng.choice(_WORDS) for _ in range(40)) + "</p>"
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        return (head + f"<h1>Page {page}</h1>" + nav + "".join(paragraphs) + tail).encode("utf-8")
+
+    def _render_sitemap(self) -> bytes:
+        urls = "".join(f"<url><loc>{self.base_url}/p/{page}</loc></url>" for page in range(self.pages))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>').encode("utf-8")
+
+    def _count(self, key: str, sent: int = 0):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[key] += 1
+            self.stats["bytes_sent"] += sent
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        site = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if site.latency:
+                    time.sleep(site.latency)
+                entry = site.render(self.path.split("?", 1)[0])
+                if entry is None:
+                    site._count("not_found")
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, content_type, etag = entry
+                if self.headers.get("If-None-Match") == etag:
+                    site._count("not_modified")
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                kind = {"application/pdf": "binary", "application/xml": "sitemap"}.get(content_type, "html")
+                site._count(kind, len(body))
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = QuietHTTPServer((host, port), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="synthetic-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic website for crawler benchmarks.")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=4096)
+    parser.add_argument("--binary-ratio", type=float, default=0.1)
+    parser.add_argument("--binary-size", type=int, default=256 * 1024)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    site = SyntheticSite(args.pages, args.fanout, args.page_size, args.binary_ratio, args.binary_size, args.latency_ms)
+    site.start(port=args.port)
+    print(f"Serving synthetic site at {site.start_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        site.close()
+
+
+if __name__ == "__main__":
+    main()
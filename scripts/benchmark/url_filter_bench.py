@@ -0,0 +1,102 @@
+"""
+URLフィルタのマイクロベンチマーク。
+
+大量の合成リンクに対して、従来の判定方法（パターンごとに re.match、ドメインはリストの線形探索）と
+UrlFilter（結合済み正規表現 + ドメインのハッシュセット + LRUキャッシュ）の処理時間を比較します。
+
+使い方:
+    python scripts/benchmark/url_filter_bench.py --links 200000 --patterns 50 --domains 200
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "crawler", "app"))
+
+from url_filter import UrlFilter  # noqa: E402
+
+
+def build_config(num_patterns: int, num_domains: int):
+    """
+    合成のドメインリスト・対象パターン・除外パターンを生成します。
+    """
+    domains = [f"docs{i}.example.com" for i in range(num_domains)]
+    targets = [f"https://docs{i}\\.example\\.com/guide/v{i % 7}/.*" for i in range(num_patterns)]
+    excludes = [f".*/(print|raw|edit)/.*\\?rev={i}" for i in range(num_patterns)]
+    return domains, targets, excludes
+
+
+def build_links(num_links: int, num_domains: int, seed: int, repeat_ratio: float):
+    """
+    合成のリンク集合を生成します。リンクの一部はナビゲーションのように繰り返し出現します。
+    """
+    rng = random.Random(seed)
+    nav_links = [f"https://docs{rng.randrange(num_domains)}.example.com/guide/v{rng.randrange(7)}/nav/{i}.html" for i in range(500)]
+    links = []
+    for i in range(num_links):
+        if rng.random() < repeat_ratio:
+            links.append(rng.choice(nav_links))
+            continue
+        host = f"docs{rng.randrange(num_domains * 2)}.example.com"  # 半分は許可外ドメイン
+        section = rng.choice(["guide", "guide", "guide", "blog"])
+        view = rng.choice(["", "", "print/"])
+        links.append(f"https://{host}/{section}/v{rng.randrange(7)}/{view}page{i}.html?rev={rng.randrange(100)}")
+    return links
+
+
+def legacy_is_valid(url, domains, targets, excludes) -> bool:
+    """
+    従来の WebCrawler と同じ判定方法。
+    """
+    if domains and urlparse(url).netloc not in domains:
+        return False
+    if targets and not any(re.match(p, url) for p in targets):
+        return False
+    if excludes and any(re.match(p, url) for p in excludes):
+        return False
+    return True
+
+
+def measure(label: str, func, links):
+    start = time.perf_counter()
+    accepted = sum(1 for url in links if func(url))
+    elapsed = time.perf_counter() - start
+    return {"name": label, "seconds": round(elapsed, 4), "links_per_sec": round(len(links) / elapsed), "accepted": accepted}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the crawler URL filter.")
+    parser.add_argument("--links", type=int, default=200000, help="Number of synthetic links.")
+    parser.add_argument("--patterns", type=int, default=50, help="Number of target and exclude patterns.")
+    parser.add_argument("--domains", type=int, default=200, help="Number of allowed domains.")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="Ratio of repeated (navigation) links.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    domains, targets, excludes = build_config(args.patterns, args.domains)
+    links = build_links(args.links, args.domains, args.seed, args.repeat_ratio)
+
+    url_filter = UrlFilter(domains, targets, excludes)
+    results = [
+        measure("legacy", lambda url: legacy_is_valid(url, domains, targets, excludes), links),
+        measure("url_filter", url_filter.is_allowed, links),
+    ]
+    assert results[0]["accepted"] == results[1]["accepted"], "Filters disagree on accepted links"
+
+    print(json.dumps({
+        "links": args.links,
+        "patterns": args.patterns,
+        "domains": args.domains,
+        "results": results,
+        "speedup": round(results[0]["seconds"] / results[1]["seconds"], 2),
+        "url_filter_stats": url_filter.get_stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()